@@ -0,0 +1,178 @@
+"""
+Teste de carga local: leituras concorrentes sob WSGI (gunicorn) x ASGI (uvicorn).
+
+Sobe os dois servidores com o mesmo número de workers, apontando para o banco
+configurado em DJANGO_SETTINGS_MODULE, dispara as mesmas requisições de
+leitura com N clientes simultâneos e mostra requisições/segundo e latências.
+
+Por padrão mede os endpoints assíncronos (estoque/views_async.py) e, como
+referência, os ViewSets síncronos do DRF com os mesmos dados. Depois de medir
+cada caminho sozinho, dispara todos ao mesmo tempo ("misturado"), para ver se
+as leituras curtas ficam esperando atrás das longas.
+
+Medição de referência: 1 CPU, 1 worker de cada lado, 16 clientes, um ano de
+dados sintéticos (gerar_dados_sinteticos --dias 365), cinco rodadas. Mediana
+dos endpoints assíncronos sob ASGI x sob WSGI: estoque da unidade 240 x 196
+req/s, matriz 183 x 168, pedidos pendentes 257 x 214. As faixas se sobrepõem
+(143-299 x 128-232): com uma CPU, disputada pelo próprio gerador de carga, não
+há onde rodar duas consultas ao mesmo tempo. O paralelismo das threads do
+pool rende com mais de uma CPU (o SQLite solta o GIL durante a consulta) ou
+quando a leitura espera por disco. Os ViewSets síncronos rendem MENOS sob ASGI
+(metade, no /api/estoque/), porque lá passam pela thread única do código
+síncrono: sirva pelo ASGI só o /api/async/.
+
+Uso (na raiz do projeto, com dados no banco):
+
+    pip install gunicorn uvicorn
+    python benchmarks/carga_asgi_wsgi.py --requisicoes 2000 --concorrencia 64 --workers 2
+
+    # Caminhos próprios (repita --caminho); o padrão usa a unidade 1
+    python benchmarks/carga_asgi_wsgi.py --caminho /api/async/estoque/3/ --caminho /api/estoque/?unidade=3
+
+Com --json, o resultado também é gravado num arquivo.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+CAMINHOS_PADRAO = [
+    '/api/async/estoque/1/',
+    '/api/async/estoque/matriz/',
+    '/api/async/pedidos-pendentes/',
+    # ViewSets síncronos do DRF, como referência
+    '/api/estoque/?unidade=1',
+    '/api/estoque/matriz/',
+]
+
+SERVIDORES = {
+    'wsgi (gunicorn)': lambda porta, workers: [
+        sys.executable, '-m', 'gunicorn', 'boteco_estoque.wsgi:application',
+        '--workers', str(workers), '--bind', f'127.0.0.1:{porta}', '--log-level', 'warning',
+    ],
+    'asgi (uvicorn)': lambda porta, workers: [
+        sys.executable, '-m', 'uvicorn', 'boteco_estoque.asgi:application',
+        '--workers', str(workers), '--host', '127.0.0.1', '--port', str(porta), '--log-level', 'warning',
+    ],
+}
+
+
+def _esperar_servidor(porta, limite=30):
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < limite:
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=1)
+            conexao.request('GET', '/api/unidades/')
+            conexao.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Servidor na porta {porta} não respondeu em {limite}s.")
+
+
+def _disparar(porta, caminhos, requisicoes, concorrencia):
+    """
+    'concorrencia' clientes com conexão keep-alive dividindo 'requisicoes' entre si.
+    Com vários caminhos, cada cliente fica num deles (em rodízio) e todos rodam
+    ao mesmo tempo; o resultado sai por caminho.
+    """
+    por_cliente = [requisicoes // concorrencia + (1 if i < requisicoes % concorrencia else 0) for i in range(concorrencia)]
+
+    def cliente(indice):
+        caminho = caminhos[indice % len(caminhos)]
+        latencias, erros = [], 0
+        conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+        for _ in range(por_cliente[indice]):
+            inicio = time.perf_counter()
+            try:
+                conexao.request('GET', caminho)
+                resposta = conexao.getresponse()
+                resposta.read()
+                if resposta.status != 200:
+                    erros += 1
+            except (OSError, http.client.HTTPException):
+                erros += 1
+                conexao.close()
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+            latencias.append(time.perf_counter() - inicio)
+        conexao.close()
+        return caminho, latencias, erros
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        resultados = list(pool.map(cliente, range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+
+    medidas = {}
+    for caminho in caminhos:
+        latencias = sorted(l for c, lat, _ in resultados if c == caminho for l in lat)
+        medidas[caminho] = {
+            'requisicoes': len(latencias),
+            'erros': sum(e for c, _, e in resultados if c == caminho),
+            'req_por_s': round(len(latencias) / duracao, 1),
+            'p50_ms': round(statistics.median(latencias) * 1000, 1),
+            'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 1),
+        }
+    return medidas
+
+
+def _mostrar(nome, caminho, medida):
+    print(f"{nome:16} {caminho:44} {medida['req_por_s']:>8} req/s  "
+          f"p50 {medida['p50_ms']:>7} ms  p95 {medida['p95_ms']:>7} ms  erros {medida['erros']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requisicoes', type=int, default=2000)
+    parser.add_argument('--concorrencia', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--caminho', action='append', dest='caminhos')
+    parser.add_argument('--json', help="Arquivo onde gravar o resultado")
+    args = parser.parse_args()
+
+    faltando = [modulo for modulo in ('gunicorn', 'uvicorn') if find_spec(modulo) is None]
+    if faltando:
+        sys.exit(f"Instale antes: pip install {' '.join(faltando)}")
+
+    caminhos = args.caminhos or CAMINHOS_PADRAO
+    ambiente = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [str(RAIZ), os.environ.get('PYTHONPATH')]))}
+    ambiente.setdefault('DJANGO_SETTINGS_MODULE', 'boteco_estoque.settings')
+
+    resultado = {'workers': args.workers, 'concorrencia': args.concorrencia, 'servidores': {}}
+    for nome, comando in SERVIDORES.items():
+        processo = subprocess.Popen(comando(args.porta, args.workers), cwd=RAIZ, env=ambiente)
+        try:
+            _esperar_servidor(args.porta)
+            resultado['servidores'][nome] = {'separados': {}, 'misturados': {}}
+            for caminho in caminhos:
+                _disparar(args.porta, [caminho], min(100, args.requisicoes), args.concorrencia)  # aquecimento
+                medida = _disparar(args.porta, [caminho], args.requisicoes, args.concorrencia)[caminho]
+                resultado['servidores'][nome]['separados'][caminho] = medida
+                _mostrar(nome, caminho, medida)
+            if len(caminhos) > 1:
+                # Todos ao mesmo tempo: as leituras curtas esperam atrás das longas?
+                misturados = _disparar(args.porta, caminhos, args.requisicoes * len(caminhos), args.concorrencia)
+                resultado['servidores'][nome]['misturados'] = misturados
+                for caminho, medida in misturados.items():
+                    _mostrar(nome, f'{caminho} (misturado)', medida)
+        finally:
+            processo.terminate()
+            processo.wait(timeout=15)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
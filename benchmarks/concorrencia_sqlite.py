@@ -0,0 +1,153 @@
+"""
+Benchmark de concorrência no SQLite: leitores (relatórios) x escritores
+(importações, aprovações), com a configuração padrão e com a do projeto
+(estoque/sqlite/base.py: WAL, busy_timeout, synchronous=NORMAL... e BEGIN IMMEDIATE).
+
+Roda num arquivo temporário, sem Django nem o banco do projeto. Cada escritor
+faz transações que leem o estoque, gravam um lote de movimentações e
+atualizam o saldo; cada leitor agrega a tabela de movimentações sem parar.
+
+Uso (na raiz do projeto):
+
+    python benchmarks/concorrencia_sqlite.py --leitores 4 --escritores 2 --segundos 10
+    python benchmarks/concorrencia_sqlite.py --json resultado.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from estoque.sqlite.base import PRAGMAS_PADRAO  # noqa: E402
+
+PRODUTOS = 500
+UNIDADES = 5
+LINHAS_INICIAIS = 200_000
+LINHAS_POR_TRANSACAO = 200
+
+CONFIGURACOES = {
+    # Como o Django 4.2 abre o SQLite sem configuração: rollback journal, BEGIN adiado, timeout de 5 s
+    'padrao': {'pragmas': {}, 'begin': 'BEGIN'},
+    'projeto': {'pragmas': PRAGMAS_PADRAO, 'begin': 'BEGIN IMMEDIATE'},
+}
+
+
+def _conectar(caminho, configuracao):
+    conexao = sqlite3.connect(caminho, timeout=5, isolation_level=None)
+    for nome, valor in CONFIGURACOES[configuracao]['pragmas'].items():
+        conexao.execute(f'PRAGMA {nome} = {valor}')
+    return conexao
+
+
+def _criar_banco(caminho, configuracao):
+    conexao = _conectar(caminho, configuracao)
+    conexao.executescript("""
+        CREATE TABLE estoque (unidade_id INTEGER, produto_id INTEGER, quantidade REAL,
+                              PRIMARY KEY (unidade_id, produto_id));
+        CREATE TABLE movimentacao (id INTEGER PRIMARY KEY, unidade_id INTEGER, produto_id INTEGER,
+                                   quantidade REAL, data TEXT);
+    """)
+    conexao.execute('BEGIN')
+    conexao.executemany('INSERT INTO estoque VALUES (?, ?, 100)',
+                        [(u, p) for u in range(UNIDADES) for p in range(PRODUTOS)])
+    conexao.executemany(
+        "INSERT INTO movimentacao (unidade_id, produto_id, quantidade, data) VALUES (?, ?, 1, datetime('now'))",
+        [(i % UNIDADES, i % PRODUTOS) for i in range(LINHAS_INICIAIS)],
+    )
+    conexao.execute('COMMIT')
+    conexao.close()
+
+
+def _escritor(caminho, configuracao, ate, fila):
+    conexao = _conectar(caminho, configuracao)
+    begin = CONFIGURACOES[configuracao]['begin']
+    feitas = erros = 0
+    while time.time() < ate:
+        unidade = random.randrange(UNIDADES)
+        produtos = random.sample(range(PRODUTOS), LINHAS_POR_TRANSACAO)
+        try:
+            conexao.execute(begin)
+            # Lê antes de escrever, como a aprovação de contagem e a importação de vendas
+            conexao.execute('SELECT SUM(quantidade) FROM estoque WHERE unidade_id = ?', (unidade,)).fetchone()
+            conexao.executemany(
+                "INSERT INTO movimentacao (unidade_id, produto_id, quantidade, data) VALUES (?, ?, 1, datetime('now'))",
+                [(unidade, produto) for produto in produtos],
+            )
+            conexao.executemany('UPDATE estoque SET quantidade = quantidade - 1 WHERE unidade_id = ? AND produto_id = ?',
+                                [(unidade, produto) for produto in produtos])
+            conexao.execute('COMMIT')
+            feitas += 1
+        except sqlite3.OperationalError:
+            erros += 1
+            if conexao.in_transaction:
+                conexao.execute('ROLLBACK')
+    fila.put(('escritor', feitas, erros))
+
+
+def _leitor(caminho, configuracao, ate, fila):
+    conexao = _conectar(caminho, configuracao)
+    feitas = erros = 0
+    while time.time() < ate:
+        try:
+            conexao.execute('SELECT produto_id, SUM(quantidade) FROM movimentacao '
+                            'WHERE unidade_id = ? GROUP BY produto_id', (random.randrange(UNIDADES),)).fetchall()
+            feitas += 1
+        except sqlite3.OperationalError:
+            erros += 1
+    fila.put(('leitor', feitas, erros))
+
+
+def medir(configuracao, leitores, escritores, segundos):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'bench.sqlite3')
+        _criar_banco(caminho, configuracao)
+
+        fila = multiprocessing.Queue()
+        ate = time.time() + segundos
+        processos = ([multiprocessing.Process(target=_escritor, args=(caminho, configuracao, ate, fila))
+                      for _ in range(escritores)]
+                     + [multiprocessing.Process(target=_leitor, args=(caminho, configuracao, ate, fila))
+                        for _ in range(leitores)])
+        for processo in processos:
+            processo.start()
+        resultados = [fila.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+
+    medida = {}
+    for papel in ('escritor', 'leitor'):
+        feitas = sum(f for p, f, _ in resultados if p == papel)
+        erros = sum(e for p, _, e in resultados if p == papel)
+        medida[papel] = {'por_segundo': round(feitas / segundos, 1), 'erros_lock': erros}
+    return medida
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leitores', type=int, default=4)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--json', help="Arquivo onde gravar o resultado")
+    args = parser.parse_args()
+
+    resultado = {'leitores': args.leitores, 'escritores': args.escritores, 'segundos': args.segundos}
+    for configuracao in CONFIGURACOES:
+        medida = medir(configuracao, args.leitores, args.escritores, args.segundos)
+        resultado[configuracao] = medida
+        print(f"{configuracao:8}  escritas {medida['escritor']['por_segundo']:>8}/s "
+              f"(erros {medida['escritor']['erros_lock']:>4})   "
+              f"leituras {medida['leitor']['por_segundo']:>8}/s (erros {medida['leitor']['erros_lock']:>4})")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark do tempo de subida: o que cada worker do gunicorn, cada
+'manage.py migrate' e cada rodada de testes paga antes de fazer qualquer coisa.
+
+Cada rodada é um processo Python novo (sem módulos em cache) que mede:
+- django.setup(), e dentro dele o autodiscover do admin (importa os admin.py);
+- o carregamento das URLs (ROOT_URLCONF: views, ViewSets, rotas do admin);
+- quais dependências pesadas foram importadas no caminho. pandas, NumPy e
+  WeasyPrint só devem entrar quando um relatório, importação ou PDF roda.
+
+Falha (código de saída 1) se alguma dependência pesada for importada na
+subida ou se a mediana passar de --limite-ms; serve como verificação contra
+regressões.
+
+Uso (na raiz do projeto):
+
+    python benchmarks/inicializacao.py --rodadas 10
+    python benchmarks/inicializacao.py --limite-ms 1500 --json resultado.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+PESADOS = ('pandas', 'numpy', 'weasyprint', 'openpyxl')
+
+# Roda no processo filho; imprime um JSON com as medidas
+MEDICAO = f"""
+import json, sys, time
+inicio = time.perf_counter()
+import django
+from django.contrib import admin
+medidas = {{}}
+autodiscover = admin.autodiscover
+def autodiscover_medido():
+    t = time.perf_counter()
+    autodiscover()
+    medidas['autodiscover_admin_ms'] = (time.perf_counter() - t) * 1000
+admin.autodiscover = autodiscover_medido
+django.setup()
+medidas['setup_ms'] = (time.perf_counter() - inicio) * 1000
+t = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+medidas['urls_ms'] = (time.perf_counter() - t) * 1000
+medidas['total_ms'] = (time.perf_counter() - inicio) * 1000
+medidas['pesados'] = [m for m in {PESADOS!r} if m in sys.modules]
+print(json.dumps(medidas))
+"""
+
+
+def rodada():
+    ambiente = {**os.environ}
+    ambiente.setdefault('DJANGO_SETTINGS_MODULE', 'boteco_estoque.settings')
+    inicio = time.perf_counter()
+    saida = subprocess.run([sys.executable, '-c', MEDICAO], cwd=RAIZ, env=ambiente,
+                           capture_output=True, text=True, check=True).stdout
+    medidas = json.loads(saida.strip().splitlines()[-1])
+    # Inclui a subida do próprio interpretador
+    medidas['processo_ms'] = (time.perf_counter() - inicio) * 1000
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rodadas', type=int, default=7)
+    parser.add_argument('--limite-ms', type=float, help="Falha se a mediana de setup + URLs passar disto")
+    parser.add_argument('--json', help="Arquivo onde gravar o resultado")
+    args = parser.parse_args()
+
+    rodadas = [rodada() for _ in range(args.rodadas)]
+    resultado = {'rodadas': args.rodadas, 'pesados_na_subida': sorted({m for r in rodadas for m in r['pesados']})}
+    for chave in ('setup_ms', 'autodiscover_admin_ms', 'urls_ms', 'total_ms', 'processo_ms'):
+        valores = [r.get(chave, 0) for r in rodadas]
+        resultado[chave] = {'mediana': round(statistics.median(valores), 1), 'min': round(min(valores), 1)}
+        print(f"{chave:24} mediana {resultado[chave]['mediana']:>8.1f} ms   mín {resultado[chave]['min']:>8.1f} ms")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    falhas = []
+    if resultado['pesados_na_subida']:
+        falhas.append(f"dependências pesadas importadas na subida: {', '.join(resultado['pesados_na_subida'])}")
+    if args.limite_ms is not None and resultado['total_ms']['mediana'] > args.limite_ms:
+        falhas.append(f"subida em {resultado['total_ms']['mediana']:.0f} ms (limite {args.limite_ms:.0f} ms)")
+    for falha in falhas:
+        print(f"FALHOU: {falha}", file=sys.stderr)
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
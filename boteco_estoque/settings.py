@@ -48,11 +48,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # ✅ Primeiro da lista: mede a requisição inteira (estoque/instrumentacao.py)
+    "estoque.instrumentacao.InstrumentacaoMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # ✅ '?_perfilar=1' de um superusuário roda a requisição no cProfile (estoque/perfilamento.py)
+    "estoque.perfilamento.PerfilamentoMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -84,13 +88,24 @@ WSGI_APPLICATION = "boteco_estoque.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# ✅ Backend SQLite do projeto: WAL, busy_timeout e demais PRAGMAs em cada conexão (estoque/sqlite/base.py)
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "estoque.sqlite",
         "NAME": BASE_DIR / "db.sqlite3",
     }
 }
 
+# Conexão opcional só de leitura para os relatórios (estoque/banco.py)
+if os.getenv('SQLITE_LEITURA', 'False') == 'True':
+    DATABASES["leitura"] = {
+        **DATABASES["default"],
+        "OPTIONS": {"somente_leitura": True},
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["estoque.banco.RoteadorRelatorios"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -137,6 +152,70 @@ STATICFILES_DIRS = [
 # Este é o caminho que estava faltando ou incorreto.
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# API: paginação por cursor e filtros declarados em cada ViewSet (estoque/api.py)
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "estoque.api.PaginacaoPorCursor",
+    "DEFAULT_FILTER_BACKENDS": ["estoque.api.FiltroPorParametros"],
+}
+
+# Cache em disco dos PDFs de pedidos (estoque/pdf_pedidos.py)
+PDF_CACHE_DIR = BASE_DIR / "cache" / "pdf"
+# Processos do pool que renderiza vários PDFs de uma vez (padrão: um por CPU)
+PDF_PROCESSOS = int(os.getenv('PDF_PROCESSOS', '0')) or None
+
+# 'permissoes' guarda a versão do escopo de cada usuário (estoque/permissoes.py).
+# Precisa ser visto por todos os workers do gunicorn: por isso em disco, e não na memória.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "permissoes": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "permissoes",
+        "TIMEOUT": None,
+    },
+}
+
+# Orçamento de cada requisição, por nome de rota (estoque/instrumentacao.py).
+# Passou de um dos limites: aviso no logger 'estoque.desempenho'; nos testes (OrcamentoDasViewsTests), falha.
+ORCAMENTO_REQUISICAO_PADRAO = {"consultas": 50, "ms": 1000}
+ORCAMENTOS_POR_VIEW = {
+    "home": {"consultas": 35},
+    "relatorios": {"consultas": 10},
+    "admin:gerar_reposicao": {"consultas": 25},
+    "admin:receber-pedido-reposicao": {"consultas": 25},
+    "admin:estoque_contagemestoque_change": {"consultas": 30},
+    # Cada linha da planilha passa pelos sinais de venda: aqui só o tempo conta
+    "admin:importar_vendas": {"consultas": None, "ms": 5000},
+}
+
+# Métricas em formato Prometheus (estoque/metricas.py): os processos somam num SQLite desta pasta.
+# Sob o gunicorn, todos os workers precisam enxergar a mesma pasta.
+METRICAS_DIR = Path(os.getenv('METRICAS_DIR', BASE_DIR / "cache" / "metricas"))
+# /metricas/ responde para usuários da equipe (is_staff) e para o coletor, que se identifica por
+# 'Authorization: Bearer <METRICAS_TOKEN>' ou pelo IP. Por padrão nenhum dos dois vale.
+# Atrás de um proxy reverso (nginx etc.) o REMOTE_ADDR é sempre o do proxy: liberar 127.0.0.1
+# ali abre as métricas para qualquer um. Nesse caso use só o token.
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+METRICAS_IPS_PERMITIDOS = [ip.strip() for ip in os.getenv('METRICAS_IPS_PERMITIDOS', '').split(',') if ip.strip()]
+
+# Perfilamentos sob demanda (.prof e .sql); só os PERFILAMENTO_MAXIMO mais recentes ficam
+PERFILAMENTO_DIR = BASE_DIR / "cache" / "perfis"
+PERFILAMENTO_MAXIMO = 50
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # DEBUG mostra todas as requisições; WARNING, só as que passaram do orçamento
+        "estoque.desempenho": {
+            "handlers": ["console"],
+            "level": os.getenv("LOG_DESEMPENHO", "WARNING"),
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
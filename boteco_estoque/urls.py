@@ -5,17 +5,27 @@ from django.shortcuts import render
 from estoque.models import Unidade, Produto, Movimentacao, Estoque, PedidoReposicao, PedidoCompra, VendaDiaria
 from django.db.models import Sum
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+from datetime import timedelta
+import hmac
 from django.db.models.functions import TruncWeek 
+from estoque import views_async
+from estoque.banco import consulta_de_relatorio
+from estoque import metricas
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 
 # ✅ 'ReposicaoViewSet' foi removido e as novas ViewSets foram adicionadas
 from estoque.views import (
     UnidadeViewSet, ProdutoViewSet, EstoqueViewSet, VendaDiariaViewSet, 
-    MovimentacaoViewSet, PedidoReposicaoViewSet, ItemReposicaoViewSet
+    MovimentacaoViewSet, PedidoReposicaoViewSet, ItemReposicaoViewSet,
+    ContagemEstoqueViewSet, CodigoBarrasViewSet, PedidoCompraViewSet
 )
 
 router = routers.DefaultRouter()
 router.register(r'unidades', UnidadeViewSet)
 router.register(r'produtos', ProdutoViewSet)
+router.register(r'codigos-barras', CodigoBarrasViewSet)
 router.register(r'estoque', EstoqueViewSet)
 router.register(r'vendas', VendaDiariaViewSet)
 router.register(r'movimentacoes', MovimentacaoViewSet)
@@ -24,6 +34,8 @@ router.register(r'movimentacoes', MovimentacaoViewSet)
 # ✅ Adicionamos as novas rotas para a API
 router.register(r'pedidos-reposicao', PedidoReposicaoViewSet)
 router.register(r'itens-reposicao', ItemReposicaoViewSet)
+router.register(r'contagens', ContagemEstoqueViewSet)
+router.register(r'pedidos-compra', PedidoCompraViewSet)
 
 
 # ✅ SUBSTITUA SUA FUNÇÃO 'home' POR ESTA VERSÃO
@@ -53,7 +65,7 @@ def home(request):
 
     # O resto das buscas para o dashboard continua igual
     reposicoes_pendentes = PedidoReposicao.objects.filter(status="PENDENTE").order_by('data_criacao')
-    compras_pendentes = PedidoCompra.objects.filter(status="PENDENTE").order_by('data_pedido')
+    compras_pendentes = PedidoCompra.objects.filter(status__in=["PENDENTE", "RECEBIDO_PARCIALMENTE"]).order_by('data_pedido')
     todas_unidades = Unidade.objects.all()
 
     context = {
@@ -71,6 +83,7 @@ def home(request):
 
 
 @login_required
+@consulta_de_relatorio
 def relatorios_view(request):
     # Relatório 1: Top 10 Produtos
     vendas_por_produto = (VendaDiaria.objects
@@ -107,9 +120,114 @@ def relatorios_view(request):
     return render(request, "relatorios.html", context)
 
 
+@login_required
+@consulta_de_relatorio
+def relatorio_custos_view(request):
+    # Custo teórico já vem calculado (e guardado) no Produto: uma consulta só
+    produtos = (Produto.objects
+        .filter(tipo='PRODUTO_FINAL')
+        .order_by('nome')
+        .only('nome', 'preco_venda', 'custo_teorico', 'custo_calculado_em'))
+
+    linhas = []
+    for produto in produtos:
+        margem = produto.margem
+        linhas.append({
+            'nome': produto.nome,
+            'preco_venda': produto.preco_venda,
+            'custo_teorico': produto.custo_teorico,
+            'margem': margem,
+            'margem_percentual': (margem / produto.preco_venda * 100) if margem is not None and produto.preco_venda else None,
+            'custo_calculado_em': produto.custo_calculado_em,
+        })
+
+    context = {
+        'linhas': linhas,
+    }
+    return render(request, "relatorio_custos.html", context)
+
+
+@login_required
+@consulta_de_relatorio
+def relatorio_variancia_view(request):
+    # ✅ Consumo real x teórico entre contagens aprovadas (cálculo vetorizado em estoque/variancia.py)
+    # Importado aqui: variancia.py usa pandas, que não precisa pesar na subida dos workers
+    from estoque.variancia import calcular_variancia, DIAS_PADRAO
+    unidade_selecionada_id = request.GET.get('unidade_id')
+    dias = request.GET.get('dias', '')
+    dias = int(dias) if dias.isdigit() and int(dias) > 0 else DIAS_PADRAO
+    apenas_outliers = request.GET.get('outliers') == '1'
+
+    unidades = None
+    if unidade_selecionada_id and unidade_selecionada_id.isdigit():
+        unidades = Unidade.objects.filter(id=unidade_selecionada_id)
+
+    agora = timezone.now()
+    df = calcular_variancia(desde=agora - timedelta(days=dias), ate=agora, unidades=unidades)
+    if apenas_outliers:
+        df = df[df['outlier']]
+
+    nomes_unidades = dict(Unidade.objects.values_list('id', 'nome'))
+    produtos = {p['id']: p for p in Produto.objects.filter(id__in=df['produto_id'].unique().tolist()).values('id', 'nome', 'unidade_medida')}
+
+    linhas = [
+        {
+            'unidade': nomes_unidades.get(linha.unidade_id),
+            'produto': produtos[linha.produto_id]['nome'],
+            'unidade_medida': produtos[linha.produto_id]['unidade_medida'],
+            'abertura': linha.abertura.to_pydatetime(),
+            'fechamento': linha.fechamento.to_pydatetime(),
+            'qtd_abertura': linha.qtd_abertura,
+            'entradas': linha.entradas - linha.transferido,
+            'qtd_fechamento': linha.qtd_fechamento,
+            'consumo_teorico': linha.consumo_teorico,
+            'consumo_real': linha.consumo_real,
+            'variancia': linha.variancia,
+            'valor_variancia': linha.valor_variancia,
+            'z': linha.z,
+            'outlier': linha.outlier,
+        }
+        for linha in df.head(500).itertuples()
+    ]
+
+    context = {
+        'linhas': linhas,
+        'total_periodos': len(df),
+        'total_outliers': int(df['outlier'].sum()),
+        'perda_total': float(df.loc[df['valor_variancia'] > 0, 'valor_variancia'].sum()),
+        'todas_unidades': Unidade.objects.all(),
+        'unidade_selecionada_id': unidade_selecionada_id,
+        'dias': dias,
+        'apenas_outliers': apenas_outliers,
+    }
+    return render(request, "relatorio_variancia.html", context)
+
+
+def _coletor_autorizado(request):
+    """ O Prometheus: 'Authorization: Bearer <METRICAS_TOKEN>' ou um IP de METRICAS_IPS_PERMITIDOS. """
+    token = settings.METRICAS_TOKEN
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICAS_IPS_PERMITIDOS
+
+
+def metricas_view(request):
+    # ✅ Formato texto do Prometheus, somando todos os workers (estoque/metricas.py)
+    if not (request.user.is_staff or _coletor_autorizado(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(metricas.exposicao(), content_type=metricas.TIPO_CONTEUDO)
+
+
 urlpatterns = [
     path("", home, name="home"),
     path("relatorios/", relatorios_view, name="relatorios"),    
+    path("relatorios/custos/", relatorio_custos_view, name="relatorio_custos"),
+    path("relatorios/variancia/", relatorio_variancia_view, name="relatorio_variancia"),
     path("admin/", admin.site.urls),
+    path("metricas/", metricas_view, name="metricas"),
+    # ✅ Leituras assíncronas (consultas em paralelo sob ASGI): ver estoque/views_async.py
+    path("api/async/estoque/matriz/", views_async.matriz, name="async_matriz_estoque"),
+    path("api/async/estoque/<int:unidade_id>/", views_async.estoque_da_unidade, name="async_estoque_unidade"),
+    path("api/async/pedidos-pendentes/", views_async.pedidos_pendentes, name="async_pedidos_pendentes"),
     path("api/", include(router.urls)),
 ]
\ No newline at end of file
@@ -1,27 +1,53 @@
 # Mantenha todos os seus imports originais
 from django.contrib import admin, messages
 from django.db import transaction
-from .models import Unidade, Produto, Estoque, VendaDiaria, Movimentacao, Fornecedor, PedidoCompra, ItemPedidoCompra, Ingrediente, PedidoReposicao, ItemReposicao, ContagemEstoque, ItemContagemEstoque 
+from .models import PerfilamentoRequisicao, Unidade, PerfilUsuario, Produto, CodigoBarras, Estoque, VendaDiaria, Movimentacao, Fornecedor, PedidoCompra, ItemPedidoCompra, Ingrediente, PedidoReposicao, ItemReposicao, ContagemEstoque, ItemContagemEstoque, ClassificacaoABC
 from django.utils.html import format_html
 from django.urls import reverse, path
 from django.shortcuts import redirect, render
 from .forms import ImportarVendasForm
+from .services import aprovar_contagens, salvar_itens_contagem, receber_pedido_compra, aplicar_movimentacoes
+from .contagem_ciclica import recalcular_classificacao_abc, gerar_contagens_ciclicas
+from .custos import recalcular_custos_receitas
+from .permissoes import EscopoUnidadeAdminMixin, escopo_usuario
+from .admin_listas import ListaGrandeAdminMixin, FiltroAutocomplete
+from .metricas import DURACAO_IMPORTACAO, LINHAS_IMPORTADAS
+from .perfilamento import arquivos as arquivos_perfilamento, resumo as resumo_perfilamento
+from .pdf_pedidos import carregar_pedidos, pdfs_dos_pedidos, zip_dos_pedidos, pdf_unico_dos_pedidos, nome_arquivo
 import re
 from django.utils import timezone
 import math
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from weasyprint import HTML
-import pandas as pd
-from django.db.models import F
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+import json
+from django.db.models import F, Q
+from django.utils.text import smart_split, unescape_string_literal
 
 ESTOQUE_SEGURANCA = 0
 
+@admin.register(PerfilUsuario)
+class PerfilUsuarioAdmin(admin.ModelAdmin):
+    list_display = ("user", "unidade")
+    list_filter = ("unidade",)
+    list_select_related = ("user", "unidade")
+    search_fields = ("user__username", "unidade__nome")
+    autocomplete_fields = ("user", "unidade")
+
 # As classes Admin para Unidade, Produto e Estoque não precisam de mudanças
 @admin.register(Unidade)
 class UnidadeAdmin(admin.ModelAdmin):
     list_display = ("nome", "endereco")
     search_fields = ("nome", "endereco")
+    actions = ['gerar_contagem_ciclica']
+
+    @admin.action(description="Gerar contagem cíclica (insumos vencidos pela curva ABC)")
+    def gerar_contagem_ciclica(self, request, queryset):
+        # Atualiza a curva ABC antes, para a folha refletir o consumo mais recente
+        recalcular_classificacao_abc(unidades=queryset)
+        criadas = gerar_contagens_ciclicas(unidades=queryset)
+        if criadas:
+            self.message_user(request, f"{len(criadas)} contagem(ns) cíclica(s) criada(s).", messages.SUCCESS)
+        else:
+            self.message_user(request, "Nenhuma contagem criada: não há insumos vencidos ou já existe contagem pendente.", messages.WARNING)
     
 class IngredienteInline(admin.TabularInline):
     """
@@ -34,55 +60,77 @@ class IngredienteInline(admin.TabularInline):
     autocomplete_fields = ['insumo']
     extra = 1    
 
+class CodigoBarrasInline(admin.TabularInline):
+    """ Códigos de barras (EAN) do produto, usados pelos leitores e coletores. """
+    model = CodigoBarras
+    extra = 1
+
 @admin.register(Produto)
 class ProdutoAdmin(admin.ModelAdmin):
-    list_display = ("nome", "tipo", "unidade_medida")
+    list_display = ("nome", "tipo", "unidade_medida", "preco_venda", "custo_teorico_formatado", "margem_formatada")
     list_filter = ("tipo",) # Adicionamos o filtro por tipo
     search_fields = ("nome",)
+    ordering = ("nome",)  # ✅ Ordem estável também no autocomplete dos filtros de produto
+    readonly_fields = ("custo_teorico", "custo_calculado_em")
+    actions = ['recalcular_custo_receitas']
 
     # Organiza os campos na tela de edição
     fieldsets = (
         (None, {
             'fields': ('nome', 'tipo', 'unidade_medida')
         }),
+        ('Custo e Margem', {
+            'fields': ('preco_venda', 'custo_teorico', 'custo_calculado_em')
+        }),
     )
 
+    @admin.display(description="Custo Teórico", ordering="custo_teorico")
+    def custo_teorico_formatado(self, obj):
+        return f"R$ {obj.custo_teorico:.2f}" if obj.custo_teorico is not None else "-"
+
+    @admin.display(description="Margem")
+    def margem_formatada(self, obj):
+        margem = obj.margem
+        if margem is None:
+            return "-"
+        percentual = f" ({margem / obj.preco_venda * 100:.0f}%)" if obj.preco_venda else ""
+        return f"R$ {margem:.2f}{percentual}"
+
+    @admin.action(description="Recalcular custo das fichas técnicas")
+    def recalcular_custo_receitas(self, request, queryset):
+        produtos_ids = list(queryset.filter(tipo='PRODUTO_FINAL').values_list('id', flat=True))
+        total = recalcular_custos_receitas(produtos_ids=produtos_ids)
+        self.message_user(request, f"Custo teórico recalculado para {total} produto(s) final(is).", messages.SUCCESS)
+
     # Esta função mágica mostra o inline de ingredientes APENAS
     # se o produto que você está editando for do tipo "Produto Final".
     def get_inlines(self, request, obj=None):
         if obj and obj.tipo == 'PRODUTO_FINAL':
-            return [IngredienteInline]
-        return []
+            return [CodigoBarrasInline, IngredienteInline]
+        return [CodigoBarrasInline]
+
+    # ✅ LEITOR DE CÓDIGO DE BARRAS: se o termo buscado (inclusive no autocomplete)
+    # for um código cadastrado (EAN ou interno, com letras), resolve direto pelo índice, sem o LIKE no nome.
+    def get_search_results(self, request, queryset, search_term):
+        termo = search_term.strip()
+        if termo:
+            produtos_ids = list(CodigoBarras.objects.filter(codigo=termo).values_list('produto_id', flat=True))
+            if produtos_ids:
+                return queryset.filter(pk__in=produtos_ids), False
+        return super().get_search_results(request, queryset, search_term)
     
 @admin.register(Estoque)
-class EstoqueAdmin(admin.ModelAdmin):
-    list_display = ("unidade", "produto", "quantidade", "estoque_minimo")
+class EstoqueAdmin(EscopoUnidadeAdminMixin, admin.ModelAdmin):
+    list_display = ("unidade", "produto", "quantidade", "estoque_minimo", "custo_medio", "valor_total")
+    readonly_fields = ("custo_medio",)
     list_filter = ("unidade", "produto__tipo", "produto")
     search_fields = ("unidade__nome", "produto__nome")
     list_editable = ("quantidade", "estoque_minimo")
     change_list_template = "admin/estoque/estoque/change_list_gerar_reposicao.html"
     
-    # ✅ FILTRO DE SEGURANÇA + FILTRO DE INSUMO
+    # ✅ FILTRO DE SEGURANÇA (EscopoUnidadeAdminMixin) + FILTRO DE INSUMO
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        
-        if not request.user.is_superuser:
-            # Pegamos todos os objetos para filtrar manualmente ou usamos um filtro de string transformado
-            # A melhor forma sem mudar o banco é filtrar unidades que contenham o username sem espaços
-            user_slug = request.user.username.lower().replace(" ", "")
-                    
-            #Filtramos as unidades onde o nome (sem espaços) contém o username
-            # Como o Django não permite replace direto no filter de forma simples, 
-            # vamos buscar as unidades que batem com a lógica primeiro:
-            from django.db.models import Q
-                    
-            # Esta linha abaixo é a mais robusta: ela limpa o username e busca na unidade
-            qs = qs.filter(unidade__nome__icontains=user_slug.replace("ori", "").strip())
-                    
-            # Se ainda assim não vir nada, tentamos uma busca mais aberta:
-            if not qs.exists():
-                # Tenta buscar por qualquer parte do nome do usuário que esteja no nome da unidade
-                qs = super().get_queryset(request).filter(unidade__nome__icontains=request.user.username[:4])
 
         # Se o usuário clicou em um filtro de tipo de produto na URL,
         # nós não fazemos nada e deixamos o Django trabalhar.
@@ -92,6 +140,10 @@ class EstoqueAdmin(admin.ModelAdmin):
         # Se não, é a primeira visita, então aplicamos nosso filtro padrão.
         return qs.filter(produto__tipo='INSUMO')    
     
+    @admin.display(description="Valor em Estoque")
+    def valor_total(self, obj):
+        return f"R$ {max(obj.quantidade, 0) * float(obj.custo_medio):.2f}"
+
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
@@ -118,7 +170,7 @@ class EstoqueAdmin(admin.ModelAdmin):
                 # Cria o "cabeçalho" do pedido de reposição
                 novo_pedido = PedidoReposicao.objects.create(unidade_destino=unidade)
                 
-                itens_adicionados = 0
+                quantidades = {}
                 # Itera sobre todos os dados enviados pelo formulário
                 for key, value in request.POST.items():
                     # Procura por campos que começam com 'produto_'
@@ -126,22 +178,25 @@ class EstoqueAdmin(admin.ModelAdmin):
                         try:
                             quantidade_str = value.replace(',', '.')
                             quantidade = float(quantidade_str) if quantidade_str else 0
-                            
-                            if quantidade > 0:
-                                produto_id = key.split('_')[1]
-                                produto = Produto.objects.get(id=produto_id)
-                                justificativa = request.POST.get(f'justificativa_{produto_id}', '')
-
-                                ItemReposicao.objects.create(
-                                    pedido_reposicao=novo_pedido,
-                                    produto=produto,
-                                    quantidade_solicitada=quantidade,
-                                    justificativa=justificativa
-                                )
-                                itens_adicionados += 1
-                        except (ValueError, IndexError, Produto.DoesNotExist):
-                            continue # Ignora campos inválidos ou com quantidade zerada
-                
+                            produto_id = int(key.split('_')[1])
+                        except (ValueError, IndexError):
+                            continue # Ignora campos inválidos
+                        if quantidade > 0:
+                            quantidades[produto_id] = quantidade
+
+                # ✅ Uma consulta para os produtos e um INSERT para os itens (antes: duas consultas por item)
+                existentes = set(Produto.objects.filter(id__in=quantidades).values_list('id', flat=True))
+                itens = ItemReposicao.objects.bulk_create([
+                    ItemReposicao(
+                        pedido_reposicao=novo_pedido,
+                        produto_id=produto_id,
+                        quantidade_solicitada=quantidades[produto_id],
+                        justificativa=request.POST.get(f'justificativa_{produto_id}', ''),
+                    )
+                    for produto_id in quantidades if produto_id in existentes
+                ])
+                itens_adicionados = len(itens)
+
             if itens_adicionados > 0:
                 messages.success(request, f"Pedido de Reposição #{novo_pedido.id} criado com {itens_adicionados} item(ns).")
                 # Redireciona para a página de edição do novo pedido
@@ -190,29 +245,29 @@ class ItemReposicaoInline(admin.TabularInline):
     extra = 1
 
 @admin.register(PedidoReposicao)
-class PedidoReposicaoAdmin(admin.ModelAdmin):
+class PedidoReposicaoAdmin(EscopoUnidadeAdminMixin, admin.ModelAdmin):
     # ... (toda a configuração da classe PedidoReposicaoAdmin permanece a mesma) ...
     #list_display = ('id', 'unidade_destino', 'status_colorido', 'data_criacao', 'link_para_enviar', 'link_para_receber')
     list_filter = ('status', 'unidade_destino')
     date_hierarchy = 'data_criacao'
     inlines = [ItemReposicaoInline]
-    actions = ['gerar_pdf_pedido']
+    actions = ['gerar_pdf_pedido', 'gerar_pdf_unico']
+    # ✅ TRAVA DE SEGURANÇA: Cada gerente só vê os seus pedidos; a cozinha vê os de todas as unidades para separar
+    campo_unidade = 'unidade_destino'
+    papeis_rede = ('cozinha',)
     
     def get_list_display(self, request):
         # Colunas básicas comuns a todos
         cols = ['id', 'unidade_destino', 'status_colorido', 'data_criacao']
 
-        is_superuser = request.user.is_superuser
-        
-        # ✅ AJUSTADO: Nomes dos grupos conforme você alterou no Admin
-        is_cozinha = request.user.groups.filter(name='cozinha').exists()
-        is_gerente = request.user.groups.filter(name='gerentes').exists()
+        # ✅ Papéis vêm do escopo em cache na sessão (sem consultar os grupos a cada tela)
+        escopo = escopo_usuario(request)
 
-        if is_superuser:
+        if escopo.superusuario:
              cols.extend(['link_para_enviar', 'link_para_receber'])
-        elif is_cozinha:
+        elif escopo.cozinha:
              cols.append('link_para_enviar')
-        elif is_gerente:
+        elif escopo.gerente:
              cols.append('link_para_receber')
         
         return cols
@@ -271,21 +326,6 @@ class PedidoReposicaoAdmin(admin.ModelAdmin):
         return "N/A"
     link_para_receber.short_description = "Ação (Boteco)"
     
-# ✅ TRAVA DE SEGURANÇA: Cada gerente só vê os seus pedidos
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        
-        if not request.user.is_superuser:
-            user_slug = request.user.username.lower().replace(" ", "")
-            
-            # Filtra os pedidos da unidade que bate com o username
-            qs = qs.filter(unidade_destino__nome__icontains=user_slug.replace("ori", "").strip())
-            
-            if not qs.exists():
-                qs = super().get_queryset(request).filter(unidade_destino__nome__icontains=request.user.username[:4])
-        
-        return qs  
-    
     # ✅ MÉTODO ATUALIZADO COM AS CORREÇÕES DE SEGURANÇA
     def enviar_reposicao_view(self, request, object_id):
         pedido = self.get_object(request, object_id)
@@ -330,9 +370,18 @@ class PedidoReposicaoAdmin(admin.ModelAdmin):
                 'id': item.id, 'produto': item.produto, 'quantidade_solicitada': item.quantidade_solicitada,
                 'estoque_cozinha': qtd_estoque, 'quantidade_sugerida': qtd_sugerida
             })
+        # Permite bipar os produtos na separação: código de barras -> linha do pedido
+        item_por_produto = {item['produto'].id: item['id'] for item in itens_com_estoque}
+        codigos_barras = {
+            codigo: item_por_produto[produto_id]
+            for codigo, produto_id in CodigoBarras.objects.filter(
+                produto_id__in=item_por_produto.keys()
+            ).values_list('codigo', 'produto_id')
+        }
         context = {
             'title': f"Processar Envio do Pedido #{pedido.id}",
             'pedido': pedido, 'itens_do_pedido': itens_com_estoque, 'opts': self.model._meta,
+            'codigos_barras': codigos_barras,
         }
         return render(request, 'admin/estoque/pedidoreposicao/processar_reposicao_form.html', context)
     
@@ -348,18 +397,22 @@ class PedidoReposicaoAdmin(admin.ModelAdmin):
         with transaction.atomic():
             total_solicitado = 0
             total_enviado = 0
+            transferencias = []
 
             for item in pedido.itens.all():
                 if item.quantidade_enviada and item.quantidade_enviada > 0:
-                    Movimentacao.objects.create(
+                    transferencias.append(Movimentacao(
                         tipo="TRANSFERENCIA",
-                        produto=item.produto,
+                        produto_id=item.produto_id,
                         quantidade=item.quantidade_enviada,
                         origem=cozinha_central,
                         destino=pedido.unidade_destino
-                    )
+                    ))
                 total_solicitado += item.quantidade_solicitada
                 total_enviado += item.quantidade_enviada or 0
+
+            # ✅ Uma gravação em lote: estoque da cozinha e do boteco + custo médio levado ao destino
+            aplicar_movimentacoes(transferencias)
             
             if total_enviado >= total_solicitado:
                 pedido.status = "CONCLUIDO"
@@ -371,34 +424,36 @@ class PedidoReposicaoAdmin(admin.ModelAdmin):
         messages.success(request, f"Recebimento do Pedido #{pedido.id} confirmado e estoque atualizado!")
         return redirect(reverse("admin:estoque_pedidoreposicao_changelist"))
 
-    @admin.action(description="Gerar PDF do Pedido de Reposição")
+    # ✅ PDFs com cache (não renderiza de novo se o pedido não mudou); vários pedidos saem num ZIP
+    @admin.action(description="Gerar PDF do(s) Pedido(s) de Reposição")
     def gerar_pdf_pedido(self, request, queryset):
-        # Pega o primeiro (e idealmente único) pedido selecionado
-        if queryset.count() != 1:
-            self.message_user(request, "Por favor, selecione apenas UM pedido por vez para gerar o PDF.", messages.ERROR)
-            return
+        pedidos = carregar_pedidos(queryset)
 
-        pedido = queryset.first()
+        if len(pedidos) == 1:
+            pedido, pdf_file = pdfs_dos_pedidos(pedidos)[0]
+            response = HttpResponse(pdf_file, content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{nome_arquivo(pedido)}"'
+            return response
 
-        context = {
-            'pedido': pedido,
-            'data_emissao': timezone.now().strftime('%d/%m/%Y'),
-        }
+        response = HttpResponse(zip_dos_pedidos(pedidos), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="pedidos_reposicao_{timezone.now():%Y%m%d_%H%M}.zip"'
+        return response
 
-        html_string = render_to_string('pdf/pedido_reposicao_pdf.html', context)
-        pdf_file = HTML(string=html_string).write_pdf()
-
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="pedido_reposicao_#{pedido.id}_{pedido.unidade_destino.nome}.pdf"'
-        
-        return response   
+    @admin.action(description="Gerar PDF único com os Pedidos selecionados")
+    def gerar_pdf_unico(self, request, queryset):
+        pedidos = carregar_pedidos(queryset)
+        response = HttpResponse(pdf_unico_dos_pedidos(pedidos), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="pedidos_reposicao_{timezone.now():%Y%m%d_%H%M}.pdf"'
+        return response
 
 @admin.register(VendaDiaria)
-class VendaDiariaAdmin(admin.ModelAdmin):
+class VendaDiariaAdmin(EscopoUnidadeAdminMixin, ListaGrandeAdminMixin, admin.ModelAdmin):
     # A configuração inicial da classe permanece a mesma
     list_display = ("unidade", "produto", "quantidade", "data")
-    list_filter = ("unidade", "produto", "data")
-    date_hierarchy = "data"
+    list_filter = ("unidade", ("produto", FiltroAutocomplete), "data")
+    list_select_related = ("unidade", "produto")
+    # ✅ Mesma ordem do índice de data: o filtro de período lê só as primeiras linhas do intervalo, sem ordenar
+    ordering = ("-data", "-id")
     change_list_template = "admin/estoque/vendadiaria/change_list.html"
 
     def get_urls(self):
@@ -408,27 +463,14 @@ class VendaDiariaAdmin(admin.ModelAdmin):
         ]
         return custom_urls + urls
     
-# ✅ FILTRO DE SEGURANÇA PARA VENDAS
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        
-        if not request.user.is_superuser:
-            user_slug = request.user.username.lower().replace(" ", "")
-            
-            # Filtra as vendas pela unidade
-            qs = qs.filter(unidade__nome__icontains=user_slug.replace("ori", "").strip())
-            
-            if not qs.exists():
-                qs = super().get_queryset(request).filter(unidade__nome__icontains=request.user.username[:4])
-        
-        return qs    
-    
     def importar_vendas_view(self, request):
         if request.method == "POST":
             form = ImportarVendasForm(request.POST, request.FILES)
             if form.is_valid():
                 unidade = form.cleaned_data['unidade']
                 arquivo = form.cleaned_data['arquivo_xls']
+                # ✅ pandas só quando há planilha para ler (não pesa na subida dos workers)
+                import pandas as pd
                 try:
                     df = pd.read_excel(arquivo)
                 except Exception as e:
@@ -436,7 +478,8 @@ class VendaDiariaAdmin(admin.ModelAdmin):
                     return redirect('admin:estoque_vendadiaria_changelist')
 
                 erros = []
-                with transaction.atomic():
+                importadas = 0
+                with DURACAO_IMPORTACAO.cronometrar(origem='planilha_pdv'), transaction.atomic():
                     for index, row in df.iterrows():
                         try:
                             item_completo = str(row['ITEM'])
@@ -473,10 +516,12 @@ class VendaDiariaAdmin(admin.ModelAdmin):
                                 quantidade=quantidade,
                                 data=timezone.now().date()
                             )
+                            importadas += 1
                         except KeyError:
                             continue
                         except Exception as e:
                             erros.append(f"Erro na linha {index + 2}: {e}")
+                LINHAS_IMPORTADAS.inc(importadas, origem='planilha_pdv')
                 
                 if erros:
                     for erro in erros:
@@ -499,11 +544,27 @@ class VendaDiariaAdmin(admin.ModelAdmin):
 
 # A classe Admin para Movimentacao não precisa de mudanças
 @admin.register(Movimentacao)
-class MovimentacaoAdmin(admin.ModelAdmin):
+class MovimentacaoAdmin(ListaGrandeAdminMixin, admin.ModelAdmin):
     list_display = ("tipo", "produto", "quantidade", "origem", "destino", "data")
-    list_filter = ("tipo", "origem", "destino", "produto")
+    # ✅ Tabela de milhões de linhas: produto por autocomplete, período pelo filtro de data
+    # (o date_hierarchy fazia um SELECT DISTINCT na tabela inteira) e contagem limitada a 10000 (admin_listas.py)
+    list_filter = ("tipo", "origem", "destino", ("produto", FiltroAutocomplete), "data")
+    list_select_related = ("produto", "origem", "destino")
     search_fields = ("origem__nome", "destino__nome", "produto__nome")
-    date_hierarchy = "data"
+    ordering = ("-data", "-id")
+
+    # ✅ A busca padrão faz LIKE nos nomes com JOIN em cada linha da tabela. Aqui cada
+    # palavra vira os ids das unidades/produtos com esse nome (tabelas pequenas), e a
+    # lista filtra pelos índices de produto/origem/destino.
+    def get_search_results(self, request, queryset, search_term):
+        for palavra in smart_split(search_term):
+            if palavra[:1] in ('"', "'") and palavra[-1:] == palavra[:1]:
+                palavra = unescape_string_literal(palavra)
+            unidades_ids = list(Unidade.objects.filter(nome__icontains=palavra).values_list('id', flat=True))
+            produtos_ids = list(Produto.objects.filter(nome__icontains=palavra).values_list('id', flat=True))
+            queryset = queryset.filter(Q(produto_id__in=produtos_ids) | Q(origem_id__in=unidades_ids)
+                                       | Q(destino_id__in=unidades_ids))
+        return queryset, False
     
 # ✅ ADICIONE ESTAS NOVAS CLASSES NO FINAL DO ARQUIVO
 
@@ -525,19 +586,24 @@ class ItemPedidoCompraInline(admin.TabularInline):
 
 @admin.register(PedidoCompra)
 class PedidoCompraAdmin(admin.ModelAdmin):
-    list_display = ('id', 'fornecedor', 'status_colorido', 'data_pedido', 'data_recebimento', 'numero_nota_fiscal')
+    list_display = ('id', 'fornecedor', 'status_colorido', 'data_pedido', 'data_recebimento', 'numero_nota_fiscal', 'link_para_receber')
     list_filter = ('status', 'fornecedor')
     date_hierarchy = 'data_pedido'
     inlines = [ItemPedidoCompraInline]
+    change_list_template = "admin/estoque/pedidocompra/change_list.html"
     
     # ✅ Registra a nova ação
-    actions = ['receber_pedidos']
+    actions = ['receber_pedidos', 'confirmar_rascunhos']
     
     # ✅ VERSÃO FINAL USANDO CLASSES DO TEMA
     @admin.display(description="Status")
     def status_colorido(self, obj):
-        if obj.status == 'PENDENTE':
+        if obj.status == 'RASCUNHO':
+            classe_cor = 'light'
+        elif obj.status == 'PENDENTE':
             classe_cor = 'warning'
+        elif obj.status == 'RECEBIDO_PARCIALMENTE':
+            classe_cor = 'info'
         elif obj.status == 'RECEBIDO':
             classe_cor = 'success'
         elif obj.status == 'CANCELADO':
@@ -551,63 +617,170 @@ class PedidoCompraAdmin(admin.ModelAdmin):
             classe_cor, obj.get_status_display()
         )
 
-    # ✅ A função que executa a mágica
-    @admin.action(description="Confirmar recebimento dos itens")
-    def receber_pedidos(self, request, queryset):
-        # Primeiro, garante que a unidade "Cozinha Central" existe
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'sugerir/',
+                self.admin_site.admin_view(self.sugerir_compras_view),
+                name='sugerir-pedidos-compra'
+            ),
+            path(
+                '<path:object_id>/receber/',
+                self.admin_site.admin_view(self.receber_compra_view),
+                name='receber-pedido-compra'
+            ),
+        ]
+        return custom_urls + urls
+
+    def link_para_receber(self, obj):
+        if obj.status in ("PENDENTE", "RECEBIDO_PARCIALMENTE"):
+            url = reverse('admin:receber-pedido-compra', args=[obj.pk])
+            return format_html('<a class="button" href="{}" style="background-color: #28a745; color: white;">Receber Itens</a>', url)
+        return "N/A"
+    link_para_receber.short_description = "Recebimento"
+
+    def _cozinha_central(self, request):
         try:
-            cozinha_central = Unidade.objects.get(nome="Cozinha Central")
+            return Unidade.objects.get(nome="Cozinha Central")
         except Unidade.DoesNotExist:
             self.message_user(request, "Erro: A unidade 'Cozinha Central' não foi encontrada. Crie-a antes de receber um pedido.", messages.ERROR)
+            return None
+
+    # ✅ TELA DE RECEBIMENTO: quantidade recebida por item (entregas parciais)
+    def receber_compra_view(self, request, object_id):
+        pedido = self.get_object(request, object_id)
+        if pedido is None:
+            messages.error(request, "Pedido de compra não encontrado.")
+            return redirect(reverse("admin:estoque_pedidocompra_changelist"))
+
+        if pedido.status not in ("PENDENTE", "RECEBIDO_PARCIALMENTE"):
+            messages.warning(request, f"Este pedido não está aguardando recebimento (Status: {pedido.get_status_display()}).")
+            return redirect(reverse("admin:estoque_pedidocompra_changelist"))
+
+        cozinha_central = self._cozinha_central(request)
+        if cozinha_central is None:
+            return redirect(reverse("admin:estoque_pedidocompra_changelist"))
+
+        itens = list(pedido.itens.select_related('produto').order_by('id'))
+
+        if request.method == 'POST':
+            quantidades = {}
+            for item in itens:
+                try:
+                    qtd = float(request.POST.get(f'item_{item.id}', '0').replace(',', '.') or 0)
+                except (ValueError, TypeError):
+                    qtd = 0
+                if qtd > 0:
+                    quantidades[item.id] = qtd
+
+            numero_nf = request.POST.get('numero_nota_fiscal', '').strip()
+            if numero_nf:
+                pedido.numero_nota_fiscal = numero_nf
+                pedido.save(update_fields=['numero_nota_fiscal'])
+
+            entradas = receber_pedido_compra(pedido, cozinha_central, quantidades)
+            if entradas:
+                messages.success(request, f"Recebimento do Pedido #{pedido.id} registrado ({len(entradas)} item(ns)). Status: {pedido.get_status_display()}.")
+            else:
+                messages.warning(request, "Nenhuma quantidade maior que zero foi informada.")
+            return redirect(reverse("admin:estoque_pedidocompra_changelist"))
+
+        # Permite bipar os produtos na conferência: código de barras -> linha do pedido
+        item_por_produto = {item.produto_id: item.id for item in itens}
+        codigos_barras = {
+            codigo: item_por_produto[produto_id]
+            for codigo, produto_id in CodigoBarras.objects.filter(
+                produto_id__in=item_por_produto.keys()
+            ).values_list('codigo', 'produto_id')
+        }
+        context = {
+            'title': f"Receber Pedido de Compra #{pedido.id} - {pedido.fornecedor.nome}",
+            'pedido': pedido,
+            'itens': itens,
+            'codigos_barras': codigos_barras,
+            'opts': self.model._meta,
+        }
+        return render(request, 'admin/estoque/pedidocompra/receber_compra_form.html', context)
+
+    # ✅ SUGESTÃO DE COMPRAS: demanda da rede + estoque da cozinha + prazo do fornecedor
+    def sugerir_compras_view(self, request):
+        # sugestao_compras.py usa pandas: importado só quando a tela é aberta
+        import pandas as pd
+        from .sugestao_compras import calcular_sugestoes, gerar_rascunhos_pedidos_compra
+        sugestoes = calcular_sugestoes()
+
+        if request.method == 'POST':
+            pedidos, sem_fornecedor = gerar_rascunhos_pedidos_compra(sugestoes)
+            if pedidos:
+                messages.success(request, f"{len(pedidos)} rascunho(s) de pedido de compra criado(s). Revise e use 'Confirmar pedidos sugeridos'.")
+            else:
+                messages.warning(request, "Nenhum insumo precisa ser comprado agora.")
+            if not sem_fornecedor.empty:
+                messages.warning(request, f"Sem fornecedor conhecido (nunca comprados): {', '.join(sem_fornecedor['nome'])}.")
+            return redirect(reverse("admin:estoque_pedidocompra_changelist"))
+
+        fornecedores = dict(Fornecedor.objects.values_list('id', 'nome'))
+        linhas = sugestoes[sugestoes['quantidade_sugerida'] > 0].sort_values('nome')
+        itens = [
+            {
+                'nome': linha['nome'],
+                'unidade_medida': linha['unidade_medida'],
+                'fornecedor': fornecedores.get(linha['fornecedor_id']) if pd.notna(linha['fornecedor_id']) else None,
+                'consumo_medio': linha['consumo_medio'],
+                'prazo_dias': linha['prazo_dias'],
+                'estoque_central': linha['estoque_central'],
+                'reservado': linha['reservado'],
+                'a_receber': linha['a_receber'],
+                'quantidade_sugerida': linha['quantidade_sugerida'],
+            }
+            for _, linha in linhas.iterrows()
+        ]
+        context = {
+            'title': "Sugestão de Compras da Cozinha Central",
+            'itens': itens,
+            'opts': self.model._meta,
+        }
+        return render(request, 'admin/estoque/pedidocompra/sugerir_compras.html', context)
+
+    @admin.action(description="Confirmar pedidos sugeridos (rascunho -> pendente)")
+    def confirmar_rascunhos(self, request, queryset):
+        total = queryset.filter(status='RASCUNHO').update(status='PENDENTE')
+        self.message_user(request, f"{total} pedido(s) confirmado(s).", messages.SUCCESS)
+
+    # ✅ Recebimento completo (tudo o que falta) dos pedidos selecionados
+    @admin.action(description="Confirmar recebimento dos itens")
+    def receber_pedidos(self, request, queryset):
+        cozinha_central = self._cozinha_central(request)
+        if cozinha_central is None:
             return
 
-        # Garante que todas as operações aconteçam com segurança
-        with transaction.atomic():
-            # Filtra apenas os pedidos que ainda estão pendentes
-            pedidos_pendentes = queryset.filter(status="PENDENTE")
-            
-            for pedido in pedidos_pendentes:
-                # Itera sobre cada item dentro do pedido
-                for item in pedido.itens.all():
-                    # Para cada item, cria a movimentação de ENTRADA no estoque
-                    Movimentacao.objects.create(
-                        tipo="ENTRADA",
-                        produto=item.produto,
-                        quantidade=item.quantidade,
-                        origem=None, # A origem é externa (o fornecedor)
-                        destino=cozinha_central
-                    )
-                
-                # Após processar todos os itens, atualiza o status do pedido
-                pedido.status = "RECEBIDO"
-                pedido.data_recebimento = timezone.now()
-                pedido.save()
+        pedidos_pendentes = list(queryset.filter(status__in=["PENDENTE", "RECEBIDO_PARCIALMENTE"]))
+
+        # Cada pedido é um recebimento: uma gravação em lote no estoque por pedido
+        for pedido in pedidos_pendentes:
+            receber_pedido_compra(pedido, cozinha_central)
 
         # Informa ao usuário que a operação foi um sucesso
         if pedidos_pendentes:
-            self.message_user(request, f"{pedidos_pendentes.count()} pedido(s) foram marcados como 'Recebido' e o estoque foi atualizado.", messages.SUCCESS)
+            self.message_user(request, f"{len(pedidos_pendentes)} pedido(s) foram marcados como 'Recebido' e o estoque foi atualizado.", messages.SUCCESS)
         else:
             self.message_user(request, "Nenhum pedido pendente foi selecionado.", messages.WARNING)
 
 
 @admin.register(ContagemEstoque)
-class ContagemEstoqueAdmin(admin.ModelAdmin):
+class ContagemEstoqueAdmin(EscopoUnidadeAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'unidade', 'data_contagem', 'responsavel', 'status')
     list_filter = ('unidade', 'status')
     change_form_template = 'admin/estoque/contagemestoque/change_form.html'
+    autocomplete_fields = ['produtos_programados']
     
     # ✅ Adicionamos as ações (Botões do topo)
     actions = ['aprovar_e_ajustar_estoque', 'cancelar_contagem']
     
 # --- SEGURANÇA E TRAVAS ---
 
-    def get_queryset(self, request):
-        """ ✅ CHECK: Gerente só vê as contagens da própria unidade """
-        qs = super().get_queryset(request)
-        if not request.user.is_superuser:
-            user_slug = request.user.username.lower().replace(" ", "").replace("ori", "").strip()
-            qs = qs.filter(unidade__nome__icontains=user_slug)
-        return qs    
+    # ✅ CHECK: Gerente só vê as contagens da própria unidade (EscopoUnidadeAdminMixin)
 
     def get_actions(self, request):
         """ ✅ CHECK: Esconde os botões 'Aprovar' e 'Cancelar' de quem não é ADM """
@@ -629,77 +802,61 @@ class ContagemEstoqueAdmin(admin.ModelAdmin):
         
         return ('status',)
 
-    def get_form(self, request, obj=None, **kwargs):
-        """ ✅ CHECK: Unidade já vem preenchida e é a ÚNICA opção disponível """
-        form = super().get_form(request, obj, **kwargs)
-        
-        if not request.user.is_superuser:
-            # Identifica a unidade do gerente pelo username
-            user_slug = request.user.username.lower().replace(" ", "").replace("ori", "").strip()
-            unidade_queryset = Unidade.objects.filter(nome__icontains=user_slug)
-            
-            if 'unidade' in form.base_fields:
-                # 1. Filtra a lista (só vai aparecer a dele na setinha)
-                form.base_fields['unidade'].queryset = unidade_queryset
-                
-                # 2. Se for uma contagem nova, já deixa selecionada
-                if not obj and unidade_queryset.exists():
-                    form.base_fields['unidade'].initial = unidade_queryset.first()
-                    
-                    # 💡 Dica extra: se quiser que ele nem consiga clicar, 
-                    # mas o campo continue sendo enviado no formulário:
-                    # form.base_fields['unidade'].widget.attrs['style'] = 'pointer-events: none;'
-                
-        return form
+    # ✅ CHECK: Unidade já vem preenchida e é a ÚNICA opção disponível (EscopoUnidadeAdminMixin)
 
     @admin.action(description="Aprovar Contagem e Forçar Estoque Real")
     def aprovar_e_ajustar_estoque(self, request, queryset):
-        contagens_para_processar = queryset.filter(status='pendente')
-        
-        if not contagens_para_processar:
+        if not queryset.filter(status='pendente').exists():
             self.message_user(request, "Nenhuma contagem PENDENTE selecionada.", messages.WARNING)
             return
 
-        with transaction.atomic():
-            for contagem in contagens_para_processar:
-                # ✅ BUSCA DIRETA: Pegamos todos os itens salvos nesta contagem
-                # Se der erro de 'itemcontagemestoque_set', tente 'itens'
-                itens_salvos = ItemContagemEstoque.objects.filter(contagem=contagem)
-                
-                for item in itens_salvos:
-                    # ✅ O "PULO DO GATO": Forçamos o estoque a ser exatamente a 'quantidade_fisica'
-                    estoque_real, created = Estoque.objects.get_or_create(
-                        unidade=contagem.unidade,
-                        produto=item.produto,
-                        defaults={'quantidade': 0}
-                    )
-                    
-                    # Aqui a mágica acontece: o estoque vira o seu "150"
-                    estoque_real.quantidade = item.quantidade_fisica
-                    estoque_real.save()
-
-                    # Criamos a movimentação apenas para registro histórico
-                    diferenca = item.quantidade_fisica - item.quantidade_sistema
-                    if diferenca != 0:
-                        Movimentacao.objects.create(
-                            tipo="AJUSTE",
-                            produto=item.produto,
-                            quantidade=abs(diferenca),
-                            origem=contagem.unidade if diferenca < 0 else None,
-                            destino=contagem.unidade if diferenca > 0 else None
-                        )
-                
-                # Finaliza o processo
-                contagem.status = 'aprovado'
-                contagem.save()
-        
-        self.message_user(request, "Estoque atualizado com sucesso conforme a contagem física!", messages.SUCCESS)
+        # ✅ Aprovação em lote: um upsert do Estoque e um bulk_create de AJUSTES por unidade
+        aprovadas = aprovar_contagens(queryset)
+
+        self.message_user(request, f"{aprovadas} contagem(ns) aprovada(s). Estoque atualizado com sucesso conforme a contagem física!", messages.SUCCESS)
 
     @admin.action(description="Cancelar contagens selecionadas")
     def cancelar_contagem(self, request, queryset):
         queryset.filter(status='pendente').update(status='cancelado')
         self.message_user(request, "Contagens canceladas com sucesso.")
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                '<path:object_id>/salvar-itens/',
+                self.admin_site.admin_view(self.salvar_itens_view),
+                name='salvar-itens-contagem'
+            ),
+        ]
+        return custom_urls + urls
+
+    def _itens_para_contagem(self, contagem):
+        """ Monta a tabela de contagem com poucas consultas, qualquer que seja o tamanho do catálogo. """
+        todos_insumos = Produto.objects.filter(tipo='INSUMO')
+        # ✅ Contagem cíclica: só os insumos programados
+        programados = list(contagem.produtos_programados.values_list('id', flat=True))
+        if programados:
+            todos_insumos = todos_insumos.filter(id__in=programados)
+
+        estoque_sistema = Estoque.objects.filter(unidade=contagem.unidade)
+        if programados:
+            estoque_sistema = estoque_sistema.filter(produto_id__in=programados)
+        estoque_sistema = dict(estoque_sistema.values_list('produto_id', 'quantidade'))
+        quantidades_fisicas = dict(
+            ItemContagemEstoque.objects.filter(contagem=contagem).values_list('produto_id', 'quantidade_fisica')
+        )
+        todos_insumos = todos_insumos.order_by('nome').values_list('id', 'nome')
+        return [
+            {
+                'produto_id': produto_id,
+                'produto_nome': produto_nome,
+                'quantidade_sistema': estoque_sistema.get(produto_id, 0),
+                'quantidade_fisica': quantidades_fisicas.get(produto_id),
+            }
+            for produto_id, produto_nome in todos_insumos
+        ]
+
     # ✅ 2. VIEW DE EDIÇÃO (Bloqueia se não for pendente)
     def change_view(self, request, object_id, form_url='', extra_context=None):
         extra_context = extra_context or {}
@@ -710,52 +867,158 @@ class ContagemEstoqueAdmin(admin.ModelAdmin):
             extra_context['contagem_finalizada'] = True
             return super().change_view(request, object_id, form_url, extra_context=extra_context)
 
-        # Lógica para carregar os insumos na tabela
-        todos_insumos = Produto.objects.filter(tipo='INSUMO').order_by('nome')
-        itens_para_contagem = []
-        for produto in todos_insumos:
-            try:
-                estoque_atual = Estoque.objects.get(unidade=contagem.unidade, produto=produto)
-                qtd_sistema = estoque_atual.quantidade
-            except Estoque.DoesNotExist:
-                qtd_sistema = 0
-
-            item_existente = ItemContagemEstoque.objects.filter(contagem=contagem, produto=produto).first()
-            qtd_fisica = item_existente.quantidade_fisica if item_existente else None
-
-            itens_para_contagem.append({
-                'produto_id': produto.id,
-                'produto_nome': produto.nome,
-                'quantidade_sistema': qtd_sistema,
-                'quantidade_fisica': qtd_fisica,
-            })
-        
-        extra_context['itens_para_contagem'] = itens_para_contagem
-        
-        # Lógica de Salvar (POST)
-        if request.method == 'POST' and '_save_contagem' in request.POST:
+        # Lógica de Salvar (POST) - envio da folha inteira, mantido como alternativa ao salvamento automático
+        if contagem and request.method == 'POST' and '_save_contagem' in request.POST:
+            quantidades = {}
+            for key, valor_str in request.POST.items():
+                if not key.startswith('produto_') or not valor_str.strip():
+                    continue
+                try:
+                    quantidade = float(valor_str.replace(',', '.'))
+                except ValueError:
+                    continue
+                if math.isfinite(quantidade):
+                    quantidades[int(key.split('_')[1])] = quantidade
+
             with transaction.atomic():
-                for item in itens_para_contagem:
-                    p_id = item['produto_id']
-                    valor_str = request.POST.get(f'produto_{p_id}')
-                    
-                    if valor_str and valor_str.strip() != '':
-                        try:
-                            qtd_f = float(valor_str.replace(',', '.'))
-                            prod = Produto.objects.get(id=p_id)
-                            ItemContagemEstoque.objects.update_or_create(
-                                contagem=contagem, produto=prod,
-                                defaults={'quantidade_sistema': item['quantidade_sistema'], 'quantidade_fisica': qtd_f}
-                            )
-                        except (ValueError, Produto.DoesNotExist):
-                            continue
-            
+                salvar_itens_contagem(contagem, quantidades)
+
             self.message_user(request, "Contagem salva com sucesso!", messages.SUCCESS)
             return self.response_post_save_change(request, contagem)
 
+        if contagem:
+            itens_para_contagem = self._itens_para_contagem(contagem)
+            extra_context['itens_para_contagem'] = itens_para_contagem
+            # Só os códigos dos produtos desta folha (na contagem cíclica, poucos insumos)
+            extra_context['codigos_barras'] = dict(
+                CodigoBarras.objects.filter(produto_id__in=[item['produto_id'] for item in itens_para_contagem])
+                .values_list('codigo', 'produto_id')
+            )
+            extra_context['url_salvar_itens'] = reverse('admin:salvar-itens-contagem', args=[contagem.pk])
+
         return super().change_view(request, object_id, form_url, extra_context=extra_context)
 
+    def salvar_itens_view(self, request, object_id):
+        """
+        ✅ SALVAMENTO AUTOMÁTICO: recebe só as linhas alteradas, em JSON.
+        Corpo: {"itens": [{"produto_id": 12, "quantidade_fisica": 30}, ...]}
+        Resposta: {"salvos": [...], "ignorados": [...]}; linhas com valor inválido vão para "ignorados".
+        """
+        if request.method != 'POST':
+            return JsonResponse({"error": "Método não permitido."}, status=405)
+
+        contagem = self.get_object(request, object_id)
+        if contagem is None or not self.has_change_permission(request, contagem):
+            return JsonResponse({"error": "Contagem não encontrada."}, status=404)
+        if contagem.status != 'pendente':
+            return JsonResponse({"error": f"Contagem não está pendente (Status: {contagem.get_status_display()})."}, status=409)
+
+        try:
+            itens = json.loads(request.body or b'{}').get('itens', [])
+            if not isinstance(itens, list):
+                raise TypeError
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({"error": "Formato inválido. Envie {\"itens\": [{\"produto_id\": ..., \"quantidade_fisica\": ...}]}."}, status=400)
+
+        # Cada linha é validada sozinha: um valor ruim não derruba as linhas boas do mesmo envio
+        quantidades = {}
+        ignorados = []
+        for item in itens:
+            try:
+                produto_id = item['produto_id']
+            except (TypeError, KeyError):
+                continue
+            try:
+                quantidade = float(str(item['quantidade_fisica']).replace(',', '.'))
+                produto_id = int(produto_id)
+            except (ValueError, TypeError, KeyError):
+                ignorados.append(produto_id)
+                continue
+            if math.isfinite(quantidade):
+                quantidades[produto_id] = quantidade
+            else:
+                ignorados.append(produto_id)
+
+        with transaction.atomic():
+            salvos = salvar_itens_contagem(contagem, quantidades)
+
+        ignorados += sorted(set(quantidades) - set(salvos))
+        return JsonResponse({"salvos": salvos, "ignorados": ignorados})
+
     # ✅ Redireciona para preencher os itens logo após criar o cabeçalho
     def response_add(self, request, obj, post_url_continue=None):
         return redirect(reverse('admin:estoque_contagemestoque_change', args=[obj.pk]))
 
+
+@admin.register(ClassificacaoABC)
+class ClassificacaoABCAdmin(admin.ModelAdmin):
+    list_display = ('unidade', 'produto', 'classe', 'consumo_periodo', 'valor_consumo', 'ultima_contagem', 'calculado_em')
+    list_filter = ('unidade', 'classe')
+    search_fields = ('produto__nome',)
+    list_select_related = ('unidade', 'produto')
+    readonly_fields = ('consumo_periodo', 'valor_consumo', 'calculado_em')
+    actions = ['recalcular_curva_abc']
+
+    @admin.action(description="Recalcular curva ABC das unidades selecionadas")
+    def recalcular_curva_abc(self, request, queryset):
+        unidades = Unidade.objects.filter(id__in=queryset.values('unidade_id'))
+        total = recalcular_classificacao_abc(unidades=unidades)
+        self.message_user(request, f"Curva ABC recalculada ({total} insumo(s) classificados).", messages.SUCCESS)
+
+
+@admin.register(PerfilamentoRequisicao)
+class PerfilamentoRequisicaoAdmin(admin.ModelAdmin):
+    """ Perfilamentos pedidos com '?_perfilar=1' (estoque/perfilamento.py). Só superusuários veem; só leitura. """
+    list_display = ('criado_em', 'metodo', 'caminho', 'view', 'status_code', 'ms_total', 'consultas', 'ms_sql', 'usuario', 'downloads')
+    list_filter = ('metodo', 'status_code')
+    search_fields = ('caminho', 'view')
+    list_select_related = ('usuario',)
+    date_hierarchy = 'criado_em'
+    readonly_fields = ('criado_em', 'usuario', 'metodo', 'caminho', 'view', 'status_code', 'ms_total', 'consultas', 'ms_sql',
+                       'downloads', 'funcoes_mais_lentas')
+    exclude = ('arquivo',)
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<path:object_id>/arquivo/<str:extensao>/', self.admin_site.admin_view(self.baixar_arquivo_view),
+                 name='baixar-perfilamento'),
+        ]
+        return custom_urls + urls
+
+    @admin.display(description="Arquivos")
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">.prof</a> · <a href="{}">.sql</a>',
+            reverse('admin:baixar-perfilamento', args=[obj.pk, 'prof']),
+            reverse('admin:baixar-perfilamento', args=[obj.pk, 'sql']),
+        )
+
+    @admin.display(description="Funções mais lentas (tempo cumulativo)")
+    def funcoes_mais_lentas(self, obj):
+        return format_html('<pre style="font-size: 11px; white-space: pre; overflow-x: auto;">{}</pre>', resumo_perfilamento(obj))
+
+    def baixar_arquivo_view(self, request, object_id, extensao):
+        registro = self.get_object(request, object_id)
+        if registro is None or not self.has_view_permission(request, registro) or extensao not in ('prof', 'sql'):
+            raise Http404
+        prof, sql = arquivos_perfilamento(registro)
+        caminho = prof if extensao == 'prof' else sql
+        if not caminho.exists():
+            raise Http404
+        return FileResponse(caminho.open('rb'), as_attachment=True, filename=caminho.name)
@@ -0,0 +1,157 @@
+# estoque/admin_listas.py
+"""
+Peças para changelists de tabelas grandes (Movimentacao, VendaDiaria).
+
+- PaginadorContagemEstimada: o paginador padrão faz um COUNT(*) exato a cada
+  página, que percorre a tabela inteira. Aqui a contagem para em
+  'limite_contagem' linhas (lidas pelo índice) e fica no cache por alguns
+  segundos. Passando do limite, a lista mostra "10000+" e navega por
+  anterior/próxima, sem prometer uma última página.
+- ListaGrandeAdminMixin: liga o paginador e a navegação por anterior/próxima
+  (ChangeListContagemEstimada) num ModelAdmin.
+- FiltroAutocomplete: filtro lateral de um FK que busca as opções conforme se
+  digita (endpoint de autocomplete do admin), em vez de listar todos os
+  produtos na página.
+"""
+
+import hashlib
+
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.utils.functional import cached_property
+
+
+class PaginaSemTotal(Page):
+    """ Página de uma lista sem total exato: se há próxima, sabe-se pela linha a mais lida. """
+
+    def __init__(self, object_list, number, paginator, tem_proxima):
+        super().__init__(object_list, number, paginator)
+        self.tem_proxima = tem_proxima
+
+    def has_next(self):
+        return self.tem_proxima
+
+
+class PaginadorContagemEstimada(Paginator):
+    # Acima disso a contagem para: a lista mostra "10000+" e segue por anterior/próxima
+    limite_contagem = 10000
+    segundos_cache = 60
+
+    pagina_atual = None
+
+    @cached_property
+    def _total_limitado(self):
+        """ Linhas da lista, contadas até limite_contagem + 1 (passou disso, não importa quantas são). """
+        queryset = self.object_list
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:  # Filtro que não casa com nada (ex.: __in=[]): nem vai ao banco
+            return 0
+        chave = 'admin_contagem:' + hashlib.sha256(f'{sql}|{params}'.encode()).hexdigest()
+        total = cache.get(chave)
+        if total is None:
+            total = queryset.order_by()[:self.limite_contagem + 1].count()
+            cache.set(chave, total, self.segundos_cache)
+        return total
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        return min(self._total_limitado, self.limite_contagem)
+
+    @property
+    def contagem_aproximada(self):
+        return hasattr(self.object_list, 'query') and self._total_limitado > self.limite_contagem
+
+    def validate_number(self, number):
+        if not self.contagem_aproximada:
+            return super().validate_number(number)
+        # Sem total exato não há "última página" para conferir: só o número em si
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("Página inválida.")
+        if number < 1:
+            raise EmptyPage("Página menor que 1.")
+        return number
+
+    def page(self, number):
+        if not self.contagem_aproximada:
+            self.pagina_atual = super().page(number)
+            return self.pagina_atual
+        number = self.validate_number(number)
+        inicio = (number - 1) * self.per_page
+        linhas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        if not linhas and number > 1:
+            raise EmptyPage("Página sem resultados.")
+        self.pagina_atual = PaginaSemTotal(linhas[:self.per_page], number, self,
+                                           tem_proxima=len(linhas) > self.per_page)
+        return self.pagina_atual
+
+
+class ContagemAproximada(int):
+    """ O limite da contagem, que aparece nas telas como "10000+". """
+
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+class ChangeListContagemEstimada(ChangeList):
+    """ Total "10000+" e links de anterior/próxima (template admin/estoque/pagination.html). """
+
+    def get_results(self, request):
+        super().get_results(request)
+        if getattr(self.paginator, 'contagem_aproximada', False):
+            self.result_count = ContagemAproximada(self.result_count)
+
+    @property
+    def url_pagina_anterior(self):
+        return self.get_query_string({PAGE_VAR: self.page_num - 1}) if self.page_num > 1 else None
+
+    @property
+    def url_proxima_pagina(self):
+        pagina = getattr(self.paginator, 'pagina_atual', None)
+        if pagina is None or not pagina.has_next():
+            return None
+        return self.get_query_string({PAGE_VAR: self.page_num + 1})
+
+
+class ListaGrandeAdminMixin:
+    """ Changelist de tabela com milhões de linhas: contagem limitada e sem a segunda contagem do total. """
+    paginator = PaginadorContagemEstimada
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListContagemEstimada
+
+
+class FiltroAutocomplete(admin.RelatedFieldListFilter):
+    """
+    Uso: list_filter = (('produto', FiltroAutocomplete),)
+
+    O admin do modelo relacionado precisa de search_fields (é ele que responde
+    à busca). Só a opção selecionada é carregada do banco.
+    """
+    template = 'admin/estoque/filtro_autocomplete.html'
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        relacionados = field.related_model._default_manager.filter(pk=self.lookup_val)
+        return [(obj.pk, str(obj)) for obj in relacionados]
+
+    def has_output(self):
+        return True
+
+    @property
+    def selecionado(self):
+        return self.lookup_choices[0] if self.lookup_choices else None
+
+    @property
+    def parametros_autocomplete(self):
+        opts = self.field.model._meta
+        return {'app_label': opts.app_label, 'model_name': opts.model_name, 'field_name': self.field.name}
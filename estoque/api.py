@@ -0,0 +1,108 @@
+# estoque/api.py
+"""
+Peças comuns a todos os ViewSets da API: paginação por cursor e filtros
+declarados em cada ViewSet (configurados como padrão no REST_FRAMEWORK).
+
+Paginação por cursor não faz COUNT(*) nem OFFSET: cada página é uma única
+consulta pelo índice da chave primária, com o mesmo custo na primeira ou na
+milésima página.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacaoPorCursor(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    # A chave primária é única e indexada: ordem estável mesmo com inserções no meio
+    ordering = '-id'
+
+
+def _atravessa_relacao_multipla(model, lookup):
+    """ True se o lookup passa por uma relação 'para muitos' (ex.: itens__produto_id), que duplica linhas. """
+    for parte in lookup.split('__'):
+        try:
+            campo = model._meta.get_field(parte)
+        except FieldDoesNotExist:
+            return False
+        if campo.one_to_many or campo.many_to_many:
+            return True
+        if not campo.is_relation:
+            return False
+        model = campo.related_model
+    return False
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _condicao_por_dia(lookup, valor):
+    """
+    'data__date__gte' com '2025-01-01' vira 'data__gte' com o início do dia no fuso
+    do sistema (e '__date__lte' vira '__lt' com o início do dia seguinte). Comparar
+    o próprio campo usa o índice dele; o '__date' obriga a converter linha a linha.
+    """
+    campo, comparacao = lookup.split('__date__')
+    dia = parse_date(valor)
+    if dia is None:
+        raise ValueError(valor)
+    inicio, fim = _inicio_do_dia(dia), _inicio_do_dia(dia + timedelta(days=1))
+    return {
+        'gte': Q(**{f'{campo}__gte': inicio}),
+        'gt': Q(**{f'{campo}__gte': fim}),
+        'lte': Q(**{f'{campo}__lt': fim}),
+        'lt': Q(**{f'{campo}__lt': inicio}),
+    }[comparacao]
+
+
+class FiltroPorParametros(BaseFilterBackend):
+    """
+    Aplica os filtros declarados no atributo 'filtros' do ViewSet:
+
+        filtros = {
+            'produto': 'produto_id',                    # ?produto=3  ou  ?produto=3,4,5
+            'unidade': ('origem_id', 'destino_id'),     # qualquer um dos campos (OU)
+            'desde': 'data__date__gte',                 # ?desde=2025-01-01
+        }
+
+    Listas separadas por vírgula viram '__in'. Valores inválidos devolvem 400.
+    Os '__date__gte/gt/lte/lt' de DateTimeField viram intervalos no próprio campo
+    (o dia no fuso do sistema), que usam o índice.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for parametro, lookups in getattr(view, 'filtros', {}).items():
+            valor = request.query_params.get(parametro) or ''
+            valores = [v.strip() for v in valor.split(',') if v.strip()]
+            if not valores:
+                continue
+            if isinstance(lookups, str):
+                lookups = (lookups,)
+
+            condicao = Q()
+            try:
+                for lookup in lookups:
+                    if '__date__' in lookup:
+                        if len(valores) > 1:
+                            raise ValueError(valor)
+                        condicao |= _condicao_por_dia(lookup, valores[0])
+                    elif len(valores) > 1:
+                        condicao |= Q(**{f'{lookup}__in': valores})
+                    else:
+                        condicao |= Q(**{lookup: valores[0]})
+                queryset = queryset.filter(condicao)
+                if any(_atravessa_relacao_multipla(queryset.model, lookup) for lookup in lookups):
+                    queryset = queryset.distinct()
+            except (ValueError, TypeError, FieldError, DjangoValidationError):
+                raise ValidationError({parametro: f"Valor inválido: '{valor}'."})
+        return queryset
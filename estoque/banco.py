@@ -0,0 +1,69 @@
+# estoque/banco.py
+"""
+Conexão opcional só de leitura para os relatórios.
+
+Com SQLITE_LEITURA=True no ambiente, settings.DATABASES ganha o alias
+'leitura' (o mesmo arquivo, aberto em modo leitura). As views marcadas com
+@consulta_de_relatorio leem por ele; tudo o mais, e qualquer escrita,
+continua no 'default'. Sem o alias, o roteador não muda nada.
+"""
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_LEITURA = 'leitura'
+
+_em_relatorio = ContextVar('estoque_em_relatorio', default=False)
+
+
+@contextmanager
+def leitura_de_relatorio():
+    """ Dentro do bloco, as consultas vão para o alias de leitura (se configurado). """
+    token = _em_relatorio.set(True)
+    try:
+        yield
+    finally:
+        _em_relatorio.reset(token)
+
+
+def consulta_de_relatorio(view):
+    """ Decorator para views (síncronas ou assíncronas) que só leem. """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def inner(*args, **kwargs):
+            with leitura_de_relatorio():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def inner(*args, **kwargs):
+            with leitura_de_relatorio():
+                return view(*args, **kwargs)
+    return inner
+
+
+class RoteadorRelatorios:
+    """ DATABASE_ROUTERS: leituras de relatório no alias 'leitura'; escritas e migrações sempre no 'default'. """
+
+    def db_for_read(self, model, **hints):
+        if _em_relatorio.get() and ALIAS_LEITURA in connections.databases:
+            return ALIAS_LEITURA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Um objeto lido pelo alias de leitura é salvo no banco principal
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Os dois aliases apontam para o mesmo arquivo
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ALIAS_LEITURA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == ALIAS_LEITURA:
+            return False
+        return None
@@ -0,0 +1,198 @@
+# estoque/contagem_ciclica.py
+"""
+Curva ABC dos insumos por unidade e programação das contagens cíclicas.
+
+Em vez de contar todos os insumos de uma vez, cada unidade conta com mais
+frequência o que pesa mais: A toda semana, B a cada quinze dias e C uma vez
+por mês. Cada folha de contagem fica pequena e rápida de carregar e salvar.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import (Unidade, Produto, Estoque, Movimentacao, ItemPedidoCompra,
+                     ContagemEstoque, ClassificacaoABC)
+
+# Participação acumulada no valor de consumo que define cada classe
+LIMITE_CLASSE_A = 0.80
+LIMITE_CLASSE_B = 0.95
+
+# De quantos em quantos dias cada classe deve ser contada
+FREQUENCIA_CONTAGEM_DIAS = {'A': 7, 'B': 15, 'C': 30}
+
+DIAS_HISTORICO_PADRAO = 90
+
+
+def _ultimo_custo_por_insumo():
+    """ Último preço de compra de cada insumo (uma consulta). Insumos sem compra ficam de fora. """
+    ultimo_preco = (ItemPedidoCompra.objects
+                    .filter(produto=OuterRef('pk'), preco_custo_unitario__isnull=False)
+                    .order_by('-pedido__data_pedido', '-id')
+                    .values('preco_custo_unitario')[:1])
+    return {
+        produto_id: float(preco)
+        for produto_id, preco in (Produto.objects.filter(tipo='INSUMO')
+                                  .annotate(preco=Subquery(ultimo_preco))
+                                  .exclude(preco__isnull=True)
+                                  .values_list('id', 'preco'))
+    }
+
+
+def _classificar(pontuacoes):
+    """
+    Recebe {produto_id: (valor_consumo, consumo)} e devolve {produto_id: classe}.
+    Ordena por valor e depois por giro (quantidade); a classe sai da participação acumulada.
+    """
+    ordenados = sorted(pontuacoes.items(), key=lambda kv: kv[1], reverse=True)
+    total = sum(valor for valor, _ in pontuacoes.values())
+
+    classes = {}
+    acumulado = 0
+    for produto_id, (valor, consumo) in ordenados:
+        if total <= 0 or consumo <= 0:
+            classes[produto_id] = 'C'
+            continue
+        # A classe é decidida pela participação ANTES de somar o item,
+        # assim o item que cruza o limite ainda entra na classe de cima.
+        participacao = acumulado / total
+        if participacao < LIMITE_CLASSE_A:
+            classes[produto_id] = 'A'
+        elif participacao < LIMITE_CLASSE_B:
+            classes[produto_id] = 'B'
+        else:
+            classes[produto_id] = 'C'
+        acumulado += valor
+    return classes
+
+
+def recalcular_classificacao_abc(dias_historico=DIAS_HISTORICO_PADRAO, unidades=None):
+    """
+    Recalcula a curva ABC de todos os insumos em cada unidade, a partir do que
+    SAIU da unidade nos últimos 'dias_historico' dias: SAÍDAS e TRANSFERÊNCIAS
+    com a unidade na origem (a Cozinha Central abastece as lojas só por transferência).
+
+    O valor de consumo usa o último preço de compra do insumo ou, sem compra com
+    preço, o custo médio do insumo na própria unidade. Quem não tem nenhum dos
+    dois não tem valor em R$ para comparar: forma uma curva separada, só pelo
+    giro (quantidade), para não ficar sempre em C nem disputar com os valores em R$.
+
+    Usa uma consulta agregada para todo o histórico e um upsert em lote.
+    Retorna o número de linhas gravadas.
+    """
+    unidades = list(unidades if unidades is not None else Unidade.objects.all())
+    desde = timezone.now() - timedelta(days=dias_historico)
+
+    consumo = {
+        (origem_id, produto_id): total
+        for origem_id, produto_id, total in (
+            Movimentacao.objects
+            .filter(tipo__in=['SAIDA', 'TRANSFERENCIA'], data__gte=desde, produto__tipo='INSUMO',
+                    origem__in=unidades)
+            .values('origem_id', 'produto_id')
+            .annotate(total=Sum('quantidade'))
+            .values_list('origem_id', 'produto_id', 'total')
+        )
+    }
+    custos = _ultimo_custo_por_insumo()
+    custos_medios = {
+        (unidade_id, produto_id): float(custo)
+        for unidade_id, produto_id, custo in (
+            Estoque.objects.filter(unidade__in=unidades, produto__tipo='INSUMO', custo_medio__gt=0)
+            .values_list('unidade_id', 'produto_id', 'custo_medio')
+        )
+    }
+    insumos_ids = list(Produto.objects.filter(tipo='INSUMO').values_list('id', flat=True))
+
+    registros = []
+    for unidade in unidades:
+        com_preco, sem_preco = {}, {}
+        for produto_id in insumos_ids:
+            qtd = consumo.get((unidade.id, produto_id), 0) or 0
+            custo = custos.get(produto_id) or custos_medios.get((unidade.id, produto_id))
+            if custo:
+                com_preco[produto_id] = (qtd * custo, qtd)
+            else:
+                sem_preco[produto_id] = (qtd, qtd)
+
+        classes = {**_classificar(com_preco), **_classificar(sem_preco)}
+        for produto_id in insumos_ids:
+            if produto_id in com_preco:
+                valor, qtd = com_preco[produto_id]
+            else:
+                valor, qtd = 0, sem_preco[produto_id][1]
+            registros.append(ClassificacaoABC(
+                unidade=unidade,
+                produto_id=produto_id,
+                classe=classes[produto_id],
+                consumo_periodo=qtd,
+                valor_consumo=valor,
+                calculado_em=timezone.now(),
+            ))
+
+    ClassificacaoABC.objects.bulk_create(
+        registros,
+        update_conflicts=True,
+        unique_fields=['unidade', 'produto'],
+        update_fields=['classe', 'consumo_periodo', 'valor_consumo', 'calculado_em'],
+    )
+    return len(registros)
+
+
+def insumos_a_contar(unidade, hoje=None, max_itens=None):
+    """
+    Insumos da unidade cuja contagem está vencida, conforme a frequência da classe.
+    Os mais atrasados (e, no empate, os de classe A) vêm primeiro; 'max_itens'
+    limita o tamanho da folha e o restante entra na próxima rodada.
+    """
+    hoje = hoje or timezone.now()
+    vencidos = []
+    for produto_id, classe, ultima in (ClassificacaoABC.objects
+                                       .filter(unidade=unidade, produto__tipo='INSUMO')
+                                       .values_list('produto_id', 'classe', 'ultima_contagem')):
+        vencimento = ultima + timedelta(days=FREQUENCIA_CONTAGEM_DIAS[classe]) if ultima else None
+        if vencimento is None or vencimento <= hoje:
+            atraso = (hoje - vencimento).days if vencimento else float('inf')
+            vencidos.append((-atraso, classe, produto_id))
+
+    vencidos.sort()
+    produtos = [produto_id for _, _, produto_id in vencidos]
+    return produtos[:max_itens] if max_itens else produtos
+
+
+def gerar_contagens_ciclicas(unidades=None, max_itens=None, responsavel="Agendador (contagem cíclica)"):
+    """
+    Cria uma ContagemEstoque parcial para cada unidade que tem insumos vencidos.
+    Unidades que já têm uma contagem pendente são puladas, para não acumular folhas.
+    Retorna a lista de contagens criadas.
+    """
+    unidades = unidades if unidades is not None else Unidade.objects.all()
+    com_pendente = set(
+        ContagemEstoque.objects.filter(status='pendente').values_list('unidade_id', flat=True)
+    )
+
+    criadas = []
+    for unidade in unidades:
+        if unidade.id in com_pendente:
+            continue
+        produtos = insumos_a_contar(unidade, max_itens=max_itens)
+        if not produtos:
+            continue
+        with transaction.atomic():
+            contagem = ContagemEstoque.objects.create(
+                unidade=unidade,
+                responsavel=responsavel,
+                observacoes=f"Contagem cíclica gerada automaticamente ({len(produtos)} insumo(s)).",
+            )
+            contagem.produtos_programados.set(produtos)
+        criadas.append(contagem)
+    return criadas
+
+
+def registrar_contagem_realizada(unidade_id, produtos_ids, quando=None):
+    """ Marca os insumos como contados na unidade (chamado na aprovação da contagem). """
+    ClassificacaoABC.objects.filter(unidade_id=unidade_id, produto_id__in=produtos_ids).update(
+        ultima_contagem=quando or timezone.now()
+    )
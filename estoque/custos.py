@@ -0,0 +1,242 @@
+# estoque/custos.py
+"""
+Valorização do estoque pelo custo médio ponderado móvel.
+
+O custo médio de cada (unidade, insumo) fica gravado no próprio Estoque e é
+atualizado de forma incremental: a cada ENTRADA com preço (recebimento de
+compra) e a cada TRANSFERENCIA, que leva o custo médio da origem para o destino.
+Saídas e ajustes não mudam o custo médio, só a quantidade.
+
+Assim o valor do estoque sai de uma única consulta, sem reprocessar o
+histórico de compras.
+
+O mesmo custo alimenta o custo teórico das fichas técnicas (Produto Final),
+calculado uma vez com memorização e gravado no próprio Produto.
+"""
+
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Unidade, Estoque, Produto, Ingrediente, ItemPedidoCompra
+
+# Unidade cujo custo médio é a referência de custo dos insumos (onde as compras entram)
+UNIDADE_REFERENCIA_CUSTO = "Cozinha Central"
+
+CASAS_CUSTO = Decimal('0.0001')
+
+
+def _novo_custo_medio(qtd_atual, custo_atual, qtd_entrada, custo_entrada):
+    """ (estoque atual × custo atual + entrada × custo da entrada) / quantidade total """
+    base = Decimal(str(max(qtd_atual, 0)))
+    entrada = Decimal(str(qtd_entrada))
+    if base + entrada <= 0:
+        return custo_entrada
+    return ((base * custo_atual + entrada * custo_entrada) / (base + entrada)).quantize(CASAS_CUSTO)
+
+
+def _ultimos_precos_compra(produtos_ids):
+    """ Último preço de compra de cada produto, numa consulta. Quem nunca foi comprado com preço fica de fora. """
+    ultimo_preco = (ItemPedidoCompra.objects
+                    .filter(produto=OuterRef('pk'), preco_custo_unitario__isnull=False)
+                    .order_by('-pedido__data_pedido', '-id')
+                    .values('preco_custo_unitario')[:1])
+    return {
+        produto_id: Decimal(str(preco))
+        for produto_id, preco in (Produto.objects.filter(id__in=produtos_ids)
+                                  .annotate(preco=Subquery(ultimo_preco))
+                                  .exclude(preco__isnull=True)
+                                  .values_list('id', 'preco'))
+    }
+
+
+def atualizar_custos_medios(movimentacoes):
+    """
+    Atualiza o custo médio dos destinos das movimentações (ainda não aplicadas
+    no estoque) e preenche o 'custo_unitario' das TRANSFERENCIAS com o custo
+    médio da origem.
+
+    Se a origem ainda não tem custo (estoque vindo de AJUSTE ou de ENTRADA sem
+    preço), a transferência leva o último preço de compra do insumo; sem nenhum
+    dos dois, o custo do destino fica como está, em vez de ser puxado para zero.
+
+    Lê as linhas de Estoque envolvidas numa consulta e grava os novos custos
+    num upsert em lote. As movimentações são processadas em ordem, então várias
+    entradas do mesmo item no mesmo lote se acumulam corretamente.
+
+    Se o custo médio da Cozinha Central (a referência das fichas técnicas)
+    mudou, recalcula também o custo teórico das receitas que usam esses insumos.
+
+    Deve ser chamada ANTES de aplicar as quantidades no estoque, dentro da mesma transação.
+    """
+    relevantes = [
+        mov for mov in movimentacoes
+        if mov.destino_id and (
+            mov.tipo == 'TRANSFERENCIA' or (mov.tipo == 'ENTRADA' and mov.custo_unitario is not None)
+        )
+    ]
+    if not relevantes:
+        return
+    relevantes_ids = {id(mov) for mov in relevantes}
+
+    unidades_ids = {mov.destino_id for mov in relevantes} | {mov.origem_id for mov in relevantes if mov.origem_id}
+    produtos_ids = {mov.produto_id for mov in relevantes}
+    posicao = {
+        (unidade_id, produto_id): [quantidade, custo]
+        for unidade_id, produto_id, quantidade, custo in (
+            Estoque.objects.filter(unidade_id__in=unidades_ids, produto_id__in=produtos_ids)
+            .values_list('unidade_id', 'produto_id', 'quantidade', 'custo_medio')
+        )
+    }
+
+    precos_compra = None  # Só consultados se alguma origem estiver sem custo
+    alterados = set()
+    for mov in movimentacoes:
+        if mov.tipo == 'AJUSTE' or mov.produto_id not in produtos_ids:
+            continue
+        origem = posicao.setdefault((mov.origem_id, mov.produto_id), [0, Decimal(0)]) if mov.origem_id else None
+        destino = posicao.setdefault((mov.destino_id, mov.produto_id), [0, Decimal(0)]) if mov.destino_id else None
+
+        if id(mov) in relevantes_ids:
+            if mov.tipo == 'TRANSFERENCIA' and origem is not None:
+                custo_origem = origem[1]
+                if not custo_origem > 0:
+                    if precos_compra is None:
+                        precos_compra = _ultimos_precos_compra({m.produto_id for m in relevantes if m.tipo == 'TRANSFERENCIA'})
+                    custo_origem = precos_compra.get(mov.produto_id)
+                mov.custo_unitario = custo_origem
+            if mov.custo_unitario is not None:
+                destino[1] = _novo_custo_medio(destino[0], destino[1], mov.quantidade, Decimal(str(mov.custo_unitario)))
+                alterados.add((mov.destino_id, mov.produto_id))
+
+        # Mantém a quantidade em memória para a próxima movimentação do mesmo lote
+        if origem is not None:
+            origem[0] -= mov.quantidade
+        if destino is not None:
+            destino[0] += mov.quantidade
+
+    Estoque.objects.bulk_create(
+        [Estoque(unidade_id=unidade_id, produto_id=produto_id, custo_medio=posicao[(unidade_id, produto_id)][1])
+         for unidade_id, produto_id in alterados],
+        update_conflicts=True,
+        unique_fields=['unidade', 'produto'],
+        update_fields=['custo_medio'],
+    )
+
+    if alterados:
+        referencia = set(Unidade.objects.filter(id__in={unidade_id for unidade_id, _ in alterados},
+                                                nome=UNIDADE_REFERENCIA_CUSTO).values_list('id', flat=True))
+        insumos_referencia = {produto_id for unidade_id, produto_id in alterados if unidade_id in referencia}
+        if insumos_referencia:
+            recalcular_custos_receitas(insumos_ids=insumos_referencia)
+
+
+def valor_estoque_por_unidade(unidades=None):
+    """
+    Valor do estoque (quantidade × custo médio) de cada unidade, em uma consulta.
+    Retorna {unidade_id: Decimal}. Quantidades negativas não entram no valor.
+    """
+    qs = Estoque.objects.filter(quantidade__gt=0)
+    if unidades is not None:
+        qs = qs.filter(unidade__in=unidades)
+    valor = ExpressionWrapper(F('quantidade') * F('custo_medio'),
+                              output_field=DecimalField(max_digits=18, decimal_places=4))
+    return {
+        linha['unidade_id']: (linha['valor'] or Decimal(0)).quantize(Decimal('0.01'))
+        for linha in qs.values('unidade_id').annotate(valor=Sum(valor)).order_by()
+    }
+
+
+def custos_de_referencia(insumos_ids):
+    """
+    Custo de referência de cada insumo: o custo médio na Cozinha Central ou,
+    se ainda não houver, o último preço de compra. Duas consultas ao todo.
+    """
+    insumos_ids = set(insumos_ids)
+    custos = {
+        produto_id: custo
+        for produto_id, custo in Estoque.objects.filter(
+            unidade__nome=UNIDADE_REFERENCIA_CUSTO, produto_id__in=insumos_ids, custo_medio__gt=0
+        ).values_list('produto_id', 'custo_medio')
+    }
+
+    faltando = insumos_ids - set(custos)
+    if faltando:
+        custos.update(_ultimos_precos_compra(faltando))
+    return custos
+
+
+def _custo_da_receita(produto_id, receitas, custos_insumos, memo, visitando):
+    """ Custo de um produto pela ficha técnica, com memorização (cada nó é avaliado uma vez). """
+    if produto_id in memo:
+        return memo[produto_id]
+    if produto_id not in receitas:
+        return custos_insumos.get(produto_id, Decimal(0))
+    if produto_id in visitando:  # Receita circular: não entra no custo
+        return Decimal(0)
+
+    visitando.add(produto_id)
+    total = Decimal(0)
+    for insumo_id, quantidade in receitas[produto_id]:
+        custo = _custo_da_receita(insumo_id, receitas, custos_insumos, memo, visitando)
+        total += Decimal(str(quantidade)) * custo
+    visitando.discard(produto_id)
+
+    memo[produto_id] = total.quantize(CASAS_CUSTO)
+    return memo[produto_id]
+
+
+def recalcular_custos_receitas(insumos_ids=None, produtos_ids=None):
+    """
+    Recalcula o custo teórico dos Produtos Finais afetados.
+
+    - 'insumos_ids': insumos cujo preço/custo mudou -> recalcula as receitas que os usam.
+    - 'produtos_ids': produtos finais cuja ficha técnica mudou.
+    - Sem nenhum dos dois, recalcula todos os Produtos Finais.
+
+    O grafo das receitas é carregado de uma vez e cada produto é avaliado uma
+    única vez (memorização). Retorna o número de produtos atualizados.
+    """
+    if insumos_ids is None and produtos_ids is None:
+        afetados = set(Produto.objects.filter(tipo='PRODUTO_FINAL').values_list('id', flat=True))
+    else:
+        afetados = set(produtos_ids or [])
+        # Sobe no grafo: quem usa o que mudou também muda
+        fronteira = set(insumos_ids or []) | afetados
+        while fronteira:
+            usados_em = set(Ingrediente.objects.filter(insumo_id__in=fronteira)
+                            .values_list('produto_final_id', flat=True)) - afetados
+            afetados |= usados_em
+            fronteira = usados_em
+    if not afetados:
+        return 0
+
+    # Desce no grafo: carrega as receitas dos afetados e das sub-receitas
+    receitas = {}
+    pendentes = set(afetados)
+    while pendentes:
+        for produto_final_id, insumo_id, quantidade in (Ingrediente.objects
+                                                        .filter(produto_final_id__in=pendentes)
+                                                        .values_list('produto_final_id', 'insumo_id', 'quantidade')):
+            receitas.setdefault(produto_final_id, []).append((insumo_id, quantidade))
+        todos_ingredientes = {insumo_id for itens in receitas.values() for insumo_id, _ in itens}
+        pendentes = set(Ingrediente.objects.filter(produto_final_id__in=todos_ingredientes - set(receitas))
+                        .values_list('produto_final_id', flat=True).distinct())
+
+    folhas = {insumo_id for itens in receitas.values() for insumo_id, _ in itens} - set(receitas)
+    custos_insumos = custos_de_referencia(folhas)
+
+    memo = {}
+    agora = timezone.now()
+    produtos = []
+    for produto_id in afetados:
+        produtos.append(Produto(
+            id=produto_id,
+            custo_teorico=_custo_da_receita(produto_id, receitas, custos_insumos, memo, set()),
+            custo_calculado_em=agora,
+            # bulk_update não aplica o auto_now; sem isto a sincronização dos coletores não vê o custo novo
+            atualizado_em=agora,
+        ))
+    Produto.objects.bulk_update(produtos, ['custo_teorico', 'custo_calculado_em', 'atualizado_em'])
+    return len(produtos)
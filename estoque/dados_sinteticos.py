@@ -0,0 +1,286 @@
+# estoque/dados_sinteticos.py
+"""
+Gera uma rede de botecos fictícia para medir desempenho (comando
+'gerar_dados_sinteticos' e a suíte de benchmarks).
+
+Uma Cozinha Central e N botecos, M insumos com código de barras e preço,
+produtos finais com ficha técnica e D dias de operação:
+- compras semanais recebidas na Cozinha Central (ENTRADA);
+- reposições a cada dois dias da cozinha para cada boteco (TRANSFERENCIA);
+- vendas diárias por boteco, com a SAÍDA dos insumos pela ficha técnica;
+- uma contagem aprovada por semana em cada boteco (AJUSTE).
+No último dia ficam pendentes uma contagem e uma reposição por boteco e uma
+compra, para as telas de aprovação e recebimento terem o que mostrar.
+
+Tudo é gravado em lote (bulk_create), sem os sinais; o Estoque final é o saldo
+de todas as movimentações geradas, como se tivessem passado pelos sinais.
+"""
+
+import random
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .contagem_ciclica import recalcular_classificacao_abc
+from .custos import recalcular_custos_receitas
+from .models import (Unidade, PerfilUsuario, Produto, CodigoBarras, Estoque, AlteracaoEstoque, VendaDiaria,
+                     Movimentacao, Fornecedor, PedidoCompra, ItemPedidoCompra, Ingrediente, PedidoReposicao,
+                     ItemReposicao, ContagemEstoque, ItemContagemEstoque, LoteContagem, LoteLancamento,
+                     ClassificacaoABC, ProdutoRemovido)
+
+TAMANHO_LOTE = 2000
+UNIDADES_MEDIDA = ['kg', 'litro', 'unidade', 'caixa', 'pacote']
+
+
+def _gravar_com_data(modelo, objetos, campo_data, quando):
+    """ bulk_create + data retroativa (campos auto_now_add ignoram o valor informado). """
+    criados = modelo.objects.bulk_create(objetos, batch_size=TAMANHO_LOTE)
+    if criados:
+        ids = [obj.id for obj in criados]
+        modelo.objects.filter(id__gte=min(ids), id__lte=max(ids)).update(**{campo_data: quando})
+    return criados
+
+
+class _Simulacao:
+    def __init__(self, unidades, insumos, produtos_finais, dias, vendas_por_dia, semente):
+        self.rng = random.Random(semente)
+        self.n_unidades = unidades
+        self.n_insumos = insumos
+        self.n_finais = produtos_finais
+        self.dias = dias
+        self.vendas_por_dia = vendas_por_dia
+        self.saldo = defaultdict(float)        # (unidade_id, produto_id) -> quantidade
+        self.consumo = defaultdict(float)      # (unidade_id, produto_id) -> total vendido no período
+        self.totais = defaultdict(int)
+
+    # --- Cadastros ---
+
+    def cadastros(self):
+        rng = self.rng
+        self.central = Unidade.objects.create(nome="Cozinha Central", endereco="Centro de produção")
+        self.botecos = Unidade.objects.bulk_create([
+            Unidade(nome=f"Boteco {i + 1:02d}", endereco=f"Rua {i + 1}, {rng.randint(10, 999)}")
+            for i in range(self.n_unidades)
+        ])
+        self.fornecedores = Fornecedor.objects.bulk_create([
+            Fornecedor(nome=f"Fornecedor {i + 1:02d}", contato_nome=f"Contato {i + 1}")
+            for i in range(max(1, self.n_insumos // 40))
+        ])
+        self.insumos = Produto.objects.bulk_create([
+            Produto(nome=f"Insumo {i + 1:04d}", tipo='INSUMO', unidade_medida=rng.choice(UNIDADES_MEDIDA))
+            for i in range(self.n_insumos)
+        ], batch_size=TAMANHO_LOTE)
+        self.finais = Produto.objects.bulk_create([
+            Produto(nome=f"Prato {i + 1:04d}", tipo='PRODUTO_FINAL', unidade_medida='unidade',
+                    preco_venda=Decimal(rng.randint(15, 120)))
+            for i in range(self.n_finais)
+        ], batch_size=TAMANHO_LOTE)
+        CodigoBarras.objects.bulk_create([
+            CodigoBarras(produto=insumo, codigo=f"789{insumo.id:010d}") for insumo in self.insumos
+        ], batch_size=TAMANHO_LOTE)
+
+        self.preco = {insumo.id: Decimal(str(round(rng.uniform(2, 80), 2))) for insumo in self.insumos}
+        self.fornecedor_de = {insumo.id: self.fornecedores[i % len(self.fornecedores)]
+                              for i, insumo in enumerate(self.insumos)}
+
+        self.fichas = {}
+        ingredientes = []
+        for final in self.finais:
+            escolhidos = rng.sample(self.insumos, k=min(len(self.insumos), rng.randint(2, 6)))
+            self.fichas[final.id] = [(insumo.id, round(rng.uniform(0.05, 0.5), 3)) for insumo in escolhidos]
+            ingredientes += [Ingrediente(produto_final=final, insumo_id=insumo_id, quantidade=quantidade)
+                             for insumo_id, quantidade in self.fichas[final.id]]
+        Ingrediente.objects.bulk_create(ingredientes, batch_size=TAMANHO_LOTE)
+
+        # Consumo diário esperado de cada insumo num boteco (cada prato vendido sai em média 10,5 vezes)
+        chance_venda = min(1, self.vendas_por_dia / max(1, len(self.finais)))
+        self.uso_esperado = defaultdict(float)
+        for ficha in self.fichas.values():
+            for insumo_id, quantidade in ficha:
+                self.uso_esperado[insumo_id] += quantidade * 10.5 * chance_venda
+
+        self.totais.update(unidades=1 + len(self.botecos), insumos=len(self.insumos), produtos_finais=len(self.finais),
+                           ingredientes=len(ingredientes), fornecedores=len(self.fornecedores))
+
+    # --- Operação de um dia ---
+
+    def _consumo_diario(self, boteco, insumo):
+        """ Média histórica depois da primeira semana; antes, o esperado pela ficha técnica. """
+        if self.dia_atual >= 7:
+            return self.consumo[(boteco.id, insumo.id)] / self.dia_atual
+        return self.uso_esperado[insumo.id]
+
+    def _movimentos(self, movimentos, quando):
+        for mov in movimentos:
+            if mov.origem_id:
+                self.saldo[(mov.origem_id, mov.produto_id)] -= mov.quantidade
+            if mov.destino_id:
+                self.saldo[(mov.destino_id, mov.produto_id)] += mov.quantidade
+        _gravar_com_data(Movimentacao, movimentos, 'data', quando)
+        self.totais['movimentacoes'] += len(movimentos)
+
+    def compras(self, quando, status='RECEBIDO'):
+        """ Compra de cada fornecedor para cobrir a próxima semana da rede inteira. """
+        itens_por_fornecedor = defaultdict(list)
+        for insumo in self.insumos:
+            diario = sum(self._consumo_diario(boteco, insumo) for boteco in self.botecos)
+            quantidade = round(max(diario * 7 * 1.2 - self.saldo[(self.central.id, insumo.id)], 0) + self.rng.uniform(5, 30), 1)
+            itens_por_fornecedor[self.fornecedor_de[insumo.id].id].append((insumo.id, quantidade))
+
+        pedidos = _gravar_com_data(PedidoCompra, [
+            PedidoCompra(fornecedor_id=fornecedor_id, status=status,
+                         data_recebimento=quando if status == 'RECEBIDO' else None,
+                         numero_nota_fiscal=f"{self.rng.randint(10 ** 8, 10 ** 9)}" if status == 'RECEBIDO' else None)
+            for fornecedor_id in itens_por_fornecedor
+        ], 'data_pedido', quando)
+        recebido = status == 'RECEBIDO'
+        itens, entradas = [], []
+        for pedido in pedidos:
+            for produto_id, quantidade in itens_por_fornecedor[pedido.fornecedor_id]:
+                itens.append(ItemPedidoCompra(pedido=pedido, produto_id=produto_id, quantidade=quantidade,
+                                              preco_custo_unitario=self.preco[produto_id],
+                                              quantidade_recebida=quantidade if recebido else 0))
+                if recebido:
+                    entradas.append(Movimentacao(tipo='ENTRADA', produto_id=produto_id, quantidade=quantidade,
+                                                 destino=self.central, custo_unitario=self.preco[produto_id]))
+        ItemPedidoCompra.objects.bulk_create(itens, batch_size=TAMANHO_LOTE)
+        self._movimentos(entradas, quando)
+        self.totais['pedidos_compra'] += len(pedidos)
+
+    def reposicoes(self, quando, status='CONCLUIDO'):
+        """ Cada boteco pede à cozinha os insumos que mais consome, o bastante para dois dias. """
+        pedidos = _gravar_com_data(PedidoReposicao, [
+            PedidoReposicao(unidade_destino=boteco, status=status) for boteco in self.botecos
+        ], 'data_criacao', quando)
+        concluido = status == 'CONCLUIDO'
+        itens, transferencias = [], []
+        for pedido, boteco in zip(pedidos, self.botecos):
+            # O que falta para três dias de consumo, dos insumos mais necessários primeiro
+            faltas = sorted(
+                ((self._consumo_diario(boteco, insumo) * 3 - self.saldo[(boteco.id, insumo.id)], insumo)
+                 for insumo in self.insumos),
+                key=lambda falta: -falta[0],
+            )
+            for falta, insumo in faltas:
+                if falta <= 0:
+                    break
+                quantidade = round(falta + self.rng.uniform(0, 2), 1)
+                itens.append(ItemReposicao(pedido_reposicao=pedido, produto=insumo, quantidade_solicitada=quantidade,
+                                           quantidade_enviada=quantidade if concluido else None))
+                if concluido:
+                    transferencias.append(Movimentacao(tipo='TRANSFERENCIA', produto=insumo, quantidade=quantidade,
+                                                       origem=self.central, destino=boteco,
+                                                       custo_unitario=self.preco[insumo.id]))
+        ItemReposicao.objects.bulk_create(itens, batch_size=TAMANHO_LOTE)
+        self._movimentos(transferencias, quando)
+        self.totais['pedidos_reposicao'] += len(pedidos)
+
+    def vendas(self, quando):
+        vendas, saidas = [], []
+        for boteco in self.botecos:
+            for final in self.rng.sample(self.finais, k=min(len(self.finais), self.vendas_por_dia)):
+                quantidade = self.rng.randint(1, 20)
+                vendas.append(VendaDiaria(unidade=boteco, produto=final, quantidade=quantidade, data=quando.date()))
+                for insumo_id, por_unidade in self.fichas[final.id]:
+                    self.consumo[(boteco.id, insumo_id)] += por_unidade * quantidade
+                    saidas.append(Movimentacao(tipo='SAIDA', produto_id=insumo_id, quantidade=por_unidade * quantidade,
+                                               origem=boteco))
+        VendaDiaria.objects.bulk_create(vendas, batch_size=TAMANHO_LOTE)
+        self._movimentos(saidas, quando)
+        self.totais['vendas'] += len(vendas)
+
+    def contagens(self, boteco, quando, status='aprovado'):
+        contagem = ContagemEstoque.objects.create(unidade=boteco, data_contagem=quando, status=status,
+                                                  responsavel="Gerador de dados sintéticos")
+        itens, ajustes = [], []
+        for insumo in self.insumos:
+            sistema = self.saldo[(boteco.id, insumo.id)]
+            # Perdas: a contagem física costuma vir um pouco abaixo do sistema
+            fisica = max(int(round(sistema * self.rng.uniform(0.9, 1.02))), 0)
+            itens.append(ItemContagemEstoque(contagem=contagem, produto=insumo, lido_em=quando,
+                                             quantidade_sistema=int(round(sistema)), quantidade_fisica=fisica))
+            if status == 'aprovado' and fisica != sistema:
+                diferenca = fisica - sistema
+                ajustes.append(Movimentacao(tipo='AJUSTE', produto=insumo, quantidade=abs(diferenca),
+                                            origem=boteco if diferenca < 0 else None,
+                                            destino=boteco if diferenca > 0 else None))
+        ItemContagemEstoque.objects.bulk_create(itens, batch_size=TAMANHO_LOTE)
+        self._movimentos(ajustes, quando)
+        self.totais['contagens'] += 1
+
+    # --- Tudo junto ---
+
+    def executar(self):
+        self.cadastros()
+        agora = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        inicio = agora - timedelta(days=self.dias)
+
+        for dia in range(self.dias):
+            self.dia_atual = dia
+            quando = inicio + timedelta(days=dia)
+            if dia % 7 == 0:
+                self.compras(quando)
+            if dia % 2 == 0:
+                self.reposicoes(quando + timedelta(hours=2))
+            self.vendas(quando + timedelta(hours=14))
+            for i, boteco in enumerate(self.botecos):
+                if dia % 7 == i % 7 and dia > 0:
+                    self.contagens(boteco, quando + timedelta(hours=23))
+
+        # Pendências do último dia
+        self.dia_atual = self.dias
+        self.compras(agora, status='PENDENTE')
+        self.reposicoes(agora, status='PENDENTE')
+        for boteco in self.botecos:
+            self.contagens(boteco, agora, status='pendente')
+
+        self._gravar_estoque()
+
+    def _gravar_estoque(self):
+        dias = max(1, self.dias)
+        linhas = []
+        for unidade in [self.central] + self.botecos:
+            for insumo in self.insumos:
+                chave = (unidade.id, insumo.id)
+                # Mínimo = três dias de consumo médio (a cozinha, uma semana da rede)
+                minimo = self.consumo[chave] / dias * 3 if unidade != self.central else \
+                    sum(self.consumo[(b.id, insumo.id)] for b in self.botecos) / dias * 7
+                linhas.append(Estoque(unidade=unidade, produto=insumo, quantidade=round(self.saldo[chave], 3),
+                                      estoque_minimo=round(minimo, 1), custo_medio=self.preco[insumo.id]))
+        Estoque.objects.bulk_create(linhas, batch_size=TAMANHO_LOTE)
+        self.totais['linhas_estoque'] = len(linhas)
+
+
+def gerar_dados(unidades=5, insumos=200, produtos_finais=80, dias=60, vendas_por_dia=40, semente=42):
+    """ Gera a rede inteira numa transação. Retorna um dict com o total de cada tipo de registro criado. """
+    simulacao = _Simulacao(unidades, insumos, produtos_finais, dias, vendas_por_dia, semente)
+    with transaction.atomic():
+        simulacao.executar()
+    # Derivados, como depois de uma operação real: custo das receitas e curva ABC
+    recalcular_custos_receitas()
+    recalcular_classificacao_abc()
+    return dict(simulacao.totais)
+
+
+def banco_vazio():
+    return not (Unidade.objects.exists() or Produto.objects.exists())
+
+
+def apagar_dados():
+    """
+    Remove os registros do app com DELETE direto nas tabelas, na ordem das
+    chaves estrangeiras. Pelo ORM, cada venda e movimentação apagada passaria
+    pelos sinais de estorno, uma a uma. Os perfis de usuário ficam, sem unidade.
+    """
+    modelos = (LoteContagem, ItemContagemEstoque, ContagemEstoque.produtos_programados.through, ContagemEstoque,
+               ItemReposicao, PedidoReposicao, ItemPedidoCompra, PedidoCompra, Movimentacao, VendaDiaria,
+               LoteLancamento, AlteracaoEstoque, Estoque, ClassificacaoABC, Ingrediente, CodigoBarras,
+               Unidade, Produto, ProdutoRemovido, Fornecedor)
+    with transaction.atomic():
+        PerfilUsuario.objects.update(unidade=None)
+        with connection.cursor() as cursor:
+            for modelo in modelos:
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}")
@@ -0,0 +1,184 @@
+# estoque/instrumentacao.py
+"""
+Quantas consultas SQL cada requisição faz, quanto tempo elas levam e quanto
+leva a requisição inteira, por view (nome da rota: 'home',
+'admin:gerar_reposicao', 'admin:receber-pedido-reposicao', 'produto-list'...).
+
+- InstrumentacaoMiddleware mede toda requisição (views síncronas e
+  assíncronas) e avisa no logger 'estoque.desempenho' quando a view passa do
+  orçamento (settings.ORCAMENTOS_POR_VIEW, ou ORCAMENTO_REQUISICAO_PADRAO).
+- medir() mede qualquer trecho de código (serviços, comandos, testes).
+- OrcamentoDeConsultasMixin é para os testes: uma view que ganhou um N+1
+  passa do orçamento e o teste falha.
+
+As consultas são contadas por um execute_wrapper instalado em toda conexão
+(signals.py) e atribuídas à medição ativa no contexto (ContextVar). Assim
+entram também as que rodam em sync_to_async, numa thread com outra conexão.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metricas import DURACAO_REQUISICAO, descarregar
+
+logger = logging.getLogger('estoque.desempenho')
+
+_medicoes_ativas = ContextVar('estoque_medicoes_ativas', default=())
+
+
+@dataclass
+class Medicao:
+    consultas: int = 0
+    ms_sql: float = 0.0
+    ms_total: float = 0.0
+    view: str | None = None
+    # Só quando alguém pede o SQL (estoque/perfilamento.py): [(sql, params, ms)]
+    sql: list | None = field(default=None, repr=False)
+
+
+def _contar(execute, sql, params, many, context):
+    medicoes = _medicoes_ativas.get()
+    if not medicoes:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao = (time.perf_counter() - inicio) * 1000
+        for medicao in medicoes:
+            medicao.consultas += 1
+            medicao.ms_sql += duracao
+            if medicao.sql is not None:
+                medicao.sql.append((sql, params, duracao))
+
+
+def instalar_contador(conexao):
+    """ Põe o contador na conexão (uma vez). No início da lista: o execute_wrapper() do Django tira sempre o último. """
+    if _contar not in conexao.execute_wrappers:
+        conexao.execute_wrappers.insert(0, _contar)
+
+
+@contextmanager
+def medir():
+    """ Mede o bloco; medições aninhadas contam as mesmas consultas. """
+    for conexao in connections.all(initialized_only=True):
+        instalar_contador(conexao)
+    medicao = Medicao()
+    token = _medicoes_ativas.set(_medicoes_ativas.get() + (medicao,))
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    finally:
+        medicao.ms_total = (time.perf_counter() - inicio) * 1000
+        _medicoes_ativas.reset(token)
+
+
+def nome_da_view(request):
+    """ Nome da rota resolvida ('admin:gerar_reposicao'); sem nome, o caminho da função. None se não resolveu. """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return match.view_name or match._func_path
+
+
+def orcamento_da_view(view):
+    """ {'consultas': int | None, 'ms': float | None} da view, completando com o padrão. """
+    orcamento = dict(getattr(settings, 'ORCAMENTO_REQUISICAO_PADRAO', {}))
+    orcamento.update(getattr(settings, 'ORCAMENTOS_POR_VIEW', {}).get(view, {}))
+    return {'consultas': orcamento.get('consultas'), 'ms': orcamento.get('ms')}
+
+
+def estouros(medicao, orcamento, com_tempo=True):
+    """ Lista legível do que passou do orçamento (vazia se está dentro). """
+    problemas = []
+    if orcamento['consultas'] is not None and medicao.consultas > orcamento['consultas']:
+        problemas.append(f"{medicao.consultas} consultas (orçamento {orcamento['consultas']})")
+    if com_tempo and orcamento['ms'] is not None and medicao.ms_total > orcamento['ms']:
+        problemas.append(f"{medicao.ms_total:.0f} ms (orçamento {orcamento['ms']:.0f} ms)")
+    return problemas
+
+
+class InstrumentacaoMiddleware:
+    """
+    Deve ser o primeiro do MIDDLEWARE, para contar também sessão e autenticação.
+    A medição fica em request.medicao e response.medicao; a latência vai para
+    as métricas (estoque/metricas.py), que são descarregadas aqui.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        with medir() as medicao:
+            request.medicao = medicao
+            response = self.get_response(request)
+        self._registrar(request, response, medicao)
+        return response
+
+    async def __acall__(self, request):
+        with medir() as medicao:
+            request.medicao = medicao
+            response = await self.get_response(request)
+        self._registrar(request, response, medicao)
+        return response
+
+    def _registrar(self, request, response, medicao):
+        medicao.view = nome_da_view(request)
+        response.medicao = medicao
+        if medicao.view is not None:
+            DURACAO_REQUISICAO.observar(medicao.ms_total / 1000, view=medicao.view)
+        descarregar()
+        if medicao.view is None:
+            return
+
+        problemas = estouros(medicao, orcamento_da_view(medicao.view))
+        mensagem = "%s %s [%s] %d consultas, %.1f ms de SQL, %.1f ms no total"
+        argumentos = (request.method, request.path, medicao.view, medicao.consultas, medicao.ms_sql, medicao.ms_total)
+        if problemas:
+            logger.warning(mensagem + " — acima do orçamento: %s", *argumentos, "; ".join(problemas))
+        else:
+            logger.debug(mensagem, *argumentos)
+
+
+class OrcamentoDeConsultasMixin:
+    """
+    Para TestCase: confere as consultas de uma resposta do self.client contra
+    o orçamento da view (o tempo não entra, varia demais entre máquinas).
+
+        resposta = self.client.get(reverse('admin:gerar_reposicao'), {'unidade_id': unidade.id})
+        self.assertDentroDoOrcamento(resposta)
+
+        with self.assertConsultasAte(10):
+            aprovar_contagens(contagens)
+    """
+
+    def assertDentroDoOrcamento(self, resposta, view=None):
+        medicao = getattr(resposta, 'medicao', None)
+        if medicao is None:
+            self.fail("Resposta sem medição: o InstrumentacaoMiddleware está no MIDDLEWARE?")
+        view = view or medicao.view
+        problemas = estouros(medicao, orcamento_da_view(view), com_tempo=False)
+        if problemas:
+            self.fail(f"{view} passou do orçamento: {'; '.join(problemas)}")
+
+    @contextmanager
+    def assertConsultasAte(self, maximo):
+        with medir() as medicao:
+            yield medicao
+        if medicao.consultas > maximo:
+            self.fail(f"{medicao.consultas} consultas (máximo {maximo})")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from estoque.contagem_ciclica import (recalcular_classificacao_abc, gerar_contagens_ciclicas,
+                                      DIAS_HISTORICO_PADRAO)
+from estoque.models import Unidade
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a curva ABC dos insumos de cada unidade e cria as contagens cíclicas "
+        "dos itens vencidos (A semanal, B quinzenal, C mensal). Feito para rodar diariamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unidade', type=int, action='append', dest='unidades',
+                            help="ID da unidade (pode repetir). Padrão: todas.")
+        parser.add_argument('--dias-historico', type=int, default=DIAS_HISTORICO_PADRAO,
+                            help="Janela de consumo usada na curva ABC (dias).")
+        parser.add_argument('--max-itens', type=int, default=None,
+                            help="Limite de insumos por folha; o restante fica para a próxima rodada.")
+        parser.add_argument('--sem-reclassificar', action='store_true',
+                            help="Usa a curva ABC já gravada, sem recalcular.")
+
+    def handle(self, *args, **options):
+        unidades = Unidade.objects.all()
+        if options['unidades']:
+            unidades = unidades.filter(id__in=options['unidades'])
+
+        if not options['sem_reclassificar']:
+            total = recalcular_classificacao_abc(dias_historico=options['dias_historico'], unidades=unidades)
+            self.stdout.write(f"Curva ABC recalculada: {total} insumo(s) classificados.")
+
+        criadas = gerar_contagens_ciclicas(unidades=unidades, max_itens=options['max_itens'])
+        for contagem in criadas:
+            self.stdout.write(f"Contagem #{contagem.id} criada para {contagem.unidade.nome} "
+                              f"({contagem.produtos_programados.count()} insumo(s)).")
+        self.stdout.write(self.style.SUCCESS(f"{len(criadas)} contagem(ns) cíclica(s) criada(s)."))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.dados_sinteticos import gerar_dados, banco_vazio, apagar_dados
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera uma rede de botecos fictícia (unidades, insumos, fichas técnicas e dias de vendas, "
+        "movimentações, pedidos e contagens) para medir desempenho. Nunca rode em produção."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unidades', type=int, default=5, help="Botecos, além da Cozinha Central.")
+        parser.add_argument('--insumos', type=int, default=200)
+        parser.add_argument('--produtos-finais', type=int, default=80)
+        parser.add_argument('--dias', type=int, default=60, help="Dias de operação até hoje.")
+        parser.add_argument('--vendas-por-dia', type=int, default=40, help="Produtos vendidos por boteco por dia.")
+        parser.add_argument('--semente', type=int, default=42, help="Mesma semente, mesmos dados.")
+        parser.add_argument('--limpar', action='store_true',
+                            help="Apaga unidades, produtos, pedidos, vendas e movimentações existentes antes.")
+
+    def handle(self, *args, **options):
+        if not banco_vazio():
+            if not options['limpar']:
+                raise CommandError("O banco já tem unidades/produtos. Use --limpar para apagá-los antes (cuidado!).")
+            apagar_dados()
+            self.stdout.write("Dados anteriores apagados.")
+
+        inicio = time.perf_counter()
+        totais = gerar_dados(
+            unidades=options['unidades'],
+            insumos=options['insumos'],
+            produtos_finais=options['produtos_finais'],
+            dias=options['dias'],
+            vendas_por_dia=options['vendas_por_dia'],
+            semente=options['semente'],
+        )
+        for nome, total in totais.items():
+            self.stdout.write(f"  {nome}: {total}")
+        self.stdout.write(self.style.SUCCESS(f"Dados sintéticos gerados em {time.perf_counter() - inicio:.1f}s."))
@@ -0,0 +1,223 @@
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+import django
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from estoque.dados_sinteticos import banco_vazio
+from estoque.models import Unidade, Produto, Estoque, VendaDiaria, Movimentacao, ContagemEstoque
+from estoque.services import aplicar_movimentacoes, aprovar_contagens, saidas_das_vendas
+
+PASTA_RESULTADOS = Path(settings.BASE_DIR) / 'benchmarks' / 'resultados'
+
+
+class _Desfazer(Exception):
+    """ Levantada no fim de cada repetição para desfazer o que o caso gravou. """
+
+
+class _Contexto:
+    """ Dados comuns aos casos, carregados uma vez (fora da medição). """
+
+    def __init__(self):
+        self.central = Unidade.objects.filter(nome="Cozinha Central").first()
+        self.boteco = Unidade.objects.exclude(nome="Cozinha Central").order_by('id').first()
+        self.contagem = (ContagemEstoque.objects.filter(status='pendente', unidade=self.boteco)
+                         .order_by('-data_contagem').first())
+        ultima_data = VendaDiaria.objects.order_by('-data').values_list('data', flat=True).first()
+        self.vendas_do_dia = list(VendaDiaria.objects.filter(data=ultima_data))
+        self.insumos = list(Produto.objects.filter(tipo='INSUMO').order_by('id').values_list('id', flat=True))
+        finais = list(Produto.objects.filter(tipo='PRODUTO_FINAL').order_by('id').values_list('nome', flat=True)[:80])
+        self.planilha_vendas = self._planilha(finais)
+
+        self.usuario = get_user_model()(username='benchmark', is_staff=True, is_superuser=True)
+        host = next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h and not h.startswith('.')), 'localhost')
+        self.client = Client(SERVER_NAME=host)
+
+    @staticmethod
+    def _planilha(nomes):
+        """ XLSX no formato do relatório do PDV ('ITEM' = 'código - nome', 'QTDE TOTAL'). """
+        buffer = io.BytesIO()
+        pd.DataFrame({
+            'ITEM': [f"{i:04d} - {nome}" for i, nome in enumerate(nomes)],
+            'QTDE TOTAL': [str(1 + i % 15) for i in range(len(nomes))],
+        }).to_excel(buffer, index=False)
+        return buffer.getvalue()
+
+
+# --- Casos: cada um recebe o contexto e executa uma vez o caminho medido ---
+
+def caso_importar_vendas(ctx):
+    arquivo = io.BytesIO(ctx.planilha_vendas)
+    arquivo.name = 'vendas.xlsx'
+    resposta = ctx.client.post(reverse('admin:importar_vendas'), {'unidade': ctx.boteco.id, 'arquivo_xls': arquivo})
+    assert resposta.status_code == 302, resposta.status_code
+
+
+def caso_explosao_fichas(ctx):
+    saidas_das_vendas(ctx.vendas_do_dia)
+
+
+def caso_aplicar_movimentacoes(ctx):
+    aplicar_movimentacoes([
+        Movimentacao(tipo='TRANSFERENCIA', produto_id=produto_id, quantidade=1,
+                     origem=ctx.central, destino=ctx.boteco)
+        for produto_id in ctx.insumos[:500]
+    ])
+
+
+def caso_home(ctx):
+    assert ctx.client.get(reverse('home')).status_code == 200
+
+
+def caso_relatorios(ctx):
+    assert ctx.client.get(reverse('relatorios')).status_code == 200
+
+
+def caso_gerar_reposicao_sugestao(ctx):
+    resposta = ctx.client.get(reverse('admin:gerar_reposicao'), {'unidade_id': ctx.boteco.id})
+    assert resposta.status_code == 200, resposta.status_code
+
+
+def caso_gerar_reposicao_pedido(ctx):
+    dados = {'unidade_id': ctx.boteco.id}
+    dados.update({f'produto_{produto_id}': '3' for produto_id in ctx.insumos[:50]})
+    resposta = ctx.client.post(reverse('admin:gerar_reposicao') + f'?unidade_id={ctx.boteco.id}', dados)
+    assert resposta.status_code == 302, resposta.status_code
+
+
+def caso_folha_contagem(ctx):
+    resposta = ctx.client.get(reverse('admin:estoque_contagemestoque_change', args=[ctx.contagem.id]))
+    assert resposta.status_code == 200, resposta.status_code
+
+
+def caso_aprovar_contagem(ctx):
+    assert aprovar_contagens(ContagemEstoque.objects.filter(id=ctx.contagem.id)) == 1
+
+
+CASOS = {
+    'importar_vendas': caso_importar_vendas,
+    'explosao_fichas': caso_explosao_fichas,
+    'aplicar_movimentacoes': caso_aplicar_movimentacoes,
+    'home': caso_home,
+    'relatorios': caso_relatorios,
+    'gerar_reposicao_sugestao': caso_gerar_reposicao_sugestao,
+    'gerar_reposicao_pedido': caso_gerar_reposicao_pedido,
+    'folha_contagem': caso_folha_contagem,
+    'aprovar_contagem': caso_aprovar_contagem,
+}
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede os caminhos mais usados (importação de vendas, ficha técnica, movimentações, home, "
+        "relatórios, reposição, folha e aprovação de contagem) e grava os tempos em JSON. "
+        "Tudo o que os casos gravam é desfeito. Gere os dados antes com 'gerar_dados_sinteticos'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=5)
+        parser.add_argument('--caso', action='append', dest='casos', choices=list(CASOS),
+                            help="Roda só este caso (pode repetir). Padrão: todos.")
+        parser.add_argument('--saida', help="Arquivo JSON do resultado (padrão: benchmarks/resultados/<data>.json).")
+        parser.add_argument('--comparar', help="JSON de uma rodada anterior, para mostrar a variação.")
+
+    def handle(self, *args, **options):
+        if banco_vazio():
+            raise CommandError("Banco sem dados. Rode antes: python manage.py gerar_dados_sinteticos")
+
+        casos = options['casos'] or list(CASOS)
+        resultado = {
+            'quando': timezone.now().isoformat(),
+            'commit': _commit_atual(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'banco': connection.vendor,
+            'dados': {
+                'unidades': Unidade.objects.count(),
+                'produtos': Produto.objects.count(),
+                'linhas_estoque': Estoque.objects.count(),
+                'vendas': VendaDiaria.objects.count(),
+                'movimentacoes': Movimentacao.objects.order_by().count(),
+            },
+            'repeticoes': options['repeticoes'],
+            'casos': {},
+        }
+
+        with transaction.atomic():
+            ctx = _Contexto()
+            ctx.usuario.save()
+            ctx.client.force_login(ctx.usuario)
+            for nome in casos:
+                resultado['casos'][nome] = self._medir(CASOS[nome], ctx, options['repeticoes'])
+                medida = resultado['casos'][nome]
+                self.stdout.write(f"{nome:28} mediana {medida['ms_mediana']:>9.1f} ms   "
+                                  f"mín {medida['ms_min']:>9.1f} ms   consultas {medida['consultas']:>5}")
+            # Nem o usuário temporário nem a sessão ficam no banco
+            transaction.set_rollback(True)
+
+        if options['comparar']:
+            self._comparar(json.loads(Path(options['comparar']).read_text()), resultado)
+
+        saida = Path(options['saida']) if options['saida'] else \
+            PASTA_RESULTADOS / f"{timezone.now():%Y%m%d-%H%M%S}.json"
+        saida.parent.mkdir(parents=True, exist_ok=True)
+        saida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {saida}"))
+
+    def _medir(self, caso, ctx, repeticoes):
+        tempos, consultas = [], None
+
+        def contar(execute, sql, params, many, context):
+            contador[0] += 1
+            return execute(sql, params, many, context)
+
+        # A primeira execução só aquece caches (templates, conexões) e não entra na conta
+        for rodada in range(repeticoes + 1):
+            contador = [0]
+            try:
+                with transaction.atomic(), connection.execute_wrapper(contar):
+                    inicio = time.perf_counter()
+                    caso(ctx)
+                    duracao = time.perf_counter() - inicio
+                    raise _Desfazer
+            except _Desfazer:
+                pass
+            if rodada:
+                tempos.append(duracao * 1000)
+                consultas = contador[0]
+        return {
+            'ms_min': round(min(tempos), 2),
+            'ms_mediana': round(statistics.median(tempos), 2),
+            'ms_max': round(max(tempos), 2),
+            'consultas': consultas,
+        }
+
+    def _comparar(self, anterior, atual):
+        self.stdout.write(f"\nComparado com {anterior.get('quando')} (commit {anterior.get('commit')}):")
+        for nome, medida in atual['casos'].items():
+            antes = anterior.get('casos', {}).get(nome)
+            if not antes:
+                continue
+            variacao = (medida['ms_mediana'] - antes['ms_mediana']) / antes['ms_mediana'] * 100 if antes['ms_mediana'] else 0
+            self.stdout.write(f"  {nome:28} {antes['ms_mediana']:>9.1f} -> {medida['ms_mediana']:>9.1f} ms "
+                              f"({variacao:+.0f}%)   consultas {antes['consultas']} -> {medida['consultas']}")
@@ -0,0 +1,80 @@
+# estoque/matriz.py
+"""
+Estoque da rede inteira como uma matriz unidade × produto.
+
+Em vez de milhares de objetos JSON (um por linha de Estoque), o resultado é
+colunar: a lista de unidades, a lista de produtos e uma matriz densa de
+quantidades (linha = unidade, coluna = produto). Os valores saem de uma única
+consulta em Estoque; as combinações sem linha de Estoque valem zero.
+
+O NumPy só é importado quando uma matriz é montada: este módulo entra no
+carregamento das URLs (views.py, views_async.py).
+"""
+
+from .models import Unidade, Produto, Estoque
+
+
+def matriz_estoque(tipo=None, unidades_ids=None, incluir_minimos=False):
+    """
+    Retorna um dict com:
+      'unidades' / 'unidades_nomes', 'produtos' / 'produtos_nomes',
+      'quantidades' (np.ndarray float, unidades × produtos) e,
+      se pedido, 'minimos' com o mesmo formato.
+    """
+    import numpy as np
+
+    unidades = Unidade.objects.order_by('id')
+    produtos = Produto.objects.order_by('id')
+    linhas = Estoque.objects.all()
+    if unidades_ids:
+        unidades = unidades.filter(id__in=unidades_ids)
+        linhas = linhas.filter(unidade_id__in=unidades_ids)
+    if tipo:
+        produtos = produtos.filter(tipo=tipo)
+        linhas = linhas.filter(produto__tipo=tipo)
+
+    unidades = list(unidades.values_list('id', 'nome'))
+    produtos = list(produtos.values_list('id', 'nome'))
+    unidades_ids = np.array([unidade_id for unidade_id, _ in unidades], dtype=np.int64)
+    produtos_ids = np.array([produto_id for produto_id, _ in produtos], dtype=np.int64)
+
+    campos = ['unidade_id', 'produto_id', 'quantidade'] + (['estoque_minimo'] if incluir_minimos else [])
+    valores = np.array(list(linhas.values_list(*campos)), dtype=np.float64).reshape(-1, len(campos))
+
+    # Posição de cada linha de Estoque na matriz (ids já vêm ordenados)
+    linha = np.searchsorted(unidades_ids, valores[:, 0].astype(np.int64))
+    coluna = np.searchsorted(produtos_ids, valores[:, 1].astype(np.int64))
+
+    # Descarta linhas de unidades/produtos criados entre uma consulta e outra
+    validas = (linha < len(unidades_ids)) & (coluna < len(produtos_ids))
+    validas[validas] = ((unidades_ids[linha[validas]] == valores[validas, 0])
+                        & (produtos_ids[coluna[validas]] == valores[validas, 1]))
+    linha, coluna, valores = linha[validas], coluna[validas], valores[validas]
+
+    forma = (len(unidades_ids), len(produtos_ids))
+    resultado = {
+        'unidades': unidades_ids,
+        'unidades_nomes': [nome for _, nome in unidades],
+        'produtos': produtos_ids,
+        'produtos_nomes': [nome for _, nome in produtos],
+        'quantidades': np.zeros(forma),
+    }
+    resultado['quantidades'][linha, coluna] = valores[:, 2]
+    if incluir_minimos:
+        resultado['minimos'] = np.zeros(forma)
+        resultado['minimos'][linha, coluna] = valores[:, 3]
+    return resultado
+
+
+def matriz_para_json(matriz):
+    """ Versão serializável em JSON (listas), com as quantidades arredondadas. """
+    dados = {
+        "unidades": matriz['unidades'].tolist(),
+        "unidades_nomes": matriz['unidades_nomes'],
+        "produtos": matriz['produtos'].tolist(),
+        "produtos_nomes": matriz['produtos_nomes'],
+        "quantidades": matriz['quantidades'].round(3).tolist(),
+    }
+    if 'minimos' in matriz:
+        dados["minimos"] = matriz['minimos'].round(3).tolist()
+    return dados
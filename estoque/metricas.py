@@ -0,0 +1,229 @@
+# estoque/metricas.py
+"""
+Métricas para planejamento de capacidade, expostas em /metricas/ no formato
+texto do Prometheus: linhas importadas e duração das importações,
+movimentações aplicadas, linhas de Estoque alteradas, tempo de renderização
+dos PDFs, latência das views (relatórios inclusive) e espera pelo lock de
+escrita do SQLite.
+
+Sem serviço externo e seguro com vários processos (workers do gunicorn):
+cada processo soma as observações em memória e as descarrega num SQLite da
+pasta compartilhada settings.METRICAS_DIR (no fim de cada requisição, pelo
+InstrumentacaoMiddleware, e na saída do processo). Qualquer worker responde
+/metricas/ com o total de todos.
+
+Quem pode ler /metricas/: equipe logada e o coletor, pelo token
+(METRICAS_TOKEN) ou pelo IP (METRICAS_IPS_PERMITIDOS); ver settings.py.
+Atrás de um proxy reverso, use o token: todo acesso chega com o IP do proxy.
+"""
+
+import atexit
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICAS = {}  # nome -> métrica, na ordem em que foram declaradas
+
+_pendentes = {}  # (nome, rótulos, sufixo) -> incremento ainda não gravado
+_trava_pendentes = threading.Lock()
+_trava_arquivo = threading.Lock()
+_conexao = None  # (pid, sqlite3.Connection): depois de um fork, o filho abre a sua
+
+
+def _somar(incrementos):
+    with _trava_pendentes:
+        for chave, valor in incrementos:
+            _pendentes[chave] = _pendentes.get(chave, 0) + valor
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        METRICAS[nome] = self
+
+    def _chave_rotulos(self, valores):
+        if set(valores) != set(self.rotulos):
+            raise ValueError(f"{self.nome} espera os rótulos {self.rotulos}, recebeu {tuple(valores)}")
+        return ','.join(f'{rotulo}="{_escapar(valores[rotulo])}"' for rotulo in self.rotulos)
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        if valor:
+            _somar([((self.nome, self._chave_rotulos(rotulos), ''), valor)])
+
+    def _amostras(self, valores):
+        if not valores and not self.rotulos:
+            yield self.nome, 0
+        for (rotulos, _), valor in sorted(valores.items()):
+            yield f'{self.nome}{{{rotulos}}}' if rotulos else self.nome, valor
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave_rotulos(rotulos)
+        # Guarda só o bucket onde o valor cai; a soma acumulada é feita na exposição
+        limite = next(b for b in self.buckets if valor <= b)
+        _somar([
+            ((self.nome, chave, _numero(limite)), 1),
+            ((self.nome, chave, 'sum'), valor),
+        ])
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        """ Observa a duração do bloco, em segundos. """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def _amostras(self, valores):
+        por_rotulos = defaultdict(dict)
+        for (rotulos, sufixo), valor in valores.items():
+            por_rotulos[rotulos][sufixo] = valor
+        if not por_rotulos and not self.rotulos:
+            por_rotulos[''] = {}
+
+        for rotulos, dados in sorted(por_rotulos.items()):
+            prefixo = f'{rotulos},' if rotulos else ''
+            acumulado = 0
+            for limite in self.buckets:
+                acumulado += dados.get(_numero(limite), 0)
+                yield f'{self.nome}_bucket{{{prefixo}le="{_numero(limite)}"}}', acumulado
+            sufixo_rotulos = f'{{{rotulos}}}' if rotulos else ''
+            yield f'{self.nome}_sum{sufixo_rotulos}', dados.get('sum', 0)
+            yield f'{self.nome}_count{sufixo_rotulos}', acumulado
+
+
+# --- As métricas do sistema ---
+
+LINHAS_IMPORTADAS = Contador(
+    'estoque_linhas_importadas_total', "Linhas gravadas pelas importações (planilha do PDV e lotes da API).",
+    ['origem'])
+DURACAO_IMPORTACAO = Histograma(
+    'estoque_importacao_segundos', "Duração de cada importação.",
+    ['origem'], buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+MOVIMENTACOES_APLICADAS = Contador(
+    'estoque_movimentacoes_aplicadas_total', "Movimentações gravadas (em lote ou uma a uma, pelos sinais).",
+    ['tipo'])
+ATUALIZACOES_ESTOQUE = Contador(
+    'estoque_atualizacoes_estoque_total', "Linhas de Estoque alteradas por movimentações e contagens.")
+DURACAO_PDF = Histograma(
+    'estoque_pdf_renderizacao_segundos', "Renderização de cada PDF pelo WeasyPrint (sem os que vêm do cache).",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+DURACAO_REQUISICAO = Histograma(
+    'estoque_requisicao_segundos', "Latência de cada requisição, pelo nome da rota (relatórios inclusive).",
+    ['view'])
+ESPERA_LOCK = Histograma(
+    'estoque_sqlite_espera_lock_segundos', "Esperas pelo lock de escrita do SQLite (BEGIN IMMEDIATE acima de 1 ms).",
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5))
+FALHAS_LOCK = Contador(
+    'estoque_sqlite_lock_falhas_total', "Transações que desistiram com 'database is locked' (busy_timeout esgotado).")
+
+
+# --- Arquivo compartilhado ---
+
+def _pasta():
+    return Path(getattr(settings, 'METRICAS_DIR', Path(settings.BASE_DIR) / 'cache' / 'metricas'))
+
+
+def _abrir():
+    global _conexao
+    if _conexao is None or _conexao[0] != os.getpid():
+        pasta = _pasta()
+        pasta.mkdir(parents=True, exist_ok=True)
+        # Timeout curto: métrica nunca pode segurar uma requisição
+        conexao = sqlite3.connect(pasta / 'metricas.sqlite3', timeout=0.05,
+                                  isolation_level=None, check_same_thread=False)
+        conexao.execute('PRAGMA journal_mode = WAL')
+        conexao.execute('PRAGMA synchronous = NORMAL')
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS amostras (
+                nome TEXT, rotulos TEXT, sufixo TEXT, valor REAL,
+                PRIMARY KEY (nome, rotulos, sufixo)
+            ) WITHOUT ROWID
+        """)
+        _conexao = (os.getpid(), conexao)
+    return _conexao[1]
+
+
+def descarregar():
+    """ Soma no arquivo compartilhado o que este processo observou desde a última vez. """
+    global _pendentes
+    with _trava_pendentes:
+        if not _pendentes:
+            return
+        lote, _pendentes = _pendentes, {}
+
+    try:
+        with _trava_arquivo:
+            conexao = _abrir()
+            try:
+                conexao.execute('BEGIN IMMEDIATE')
+                conexao.executemany(
+                    'INSERT INTO amostras VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (nome, rotulos, sufixo) DO UPDATE SET valor = valor + excluded.valor',
+                    [(*chave, valor) for chave, valor in lote.items()],
+                )
+                conexao.execute('COMMIT')
+            except sqlite3.Error:
+                if conexao.in_transaction:
+                    conexao.execute('ROLLBACK')
+                raise
+    except (sqlite3.Error, OSError):
+        # Arquivo ocupado por outro worker (ou sem permissão): fica para a próxima vez
+        _somar(lote.items())
+
+
+def exposicao():
+    """ Todas as métricas, somadas entre os processos, no formato texto do Prometheus. """
+    descarregar()
+    valores = defaultdict(dict)
+    with _trava_arquivo:
+        for nome, rotulos, sufixo, valor in _abrir().execute('SELECT nome, rotulos, sufixo, valor FROM amostras'):
+            valores[nome][(rotulos, sufixo)] = valor
+
+    linhas = []
+    for metrica in METRICAS.values():
+        linhas.append(f'# HELP {metrica.nome} {metrica.ajuda}')
+        linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+        linhas.extend(f'{amostra} {_numero(valor)}' for amostra, valor in metrica._amostras(valores[metrica.nome]))
+    return '\n'.join(linhas) + '\n'
+
+
+# Comandos de gerenciamento e scripts não passam pelo middleware
+atexit.register(descarregar)
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-19 12:57
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remover_itens_duplicados(apps, schema_editor):
+    """Mantém só a linha mais recente de cada (contagem, produto) antes de criar a restrição."""
+    ItemContagemEstoque = apps.get_model("estoque", "ItemContagemEstoque")
+    duplicados = (
+        ItemContagemEstoque.objects.values("contagem_id", "produto_id")
+        .annotate(total=Count("id"), ultimo_id=Max("id"))
+        .filter(total__gt=1)
+    )
+    for dup in duplicados:
+        ItemContagemEstoque.objects.filter(
+            contagem_id=dup["contagem_id"], produto_id=dup["produto_id"]
+        ).exclude(id=dup["ultimo_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0007_remove_contagemestoque_finalizada_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_itens_duplicados, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="itemcontagemestoque",
+            unique_together={("contagem", "produto")},
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.24 on 2026-10-19 12:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0008_itemcontagemestoque_unique_contagem_produto"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="itemcontagemestoque",
+            name="lido_em",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Momento da leitura no coletor (a leitura mais recente vence)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="produto",
+            name="atualizado_em",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="LoteContagem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "lote_id",
+                    models.CharField(
+                        help_text="Identificador do lote gerado pelo coletor",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                ("recebido_em", models.DateTimeField(auto_now_add=True)),
+                ("total_leituras", models.PositiveIntegerField(default=0)),
+                ("leituras_aplicadas", models.PositiveIntegerField(default=0)),
+                (
+                    "contagem",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lotes",
+                        to="estoque.contagemestoque",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.24 on 2026-10-19 12:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0009_lotecontagem_produto_atualizado_em"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CodigoBarras",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "codigo",
+                    models.CharField(
+                        max_length=32, unique=True, verbose_name="Código de Barras"
+                    ),
+                ),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="codigos_barras",
+                        to="estoque.produto",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Código de Barras",
+                "verbose_name_plural": "Códigos de Barras",
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0010_codigobarras"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contagemestoque",
+            name="produtos_programados",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Deixe vazio para contar todos os insumos.",
+                limit_choices_to={"tipo": "INSUMO"},
+                related_name="+",
+                to="estoque.produto",
+                verbose_name="Insumos a contar",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ClassificacaoABC",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "classe",
+                    models.CharField(
+                        choices=[
+                            ("A", "A - Alto valor (contagem semanal)"),
+                            ("B", "B - Valor médio (contagem quinzenal)"),
+                            ("C", "C - Baixo valor (contagem mensal)"),
+                        ],
+                        default="C",
+                        max_length=1,
+                    ),
+                ),
+                (
+                    "consumo_periodo",
+                    models.FloatField(
+                        default=0,
+                        help_text="Quantidade que saiu da unidade no período analisado",
+                    ),
+                ),
+                (
+                    "valor_consumo",
+                    models.FloatField(
+                        default=0,
+                        help_text="Consumo do período multiplicado pelo custo unitário",
+                    ),
+                ),
+                ("ultima_contagem", models.DateTimeField(blank=True, null=True)),
+                ("calculado_em", models.DateTimeField(auto_now=True)),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        limit_choices_to={"tipo": "INSUMO"},
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="estoque.produto",
+                    ),
+                ),
+                (
+                    "unidade",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="estoque.unidade",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Classificação ABC",
+                "verbose_name_plural": "Classificações ABC",
+                "unique_together": {("unidade", "produto")},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def marcar_itens_ja_recebidos(apps, schema_editor):
+    """Pedidos recebidos antes das entregas parciais foram recebidos por inteiro."""
+    ItemPedidoCompra = apps.get_model("estoque", "ItemPedidoCompra")
+    ItemPedidoCompra.objects.filter(pedido__status="RECEBIDO").update(
+        quantidade_recebida=F("quantidade")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0011_classificacaoabc_contagem_produtos_programados"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="itempedidocompra",
+            name="quantidade_recebida",
+            field=models.FloatField(
+                default=0,
+                help_text="Total já recebido deste item (permite entregas parciais).",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="pedidocompra",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDENTE", "Pendente"),
+                    ("RECEBIDO_PARCIALMENTE", "Recebido Parcialmente"),
+                    ("RECEBIDO", "Recebido"),
+                    ("CANCELADO", "Cancelado"),
+                ],
+                default="PENDENTE",
+                max_length=30,
+            ),
+        ),
+        migrations.RunPython(marcar_itens_ja_recebidos, migrations.RunPython.noop),
+    ]
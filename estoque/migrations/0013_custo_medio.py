@@ -0,0 +1,45 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:04
+
+from django.db import migrations, models
+
+
+def custo_inicial_pelo_ultimo_preco(apps, schema_editor):
+    """Ponto de partida do custo médio: o último preço de compra conhecido de cada produto."""
+    Estoque = apps.get_model("estoque", "Estoque")
+    ItemPedidoCompra = apps.get_model("estoque", "ItemPedidoCompra")
+
+    ultimo_preco = {}
+    for produto_id, preco in (
+        ItemPedidoCompra.objects.filter(preco_custo_unitario__isnull=False)
+        .order_by("pedido__data_pedido", "id")
+        .values_list("produto_id", "preco_custo_unitario")
+    ):
+        ultimo_preco[produto_id] = preco
+
+    for produto_id, preco in ultimo_preco.items():
+        Estoque.objects.filter(produto_id=produto_id).update(custo_medio=preco)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0012_itempedidocompra_quantidade_recebida"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="estoque",
+            name="custo_medio",
+            field=models.DecimalField(
+                decimal_places=4, default=0, max_digits=12, verbose_name="Custo Médio"
+            ),
+        ),
+        migrations.AddField(
+            model_name="movimentacao",
+            name="custo_unitario",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=12, null=True
+            ),
+        ),
+        migrations.RunPython(custo_inicial_pelo_ultimo_preco, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0013_custo_medio"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="produto",
+            name="custo_calculado_em",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="produto",
+            name="custo_teorico",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=4,
+                editable=False,
+                max_digits=12,
+                null=True,
+                verbose_name="Custo Teórico",
+            ),
+        ),
+        migrations.AddField(
+            model_name="produto",
+            name="preco_venda",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="Preço de Venda",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0014_produto_custo_teorico"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pedidocompra",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("RASCUNHO", "Rascunho (Sugestão)"),
+                    ("PENDENTE", "Pendente"),
+                    ("RECEBIDO_PARCIALMENTE", "Recebido Parcialmente"),
+                    ("RECEBIDO", "Recebido"),
+                    ("CANCELADO", "Cancelado"),
+                ],
+                default="PENDENTE",
+                max_length=30,
+            ),
+        ),
+    ]
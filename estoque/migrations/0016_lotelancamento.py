@@ -0,0 +1,48 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0015_pedidocompra_status_rascunho"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LoteLancamento",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "lote_id",
+                    models.CharField(
+                        help_text="Identificador do lote gerado pelo sistema de origem",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("MOVIMENTACAO", "Movimentações"),
+                            ("VENDA", "Vendas"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("recebido_em", models.DateTimeField(auto_now_add=True)),
+                ("total_linhas", models.PositiveIntegerField(default=0)),
+                ("resultado", models.JSONField(blank=True, default=dict)),
+            ],
+        ),
+    ]
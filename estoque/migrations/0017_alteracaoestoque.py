@@ -0,0 +1,54 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0016_lotelancamento"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlteracaoEstoque",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantidade", models.FloatField()),
+                (
+                    "custo_medio",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=12),
+                ),
+                ("alterado_em", models.DateTimeField(auto_now_add=True)),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="estoque.produto",
+                    ),
+                ),
+                (
+                    "unidade",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="estoque.unidade",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Alteração de Estoque",
+                "verbose_name_plural": "Alterações de Estoque",
+            },
+        ),
+    ]
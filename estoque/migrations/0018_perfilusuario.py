@@ -0,0 +1,69 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def perfis_pelo_nome_de_usuario(apps, schema_editor):
+    """Cria o perfil dos usuários atuais com a unidade que o admin deduzia pelo nome de usuário."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Unidade = apps.get_model("estoque", "Unidade")
+    PerfilUsuario = apps.get_model("estoque", "PerfilUsuario")
+
+    perfis = []
+    for user in User.objects.filter(is_superuser=False):
+        slug = user.username.lower().replace(" ", "").replace("ori", "").strip()
+        unidade = (Unidade.objects.filter(nome__icontains=slug).order_by("id").first()
+                   or Unidade.objects.filter(nome__icontains=user.username[:4]).order_by("id").first())
+        perfis.append(PerfilUsuario(user_id=user.id, unidade=unidade))
+    PerfilUsuario.objects.bulk_create(perfis)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("estoque", "0017_alteracaoestoque"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PerfilUsuario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "unidade",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Sem unidade, o usuário (não superusuário) não vê registros de nenhuma unidade",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="perfis",
+                        to="estoque.unidade",
+                    ),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="perfil",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Perfil de Usuário",
+                "verbose_name_plural": "Perfis de Usuário",
+            },
+        ),
+        migrations.RunPython(perfis_pelo_nome_de_usuario, migrations.RunPython.noop),
+    ]
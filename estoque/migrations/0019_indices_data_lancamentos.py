@@ -0,0 +1,24 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0018_perfilusuario"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="movimentacao",
+            name="data",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="vendadiaria",
+            name="data",
+            field=models.DateField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
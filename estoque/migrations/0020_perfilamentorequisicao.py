@@ -0,0 +1,59 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("estoque", "0019_indices_data_lancamentos"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PerfilamentoRequisicao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("metodo", models.CharField(max_length=10)),
+                ("caminho", models.CharField(max_length=500)),
+                ("view", models.CharField(blank=True, max_length=200)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("ms_total", models.FloatField()),
+                ("consultas", models.PositiveIntegerField()),
+                ("ms_sql", models.FloatField()),
+                (
+                    "arquivo",
+                    models.CharField(
+                        help_text="Nome base dos arquivos na pasta de perfilamento",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Perfilamento de Requisição",
+                "verbose_name_plural": "Perfilamentos de Requisições",
+                "ordering": ["-criado_em"],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0020_perfilamentorequisicao"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProdutoRemovido",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("produto_id", models.PositiveIntegerField()),
+                ("removido_em", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "verbose_name": "Produto Removido",
+                "verbose_name_plural": "Produtos Removidos",
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0021_produtoremovido"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movimentacao",
+            name="estorno_venda",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
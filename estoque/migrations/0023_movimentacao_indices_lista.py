@@ -0,0 +1,25 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("estoque", "0022_movimentacao_estorno_venda"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movimentacao",
+            index=models.Index(fields=["produto", "data"], name="mov_produto_data_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movimentacao",
+            index=models.Index(fields=["origem", "data"], name="mov_origem_data_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movimentacao",
+            index=models.Index(fields=["destino", "data"], name="mov_destino_data_idx"),
+        ),
+    ]
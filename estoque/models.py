@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
@@ -8,6 +9,19 @@ class Unidade(models.Model):
     def __str__(self):
         return self.nome
 
+class PerfilUsuario(models.Model):
+    """ Unidade em que cada usuário (gerente, cozinha) trabalha. Define o que ele enxerga no admin; vale a partir da próxima requisição. """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="perfil")
+    unidade = models.ForeignKey(Unidade, null=True, blank=True, on_delete=models.SET_NULL, related_name="perfis",
+                                help_text="Sem unidade, o usuário (não superusuário) não vê registros de nenhuma unidade")
+
+    class Meta:
+        verbose_name = "Perfil de Usuário"
+        verbose_name_plural = "Perfis de Usuário"
+
+    def __str__(self):
+        return f"{self.user} → {self.unidade or 'sem unidade'}"
+
 class Produto(models.Model):
     TIPO_CHOICES = [
         ('INSUMO', 'Insumo'), # Itens de estoque (ex: Batata Congelada, Chopp Litro)
@@ -18,15 +32,59 @@ class Produto(models.Model):
     unidade_medida = models.CharField(max_length=20, default="unidade")
     # Novo campo para classificar o produto
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default='INSUMO')
+    # Usado pela sincronização incremental do catálogo (coletores offline).
+    # auto_now só vale no save(): quem grava com .update()/bulk_update() precisa preencher este campo.
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+    preco_venda = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="Preço de Venda")
+    # ✅ Custo teórico da ficha técnica (só Produto Final), recalculado quando um ingrediente ou preço muda
+    custo_teorico = models.DecimalField(max_digits=12, decimal_places=4, blank=True, null=True, editable=False, verbose_name="Custo Teórico")
+    custo_calculado_em = models.DateTimeField(blank=True, null=True, editable=False)
     
+    @property
+    def margem(self):
+        """ Margem teórica (preço de venda - custo da ficha técnica). """
+        if self.preco_venda is None or self.custo_teorico is None:
+            return None
+        return self.preco_venda - self.custo_teorico
+
     def __str__(self):
         return self.nome
 
+class ProdutoRemovido(models.Model):
+    """
+    Marca de exclusão de um Produto (gravada pelo post_delete, em signals.py), para
+    a sincronização incremental avisar os coletores que ele saiu do catálogo.
+    """
+    produto_id = models.PositiveIntegerField()
+    removido_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Produto Removido"
+        verbose_name_plural = "Produtos Removidos"
+
+    def __str__(self):
+        return f"Produto #{self.produto_id} removido em {self.removido_em:%d/%m/%Y %H:%M}"
+
+class CodigoBarras(models.Model):
+    """ Código de barras (EAN/GTIN ou interno) de um produto. Um produto pode ter vários. """
+    produto = models.ForeignKey(Produto, related_name="codigos_barras", on_delete=models.CASCADE)
+    # unique=True já cria o índice usado na leitura do coletor (busca exata)
+    codigo = models.CharField(max_length=32, unique=True, verbose_name="Código de Barras")
+
+    class Meta:
+        verbose_name = "Código de Barras"
+        verbose_name_plural = "Códigos de Barras"
+
+    def __str__(self):
+        return self.codigo
+
 class Estoque(models.Model):
     unidade = models.ForeignKey(Unidade, on_delete=models.CASCADE)
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     quantidade = models.FloatField(default=0)
     estoque_minimo = models.FloatField(default=0) # Adicionado para controle de reposição
+    # Custo médio ponderado móvel do item nesta unidade (atualizado a cada entrada/transferência)
+    custo_medio = models.DecimalField(max_digits=12, decimal_places=4, default=0, verbose_name="Custo Médio")
     
     class Meta:
         unique_together = ("unidade", "produto")
@@ -34,10 +92,29 @@ class Estoque(models.Model):
     def __str__(self):
         return f"{self.unidade} - {self.produto} ({self.quantidade})"
 
+class AlteracaoEstoque(models.Model):
+    """
+    Histórico de cada mudança em Estoque (foto da linha depois da mudança), gravado
+    na mesma transação que a alterou. O 'id' crescente é o cursor da sincronização
+    incremental: o cliente pede só o que mudou depois do último id que recebeu.
+    """
+    unidade = models.ForeignKey(Unidade, on_delete=models.CASCADE, related_name="+")
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name="+")
+    quantidade = models.FloatField()
+    custo_medio = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    alterado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Alteração de Estoque"
+        verbose_name_plural = "Alterações de Estoque"
+
+    def __str__(self):
+        return f"#{self.id} {self.unidade_id}/{self.produto_id} = {self.quantidade}"
+
 class VendaDiaria(models.Model):
     unidade = models.ForeignKey(Unidade, on_delete=models.CASCADE)
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
-    data = models.DateField(default=timezone.now)
+    data = models.DateField(default=timezone.now, db_index=True)
     quantidade = models.PositiveIntegerField(default=0)
     
     def __str__(self):
@@ -77,7 +154,20 @@ class Movimentacao(models.Model):
     quantidade = models.FloatField()
     origem = models.ForeignKey(Unidade, null=True, blank=True, related_name="movimentacao_origem", on_delete=models.SET_NULL)
     destino = models.ForeignKey(Unidade, null=True, blank=True, related_name="movimentacao_destino", on_delete=models.SET_NULL)
-    data = models.DateTimeField(auto_now_add=True)
+    data = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Custo de cada unidade que entrou: preço da compra (ENTRADA) ou custo médio da origem (TRANSFERENCIA)
+    custo_unitario = models.DecimalField(max_digits=12, decimal_places=4, blank=True, null=True)
+    # ENTRADA gravada ao apagar uma venda (devolve os insumos): não é mercadoria que chegou
+    estorno_venda = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        # A lista do admin filtra por um destes e ordena pela data: o índice composto
+        # entrega as linhas já na ordem, sem ordenar milhões delas para mostrar 100
+        indexes = [
+            models.Index(fields=["produto", "data"], name="mov_produto_data_idx"),
+            models.Index(fields=["origem", "data"], name="mov_origem_data_idx"),
+            models.Index(fields=["destino", "data"], name="mov_destino_data_idx"),
+        ]
     
     def __str__(self):
         return f"{self.tipo} - {self.produto} ({self.quantidade})"
@@ -97,7 +187,9 @@ class Fornecedor(models.Model):
 class PedidoCompra(models.Model):
     """Representa um pedido de compra feito a um fornecedor."""
     STATUS_CHOICES = [
+        ("RASCUNHO", "Rascunho (Sugestão)"),
         ("PENDENTE", "Pendente"),
+        ("RECEBIDO_PARCIALMENTE", "Recebido Parcialmente"),
         ("RECEBIDO", "Recebido"),
         ("CANCELADO", "Cancelado"),
     ]
@@ -106,7 +198,7 @@ class PedidoCompra(models.Model):
     numero_nota_fiscal = models.CharField(max_length=50, blank=True, null=True, verbose_name="Número da NF-e")
     data_pedido = models.DateTimeField(auto_now_add=True, verbose_name="Data do Pedido")
     data_recebimento = models.DateTimeField(blank=True, null=True, verbose_name="Data de Recebimento")
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDENTE")
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, default="PENDENTE")
 
     def __str__(self):
         return f"Pedido {self.id} - {self.fornecedor.nome}"
@@ -124,6 +216,14 @@ class ItemPedidoCompra(models.Model):
         null=True, 
         verbose_name="Preço de Custo Unitário"
     )
+    quantidade_recebida = models.FloatField(
+        default=0,
+        help_text="Total já recebido deste item (permite entregas parciais)."
+    )
+
+    @property
+    def quantidade_pendente(self):
+        return max(self.quantidade - self.quantidade_recebida, 0)
 
     def __str__(self):
         return f"{self.quantidade}x {self.produto.nome} no Pedido {self.pedido.id}"    
@@ -196,6 +296,14 @@ class ContagemEstoque(models.Model):
     ]
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendente')
 
+    # ✅ CONTAGEM CÍCLICA: se preenchido, a folha lista só estes insumos (vazio = contagem completa)
+    produtos_programados = models.ManyToManyField(
+        Produto, blank=True, related_name='+',
+        limit_choices_to={'tipo': 'INSUMO'},
+        verbose_name="Insumos a contar",
+        help_text="Deixe vazio para contar todos os insumos."
+    )
+
     def __str__(self):
         return f"Contagem em {self.unidade.nome} - {self.data_contagem.strftime('%d/%m/%Y')}"
 
@@ -205,10 +313,86 @@ class ItemContagemEstoque(models.Model):
     produto = models.ForeignKey(Produto, on_delete=models.PROTECT, limit_choices_to={'tipo': 'INSUMO'})
     quantidade_sistema = models.IntegerField(default=0, help_text="Quantidade que o sistema calculava ter no momento da contagem")
     quantidade_fisica = models.IntegerField(default=0, help_text="Quantidade que foi contada fisicamente")
+    lido_em = models.DateTimeField(blank=True, null=True, help_text="Momento da leitura no coletor (a leitura mais recente vence)")
+
+    class Meta:
+        # Uma linha por produto em cada contagem (permite o upsert do salvamento automático)
+        unique_together = ("contagem", "produto")
 
     @property
     def diferenca(self):
         return self.quantidade_fisica - self.quantidade_sistema
 
     def __str__(self):
-        return f"Contagem de {self.produto.nome}: {self.quantidade_fisica} (Sistema: {self.quantidade_sistema})"    
\ No newline at end of file
+        return f"Contagem de {self.produto.nome}: {self.quantidade_fisica} (Sistema: {self.quantidade_sistema})"    
+
+class LoteContagem(models.Model):
+    """ Um lote de leituras enviado por um coletor (handheld). Garante que o mesmo lote não seja aplicado duas vezes. """
+    contagem = models.ForeignKey(ContagemEstoque, related_name="lotes", on_delete=models.CASCADE)
+    lote_id = models.CharField(max_length=64, unique=True, help_text="Identificador do lote gerado pelo coletor")
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    total_leituras = models.PositiveIntegerField(default=0)
+    leituras_aplicadas = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Lote {self.lote_id} da Contagem #{self.contagem_id}"
+
+class LoteLancamento(models.Model):
+    """ Um lote de movimentações ou vendas enviado pela API (ex.: fechamento de turno do PDV). Garante que o mesmo lote não seja gravado duas vezes. """
+    TIPO_CHOICES = [
+        ('MOVIMENTACAO', 'Movimentações'),
+        ('VENDA', 'Vendas'),
+    ]
+    lote_id = models.CharField(max_length=64, unique=True, help_text="Identificador do lote gerado pelo sistema de origem")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    total_linhas = models.PositiveIntegerField(default=0)
+    # Resposta devolvida no primeiro envio; um reenvio recebe exatamente a mesma
+    resultado = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"Lote {self.lote_id} ({self.get_tipo_display()})"
+
+class ClassificacaoABC(models.Model):
+    """ Classe ABC de um insumo em uma unidade, usada para programar as contagens cíclicas. """
+    CLASSE_CHOICES = [
+        ('A', 'A - Alto valor (contagem semanal)'),
+        ('B', 'B - Valor médio (contagem quinzenal)'),
+        ('C', 'C - Baixo valor (contagem mensal)'),
+    ]
+    unidade = models.ForeignKey(Unidade, on_delete=models.CASCADE)
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, limit_choices_to={'tipo': 'INSUMO'})
+    classe = models.CharField(max_length=1, choices=CLASSE_CHOICES, default='C')
+    consumo_periodo = models.FloatField(default=0, help_text="Quantidade que saiu da unidade no período analisado")
+    valor_consumo = models.FloatField(default=0, help_text="Consumo do período multiplicado pelo custo unitário")
+    ultima_contagem = models.DateTimeField(blank=True, null=True)
+    calculado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("unidade", "produto")
+        verbose_name = "Classificação ABC"
+        verbose_name_plural = "Classificações ABC"
+
+    def __str__(self):
+        return f"{self.unidade} - {self.produto}: {self.classe}"
+
+class PerfilamentoRequisicao(models.Model):
+    """ Uma requisição executada sob o cProfile a pedido de um superusuário. Os arquivos (.prof e .sql) ficam em settings.PERFILAMENTO_DIR. """
+    criado_em = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, related_name="+")
+    metodo = models.CharField(max_length=10)
+    caminho = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    ms_total = models.FloatField()
+    consultas = models.PositiveIntegerField()
+    ms_sql = models.FloatField()
+    arquivo = models.CharField(max_length=100, help_text="Nome base dos arquivos na pasta de perfilamento")
+
+    class Meta:
+        ordering = ['-criado_em']
+        verbose_name = "Perfilamento de Requisição"
+        verbose_name_plural = "Perfilamentos de Requisições"
+
+    def __str__(self):
+        return f"{self.metodo} {self.caminho} ({self.ms_total:.0f} ms)"
@@ -0,0 +1,200 @@
+# estoque/pdf_pedidos.py
+"""
+PDFs dos pedidos de reposição, com cache em disco e renderização em paralelo.
+
+O WeasyPrint é lento e pesado de CPU, então:
+- Cada PDF fica guardado em disco com o nome 'pedido_<id>_<AAAAMMDD>_<hash>.pdf':
+  a data de emissão impressa no PDF e um hash do conteúdo do pedido (status,
+  unidade e itens). Enquanto o pedido não muda, o download seguinte do dia
+  sai direto do disco.
+- Versões antigas são apagadas só depois de TOLERANCIA_ANTIGOS segundos, para
+  não sumirem debaixo de quem ainda as está lendo.
+- Quando vários pedidos são selecionados, os que não estão no cache são
+  renderizados num pool de processos e devolvidos num ZIP ou num PDF único.
+  O pool é um só por worker, criado no primeiro uso e reaproveitado; os
+  processos nascem por 'forkserver' (ou 'spawn'), e não por fork do worker
+  com as conexões abertas do SQLite, e já sobem com o WeasyPrint importado.
+"""
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .metricas import DURACAO_PDF
+from .renderizacao_pdf import preparar_processo, renderizar_pdf_cronometrado
+
+# Aumente quando o layout do template mudar, para invalidar os PDFs já gerados
+VERSAO_LAYOUT = 1
+
+# Idade mínima (segundos) de uma versão substituída antes de ser apagada do cache
+TOLERANCIA_ANTIGOS = 600
+
+TEMPLATE_PEDIDO = 'pdf/pedido_reposicao_pdf.html'
+TEMPLATE_PEDIDOS = 'pdf/pedidos_reposicao_pdf.html'
+
+
+_pool = None
+_trava_pool = threading.Lock()
+
+
+def _pool_renderizacao():
+    """ O pool de processos do worker, criado no primeiro lote de PDFs e reaproveitado nos seguintes. """
+    global _pool
+    with _trava_pool:
+        if _pool is None:
+            metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PDF_PROCESSOS', None) or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(metodo),
+                initializer=preparar_processo,
+            )
+        return _pool
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _trava_pool:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _renderizar_em_paralelo(htmls):
+    """ [(bytes, segundos)] de cada HTML, pelo pool. Se um processo morrer, o pool é refeito no próximo uso. """
+    pool = _pool_renderizacao()
+    try:
+        return list(pool.map(renderizar_pdf_cronometrado, htmls))
+    except BrokenProcessPool:
+        _descartar_pool(pool)
+        return [renderizar_pdf_cronometrado(html) for html in htmls]
+
+
+def _pasta_cache():
+    pasta = Path(getattr(settings, 'PDF_CACHE_DIR', Path(settings.BASE_DIR) / 'cache' / 'pdf'))
+    pasta.mkdir(parents=True, exist_ok=True)
+    return pasta
+
+
+def carregar_pedidos(queryset):
+    """ Pedidos com unidade e itens/produtos já carregados (sem N+1 no hash e no template). """
+    return list(queryset.select_related('unidade_destino').prefetch_related('itens__produto').order_by('id'))
+
+
+def versao_conteudo(pedido):
+    """ Hash curto de tudo o que aparece no PDF do pedido (a data de emissão entra no nome do arquivo). """
+    conteudo = [
+        VERSAO_LAYOUT,
+        pedido.id,
+        pedido.status,
+        pedido.unidade_destino.nome,
+        [(item.id, item.produto.nome, item.produto.unidade_medida, item.quantidade_solicitada)
+         for item in pedido.itens.all()],
+    ]
+    return hashlib.sha256(json.dumps(conteudo, ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+def _caminho_cache(pedido, data_emissao):
+    return _pasta_cache() / f'pedido_{pedido.id}_{data_emissao:%Y%m%d}_{versao_conteudo(pedido)}.pdf'
+
+
+def _ler_cache(caminho):
+    """ Bytes do PDF guardado, ou None se ainda não existe (ou acabou de ser apagado). """
+    try:
+        return caminho.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _gravar_cache(caminho, pdf, prefixo_antigos):
+    # Grava num arquivo temporário e renomeia: quem lê nunca vê um PDF pela metade
+    temporario = caminho.with_suffix(f'.{os.getpid()}.tmp')
+    temporario.write_bytes(pdf)
+    os.replace(temporario, caminho)
+
+    # Versões antigas do mesmo arquivo não servem mais, mas alguém pode estar lendo uma
+    limite = time.time() - TOLERANCIA_ANTIGOS
+    for antigo in caminho.parent.glob(f'{prefixo_antigos}*.pdf'):
+        try:
+            if antigo != caminho and antigo.stat().st_mtime < limite:
+                antigo.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _html_pedido(pedido, data_emissao):
+    return render_to_string(TEMPLATE_PEDIDO, {
+        'pedido': pedido,
+        'data_emissao': data_emissao.strftime('%d/%m/%Y'),
+    })
+
+
+def pdfs_dos_pedidos(pedidos):
+    """
+    Devolve [(pedido, bytes do PDF)] na mesma ordem de 'pedidos'.
+    Usa o cache quando o conteúdo não mudou; os que faltam são renderizados
+    em paralelo no pool do worker (settings.PDF_PROCESSOS processos, ou um por CPU).
+    """
+    data_emissao = timezone.localdate()
+    caminhos = {pedido.id: _caminho_cache(pedido, data_emissao) for pedido in pedidos}
+    pdfs = {pedido.id: _ler_cache(caminhos[pedido.id]) for pedido in pedidos}
+    faltando = [pedido for pedido in pedidos if pdfs[pedido.id] is None]
+
+    if faltando:
+        # O HTML é montado aqui (precisa do banco); o pool só converte em PDF
+        htmls = [_html_pedido(pedido, data_emissao) for pedido in faltando]
+        if len(faltando) == 1:
+            gerados = [renderizar_pdf_cronometrado(htmls[0])]
+        else:
+            gerados = _renderizar_em_paralelo(htmls)
+        for pedido, (pdf, segundos) in zip(faltando, gerados):
+            DURACAO_PDF.observar(segundos)
+            _gravar_cache(caminhos[pedido.id], pdf, f'pedido_{pedido.id}_')
+            pdfs[pedido.id] = pdf
+
+    return [(pedido, pdfs[pedido.id]) for pedido in pedidos]
+
+
+def nome_arquivo(pedido):
+    return f'pedido_reposicao_#{pedido.id}_{pedido.unidade_destino.nome}.pdf'
+
+
+def zip_dos_pedidos(pedidos):
+    """ Um ZIP com um PDF por pedido. """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for pedido, pdf in pdfs_dos_pedidos(pedidos):
+            arquivo_zip.writestr(nome_arquivo(pedido), pdf)
+    return buffer.getvalue()
+
+
+def pdf_unico_dos_pedidos(pedidos):
+    """
+    Um único PDF com todos os pedidos (um por página). É renderizado de uma vez
+    só e guardado no cache pela combinação das versões dos pedidos e da data.
+    """
+    data_emissao = timezone.localdate()
+    chave = hashlib.sha256('|'.join(versao_conteudo(pedido) for pedido in pedidos).encode()).hexdigest()[:16]
+    caminho = _pasta_cache() / f'pedidos_{data_emissao:%Y%m%d}_{chave}.pdf'
+    pdf = _ler_cache(caminho)
+    if pdf is None:
+        html_string = render_to_string(TEMPLATE_PEDIDOS, {
+            'pedidos': pedidos,
+            'data_emissao': data_emissao.strftime('%d/%m/%Y'),
+        })
+        # Só os PDFs únicos recentes ficam guardados; cada seleção diferente gera outro
+        pdf, segundos = renderizar_pdf_cronometrado(html_string)
+        DURACAO_PDF.observar(segundos)
+        _gravar_cache(caminho, pdf, 'pedidos_')
+    return pdf
@@ -0,0 +1,172 @@
+# estoque/perfilamento.py
+"""
+Perfilamento sob demanda, para investigar em produção uma tela que só é
+lenta lá.
+
+Um superusuário acrescenta '?_perfilar=1' à URL (ou manda o cabeçalho
+'X-Perfilar: 1') e aquela requisição roda sob o cProfile. Ficam gravados
+em settings.PERFILAMENTO_DIR:
+- <nome>.prof: abra com 'python -m pstats', snakeviz etc.;
+- <nome>.sql: as consultas na ordem, com parâmetros e tempo.
+A lista dos perfilamentos recentes está no admin (PerfilamentoRequisicao).
+A resposta traz no cabeçalho 'X-Perfilamento' o link do registro.
+
+Requisições normais não pagam nada: sem o parâmetro ou o cabeçalho, o
+middleware só repassa (nem o usuário é carregado). Um perfilamento por vez
+em cada processo; nas views assíncronas só o que roda no event loop entra
+no .prof (as consultas entram todas no .sql).
+"""
+
+import cProfile
+import io
+import pstats
+import threading
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .instrumentacao import medir, nome_da_view
+from .models import PerfilamentoRequisicao
+
+PARAMETRO = '_perfilar'
+CABECALHO = 'HTTP_X_PERFILAR'
+
+_em_andamento = threading.Lock()
+
+
+def pasta_perfilamento():
+    return Path(getattr(settings, 'PERFILAMENTO_DIR', Path(settings.BASE_DIR) / 'cache' / 'perfis'))
+
+
+def arquivos(registro):
+    """ (caminho do .prof, caminho do .sql) de um registro. """
+    pasta = pasta_perfilamento()
+    return pasta / f'{registro.arquivo}.prof', pasta / f'{registro.arquivo}.sql'
+
+
+def resumo(registro, linhas=40):
+    """ As funções que mais somaram tempo (cumulativo), como texto do pstats. """
+    prof, _ = arquivos(registro)
+    if not prof.exists():
+        return "Arquivo .prof não encontrado."
+    saida = io.StringIO()
+    pstats.Stats(str(prof), stream=saida).sort_stats('cumulative').print_stats(linhas)
+    return saida.getvalue()
+
+
+def apagar_arquivos(registro):
+    for caminho in arquivos(registro):
+        caminho.unlink(missing_ok=True)
+
+
+def _pediu(request):
+    if request.META.get(CABECALHO) == '1':
+        return True
+    return PARAMETRO in request.META.get('QUERY_STRING', '') and request.GET.get(PARAMETRO) == '1'
+
+
+def _sem_parametro(request):
+    """ Tira o '_perfilar' do GET: as listas do admin recusam parâmetros que não conhecem. """
+    if PARAMETRO in request.GET:
+        request.GET = request.GET.copy()
+        del request.GET[PARAMETRO]
+        request.GET._mutable = False
+
+
+def _log_sql(request, medicao):
+    partes = [f"-- {request.method} {request.get_full_path()}",
+              f"-- {medicao.consultas} consultas, {medicao.ms_sql:.1f} ms de SQL, {medicao.ms_total:.1f} ms no total", ""]
+    for numero, (sql, params, ms) in enumerate(medicao.sql, start=1):
+        partes.append(f"-- #{numero}: {ms:.2f} ms")
+        partes.append(f"{sql};")
+        if params:
+            partes.append(f"-- parâmetros: {str(params)[:500]}")
+        partes.append("")
+    return "\n".join(partes)
+
+
+def _salvar(request, response, perfil, medicao):
+    pasta = pasta_perfilamento()
+    pasta.mkdir(parents=True, exist_ok=True)
+    nome = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    perfil.dump_stats(pasta / f'{nome}.prof')
+    (pasta / f'{nome}.sql').write_text(_log_sql(request, medicao), encoding='utf-8')
+
+    registro = PerfilamentoRequisicao.objects.create(
+        usuario=request.user,
+        metodo=request.method,
+        caminho=request.get_full_path()[:500],
+        view=(nome_da_view(request) or '')[:200],
+        status_code=response.status_code,
+        ms_total=medicao.ms_total,
+        consultas=medicao.consultas,
+        ms_sql=medicao.ms_sql,
+        arquivo=nome,
+    )
+    # Guarda só os mais recentes (os arquivos são apagados pelo post_delete, em signals.py)
+    maximo = getattr(settings, 'PERFILAMENTO_MAXIMO', 50)
+    antigos = PerfilamentoRequisicao.objects.order_by('-criado_em', '-id').values_list('id', flat=True)[maximo:]
+    PerfilamentoRequisicao.objects.filter(id__in=list(antigos)).delete()
+
+    response['X-Perfilamento'] = reverse('admin:estoque_perfilamentorequisicao_change', args=[registro.pk])
+
+
+class PerfilamentoMiddleware:
+    """ Depois do AuthenticationMiddleware no MIDDLEWARE. """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        if not _pediu(request) or not request.user.is_superuser:
+            return self.get_response(request)
+        if not _em_andamento.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            _sem_parametro(request)
+            perfil = cProfile.Profile()
+            with medir() as medicao:
+                medicao.sql = []
+                perfil.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    perfil.disable()
+            _salvar(request, response, perfil, medicao)
+            return response
+        finally:
+            _em_andamento.release()
+
+    async def __acall__(self, request):
+        if not _pediu(request) or not await sync_to_async(lambda: request.user.is_superuser)():
+            return await self.get_response(request)
+        if not _em_andamento.acquire(blocking=False):
+            return await self.get_response(request)
+
+        try:
+            _sem_parametro(request)
+            perfil = cProfile.Profile()
+            with medir() as medicao:
+                medicao.sql = []
+                perfil.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    perfil.disable()
+            await sync_to_async(_salvar)(request, response, perfil, medicao)
+            return response
+        finally:
+            _em_andamento.release()
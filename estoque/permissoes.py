@@ -0,0 +1,130 @@
+# estoque/permissoes.py
+"""
+Escopo de cada usuário no admin: a unidade dele (PerfilUsuario) e os papéis
+(superusuário, cozinha, gerente).
+
+O escopo é resolvido uma vez e guardado na sessão, junto com a versão em
+que foi resolvido; as telas seguintes não fazem nenhuma consulta extra de
+permissão. Mudar o perfil, os grupos ou o superusuário troca a versão do
+usuário (sinais em signals.py, pelo invalidar_escopo) e o escopo é resolvido
+de novo na próxima requisição, sem esperar um novo login. A versão fica no
+cache 'permissoes' (settings.CACHES), compartilhado entre os workers.
+"""
+
+import uuid
+from dataclasses import asdict, dataclass
+
+from django.core.cache import caches
+
+from .models import PerfilUsuario, Unidade
+
+CHAVE_SESSAO = 'estoque_escopo'
+CHAVE_VERSAO = 'estoque_escopo_versao'
+
+GRUPO_COZINHA = 'cozinha'
+GRUPO_GERENTES = 'gerentes'
+
+
+@dataclass(frozen=True)
+class EscopoUsuario:
+    usuario_id: int
+    superusuario: bool
+    unidade_id: int | None
+    cozinha: bool
+    gerente: bool
+
+
+def _resolver_escopo(user):
+    if user.is_superuser:
+        return EscopoUsuario(user.pk, True, None, False, False)
+    grupos = set(user.groups.values_list('name', flat=True))
+    unidade_id = PerfilUsuario.objects.filter(user=user).values_list('unidade_id', flat=True).first()
+    return EscopoUsuario(user.pk, False, unidade_id, GRUPO_COZINHA in grupos, GRUPO_GERENTES in grupos)
+
+
+def _cache():
+    return caches['permissoes']
+
+
+def _chaves_versao(usuario_id):
+    # A geral muda para todos (ex.: um grupo renomeado); a outra, só para o usuário
+    return [f'{CHAVE_VERSAO}:geral', f'{CHAVE_VERSAO}:{usuario_id}']
+
+
+def versao_escopo(usuario_id):
+    """ Versão atual do escopo do usuário. Sem versão no cache (apagada, expirada), cria uma nova. """
+    cache = _cache()
+    chaves = _chaves_versao(usuario_id)
+    versoes = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in versoes:
+            cache.add(chave, uuid.uuid4().hex)
+            versoes[chave] = cache.get(chave)
+    return '|'.join(str(versoes[chave]) for chave in chaves)
+
+
+def invalidar_escopo(usuarios_ids=None):
+    """ Força os usuários (ou todos, com None) a resolver o escopo de novo na próxima requisição. """
+    if usuarios_ids is None:
+        chaves = [_chaves_versao(None)[0]]
+    else:
+        chaves = [_chaves_versao(usuario_id)[1] for usuario_id in usuarios_ids]
+    _cache().set_many({chave: uuid.uuid4().hex for chave in chaves})
+
+
+def escopo_usuario(request):
+    """ Escopo do usuário logado: da própria requisição, da sessão (se a versão não mudou) ou do banco. """
+    escopo = getattr(request, '_escopo_estoque', None)
+    if escopo is not None and escopo.usuario_id == request.user.pk:
+        return escopo
+
+    versao = versao_escopo(request.user.pk)
+    session = getattr(request, 'session', None)
+    guardado = dict(session.get(CHAVE_SESSAO) or {}) if session is not None else {}
+    if guardado.pop('versao', None) == versao and guardado.get('usuario_id') == request.user.pk:
+        escopo = EscopoUsuario(**guardado)
+    else:
+        escopo = _resolver_escopo(request.user)
+        if session is not None:
+            session[CHAVE_SESSAO] = {**asdict(escopo), 'versao': versao}
+
+    request._escopo_estoque = escopo
+    return escopo
+
+
+def limpar_escopo(request):
+    if getattr(request, 'session', None) is not None:
+        request.session.pop(CHAVE_SESSAO, None)
+    request.__dict__.pop('_escopo_estoque', None)
+
+
+class EscopoUnidadeAdminMixin:
+    """
+    Restringe um ModelAdmin à unidade do usuário logado (superusuário vê tudo).
+
+    'campo_unidade' é o FK para Unidade no modelo (ex.: 'unidade_destino').
+    Nos formulários, esse campo só oferece a unidade do usuário, já selecionada.
+    'papeis_rede' lista os papéis que enxergam todas as unidades nesse admin.
+    """
+    campo_unidade = 'unidade'
+    papeis_rede = ()
+
+    def _ve_toda_rede(self, escopo):
+        return escopo.superusuario or any(getattr(escopo, papel) for papel in self.papeis_rede)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        escopo = escopo_usuario(request)
+        if self._ve_toda_rede(escopo):
+            return qs
+        if escopo.unidade_id is None:
+            return qs.none()
+        return qs.filter(**{f'{self.campo_unidade}_id': escopo.unidade_id})
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == self.campo_unidade:
+            escopo = escopo_usuario(request)
+            if not self._ve_toda_rede(escopo):
+                kwargs['queryset'] = Unidade.objects.filter(id=escopo.unidade_id)
+                kwargs.setdefault('initial', escopo.unidade_id)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
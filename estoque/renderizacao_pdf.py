@@ -0,0 +1,35 @@
+# estoque/renderizacao_pdf.py
+"""
+Renderização de HTML em PDF com o WeasyPrint.
+
+Fica num módulo separado e sem dependência do Django de propósito: é a função
+que roda nos processos do pool (pdf_pedidos.py), e esses processos só precisam
+receber o HTML pronto e devolver os bytes do PDF.
+
+O WeasyPrint (e a pilha de fontes que ele carrega) só é importado no primeiro
+PDF, não na subida dos workers nem nos comandos de gerenciamento. Nos processos
+do pool ele é importado uma vez, quando o processo nasce (preparar_processo).
+"""
+
+import time
+
+
+def renderizar_pdf(html_string):
+    """ Converte o HTML em PDF e devolve os bytes. """
+    from weasyprint import HTML
+    return HTML(string=html_string).write_pdf()
+
+
+def renderizar_pdf_cronometrado(html_string):
+    """ (bytes do PDF, segundos): o tempo é medido no processo que renderizou e vai para as métricas no pai. """
+    inicio = time.perf_counter()
+    pdf = renderizar_pdf(html_string)
+    return pdf, time.perf_counter() - inicio
+
+
+def preparar_processo():
+    """ Inicializador dos processos do pool: importa o WeasyPrint antes do primeiro PDF. """
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        pass  # Sem o WeasyPrint (ou sem o Pango), o erro aparece ao renderizar, no processo pai
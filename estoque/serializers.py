@@ -1,44 +1,204 @@
 # estoque/serializers.py
 
+import math
+
 from rest_framework import serializers
-from .models import (Unidade, Produto, Estoque, VendaDiaria, Movimentacao, 
+from .models import (Unidade, Produto, CodigoBarras, Estoque, AlteracaoEstoque, VendaDiaria, Movimentacao, 
                      PedidoReposicao, ItemReposicao, Fornecedor, PedidoCompra, 
-                     ItemPedidoCompra, Ingrediente)
+                     ItemPedidoCompra, Ingrediente, ContagemEstoque, ItemContagemEstoque,
+                     LoteContagem, LoteLancamento)
+
+class CamposSelecionaveisMixin:
+    """
+    Respostas enxutas: '?fields=id,produto,quantidade' devolve só esses campos.
+    Campos desconhecidos são ignorados; sem o parâmetro, vêm todos.
+    Só vale para leitura (GET), para não atrapalhar a validação de escritas.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        campos = request.query_params.get('fields')
+        if campos:
+            pedidos = {campo.strip() for campo in campos.split(',')}
+            for campo in set(self.fields) - pedidos:
+                self.fields.pop(campo)
 
-class UnidadeSerializer(serializers.ModelSerializer):
+class UnidadeSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
     class Meta:
         model = Unidade
         fields = "__all__"
 
-class ProdutoSerializer(serializers.ModelSerializer):
+class ProdutoSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
+    codigos_barras = serializers.SlugRelatedField(many=True, read_only=True, slug_field='codigo')
+
     class Meta:
         model = Produto
         fields = "__all__"
 
-class EstoqueSerializer(serializers.ModelSerializer):
+class CodigoBarrasSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
+    # Dados do produto já vêm junto, para o coletor não precisar de outra chamada
+    produto_nome = serializers.CharField(source='produto.nome', read_only=True)
+    produto_tipo = serializers.CharField(source='produto.tipo', read_only=True)
+    unidade_medida = serializers.CharField(source='produto.unidade_medida', read_only=True)
+
+    class Meta:
+        model = CodigoBarras
+        fields = "__all__"
+
+class EstoqueSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
     class Meta:
         model = Estoque
         fields = "__all__"
+        read_only_fields = ("custo_medio",)
+
+class AlteracaoEstoqueSerializer(serializers.ModelSerializer):
+    cursor = serializers.IntegerField(source='id', read_only=True)
 
-class VendaDiariaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AlteracaoEstoque
+        fields = ("cursor", "unidade", "produto", "quantidade", "custo_medio", "alterado_em")
+
+class VendaDiariaSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
     class Meta:
         model = VendaDiaria
         fields = "__all__"
 
-class MovimentacaoSerializer(serializers.ModelSerializer):
+class MovimentacaoSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
     class Meta:
         model = Movimentacao
         fields = "__all__"
 
 # ✅ Adicione os serializers para os novos modelos
-class PedidoReposicaoSerializer(serializers.ModelSerializer):
+# Os pedidos e contagens trazem os itens aninhados (só leitura), com nome do produto e da unidade.
+# Os ViewSets carregam tudo com select_related/prefetch_related: uma página custa poucas consultas fixas.
+class ItemReposicaoSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
+    produto_nome = serializers.CharField(source='produto.nome', read_only=True)
+    unidade_medida = serializers.CharField(source='produto.unidade_medida', read_only=True)
+
+    class Meta:
+        model = ItemReposicao
+        fields = "__all__"
+
+class PedidoReposicaoSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
+    unidade_destino_nome = serializers.CharField(source='unidade_destino.nome', read_only=True)
+    itens = ItemReposicaoSerializer(many=True, read_only=True)
+
     class Meta:
         model = PedidoReposicao
         fields = "__all__"
 
-class ItemReposicaoSerializer(serializers.ModelSerializer):
+class ItemContagemEstoqueSerializer(serializers.ModelSerializer):
+    produto_nome = serializers.CharField(source='produto.nome', read_only=True)
+    unidade_medida = serializers.CharField(source='produto.unidade_medida', read_only=True)
+    diferenca = serializers.IntegerField(read_only=True)
+
     class Meta:
-        model = ItemReposicao
+        model = ItemContagemEstoque
+        exclude = ("contagem",)
+
+class ContagemEstoqueSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
+    unidade_nome = serializers.CharField(source='unidade.nome', read_only=True)
+    itens = ItemContagemEstoqueSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ContagemEstoque
+        fields = "__all__"
+        read_only_fields = ("status",)
+
+class ItemPedidoCompraSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
+    produto_nome = serializers.CharField(source='produto.nome', read_only=True)
+    unidade_medida = serializers.CharField(source='produto.unidade_medida', read_only=True)
+    quantidade_pendente = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ItemPedidoCompra
+        fields = "__all__"
+        read_only_fields = ("quantidade_recebida",)
+
+class PedidoCompraSerializer(CamposSelecionaveisMixin, serializers.ModelSerializer):
+    fornecedor_nome = serializers.CharField(source='fornecedor.nome', read_only=True)
+    itens = ItemPedidoCompraSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = PedidoCompra
+        fields = "__all__"
+        read_only_fields = ("status", "data_recebimento")
+
+# ✅ Recebimento (parcial ou total) de um pedido de compra
+class ItemRecebidoSerializer(serializers.Serializer):
+    item_id = serializers.IntegerField()
+    quantidade = serializers.FloatField(min_value=0)
+
+class RecebimentoCompraSerializer(serializers.Serializer):
+    # Sem 'itens', recebe tudo o que ainda está pendente
+    itens = ItemRecebidoSerializer(many=True, required=False)
+    numero_nota_fiscal = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+# ✅ Envio em lote dos coletores (handhelds) que contam offline
+class LeituraColetorSerializer(serializers.Serializer):
+    # O produto pode vir pelo id ou pelo código de barras lido
+    produto_id = serializers.IntegerField(required=False)
+    codigo = serializers.CharField(max_length=32, required=False)
+    quantidade = serializers.FloatField(min_value=0)
+    lido_em = serializers.DateTimeField(help_text="Momento da leitura no coletor")
+
+    def validate_quantidade(self, valor):
+        if not math.isfinite(valor):
+            raise serializers.ValidationError("Informe um número finito.")
+        return valor
+
+    def validate(self, attrs):
+        if 'produto_id' not in attrs and not attrs.get('codigo'):
+            raise serializers.ValidationError("Informe 'produto_id' ou 'codigo'.")
+        return attrs
+
+class EnvioLoteContagemSerializer(serializers.Serializer):
+    lote_id = serializers.CharField(max_length=64)
+    leituras = LeituraColetorSerializer(many=True, allow_empty=False)
+
+class LoteContagemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoteContagem
+        fields = "__all__"
+
+# ✅ Envio em lote de movimentações e vendas (ex.: PDV no fechamento do turno)
+# Os ids são validados de uma vez na view (services.referencias_invalidas), não linha a linha.
+class LinhaMovimentacaoSerializer(serializers.Serializer):
+    tipo = serializers.ChoiceField(choices=Movimentacao.TIPO_CHOICES)
+    produto = serializers.IntegerField()
+    quantidade = serializers.FloatField(min_value=0)
+    origem = serializers.IntegerField(required=False, allow_null=True)
+    destino = serializers.IntegerField(required=False, allow_null=True)
+    custo_unitario = serializers.DecimalField(max_digits=12, decimal_places=4, required=False, allow_null=True)
+
+    def validate(self, attrs):
+        tipo = attrs['tipo']
+        if tipo in ('SAIDA', 'TRANSFERENCIA') and attrs.get('origem') is None:
+            raise serializers.ValidationError({"origem": f"Obrigatória para {tipo}."})
+        if tipo in ('ENTRADA', 'TRANSFERENCIA') and attrs.get('destino') is None:
+            raise serializers.ValidationError({"destino": f"Obrigatório para {tipo}."})
+        return attrs
+
+class LoteMovimentacoesSerializer(serializers.Serializer):
+    lote_id = serializers.CharField(max_length=64)
+    movimentacoes = LinhaMovimentacaoSerializer(many=True, allow_empty=False)
+
+class LinhaVendaSerializer(serializers.Serializer):
+    unidade = serializers.IntegerField()
+    produto = serializers.IntegerField()
+    quantidade = serializers.IntegerField(min_value=0)
+    data = serializers.DateField(required=False)
+
+class LoteVendasSerializer(serializers.Serializer):
+    lote_id = serializers.CharField(max_length=64)
+    vendas = LinhaVendaSerializer(many=True, allow_empty=False)
+
+class LoteLancamentoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoteLancamento
         fields = "__all__"
 
 # ... (e os outros serializers que você já tem)
\ No newline at end of file
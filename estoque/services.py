@@ -0,0 +1,479 @@
+# estoque/services.py
+"""
+Operações de estoque em lote, compartilhadas entre o Admin, a API e os sinais.
+
+Tudo aqui trabalha por conjunto (bulk) em vez de item a item, para que
+aprovações e recebimentos grandes não travem o banco.
+"""
+
+import math
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .contagem_ciclica import registrar_contagem_realizada
+from .custos import UNIDADE_REFERENCIA_CUSTO, atualizar_custos_medios, recalcular_custos_receitas
+from .metricas import ATUALIZACOES_ESTOQUE, DURACAO_IMPORTACAO, LINHAS_IMPORTADAS, MOVIMENTACOES_APLICADAS
+from .models import (Produto, CodigoBarras, Estoque, AlteracaoEstoque, Movimentacao, VendaDiaria,
+                     Ingrediente, ContagemEstoque, ItemContagemEstoque, LoteContagem,
+                     LoteLancamento, ItemPedidoCompra)
+
+
+def resolver_codigos(codigos):
+    """
+    Traduz códigos de barras em produto_id com uma única consulta exata no índice
+    de CodigoBarras. Códigos desconhecidos simplesmente não aparecem no resultado.
+    """
+    return dict(
+        CodigoBarras.objects.filter(codigo__in=set(codigos)).values_list('codigo', 'produto_id')
+    )
+
+
+def registrar_alteracoes_estoque(chaves):
+    """
+    Grava no histórico (AlteracaoEstoque) a situação atual das linhas de Estoque
+    {(unidade_id, produto_id)} que acabaram de mudar: uma leitura e um bulk_create.
+    Deve ser chamada na mesma transação da mudança; linhas apagadas entram com zero.
+    """
+    chaves = set(chaves)
+    if not chaves:
+        return
+    unidades_ids = {unidade_id for unidade_id, _ in chaves}
+    produtos_ids = {produto_id for _, produto_id in chaves}
+    atuais = {
+        (unidade_id, produto_id): (quantidade, custo)
+        for unidade_id, produto_id, quantidade, custo in (
+            Estoque.objects.filter(unidade_id__in=unidades_ids, produto_id__in=produtos_ids)
+            .values_list('unidade_id', 'produto_id', 'quantidade', 'custo_medio')
+        )
+    }
+    AlteracaoEstoque.objects.bulk_create([
+        AlteracaoEstoque(
+            unidade_id=unidade_id,
+            produto_id=produto_id,
+            quantidade=atuais.get((unidade_id, produto_id), (0, 0))[0],
+            custo_medio=atuais.get((unidade_id, produto_id), (0, 0))[1],
+        )
+        for unidade_id, produto_id in sorted(chaves)
+    ])
+
+
+def aplicar_deltas_estoque(deltas):
+    """
+    Soma as variações {(unidade_id, produto_id): delta} no Estoque.
+
+    Garante que as linhas existam (um bulk_create com ignore_conflicts) e
+    depois faz um único UPDATE por unidade, com 'quantidade = quantidade + CASE ...',
+    que é atômico no banco (não há leitura-e-escrita no Python).
+    """
+    deltas = {chave: delta for chave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    Estoque.objects.bulk_create(
+        [Estoque(unidade_id=unidade_id, produto_id=produto_id) for unidade_id, produto_id in deltas],
+        ignore_conflicts=True,
+    )
+
+    por_unidade = defaultdict(dict)
+    for (unidade_id, produto_id), delta in deltas.items():
+        por_unidade[unidade_id][produto_id] = delta
+
+    for unidade_id, deltas_unidade in por_unidade.items():
+        Estoque.objects.filter(unidade_id=unidade_id, produto_id__in=deltas_unidade.keys()).update(
+            quantidade=F('quantidade') + Case(
+                *[When(produto_id=produto_id, then=Value(delta)) for produto_id, delta in deltas_unidade.items()],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+    registrar_alteracoes_estoque(deltas.keys())
+    ATUALIZACOES_ESTOQUE.inc(len(deltas))
+
+
+def aplicar_movimentacoes(movimentacoes):
+    """
+    Versão em lote do sinal 'atualizar_estoque_on_movimentacao': grava as
+    movimentações com um único bulk_create e aplica no Estoque as variações
+    já somadas por (unidade, produto). Movimentações de AJUSTE são só registro.
+    Entradas com preço e transferências também atualizam o custo médio do destino.
+
+    Deve ser chamada dentro de uma transação.
+    """
+    deltas = defaultdict(float)
+    for mov in movimentacoes:
+        if mov.tipo == 'AJUSTE':
+            continue
+        if mov.origem_id:
+            deltas[(mov.origem_id, mov.produto_id)] -= mov.quantidade
+        if mov.destino_id:
+            deltas[(mov.destino_id, mov.produto_id)] += mov.quantidade
+
+    # Custo médio primeiro: ele depende das quantidades de ANTES da movimentação
+    atualizar_custos_medios(movimentacoes)
+    criadas = Movimentacao.objects.bulk_create(movimentacoes)
+    aplicar_deltas_estoque(deltas)
+    for tipo, total in Counter(mov.tipo for mov in criadas).items():
+        MOVIMENTACOES_APLICADAS.inc(total, tipo=tipo)
+    return criadas
+
+
+def receber_pedido_compra(pedido, destino, quantidades=None):
+    """
+    Registra um recebimento (total ou parcial) de um PedidoCompra na unidade 'destino'.
+
+    'quantidades' é {item_id: quantidade recebida agora}; se for None, recebe
+    tudo o que ainda está pendente. Quantidades acima do pendente são aceitas
+    (o fornecedor mandou a mais) e o que faltar fica como saldo a receber.
+
+    Todas as ENTRADAS do recebimento são gravadas e aplicadas no estoque de uma
+    só vez. Retorna a lista de movimentações criadas.
+    """
+    with transaction.atomic():
+        itens = list(pedido.itens.select_for_update().order_by('id'))
+        if quantidades is None:
+            quantidades = {item.id: item.quantidade_pendente for item in itens}
+
+        entradas = []
+        itens_recebidos = []
+        for item in itens:
+            qtd = quantidades.get(item.id) or 0
+            if qtd <= 0:
+                continue
+            item.quantidade_recebida += qtd
+            itens_recebidos.append(item)
+            entradas.append(Movimentacao(
+                tipo="ENTRADA",
+                produto_id=item.produto_id,
+                quantidade=qtd,
+                origem=None,  # A origem é externa (o fornecedor)
+                destino=destino,
+                custo_unitario=item.preco_custo_unitario,
+            ))
+
+        if not entradas:
+            return []
+
+        ItemPedidoCompra.objects.bulk_update(itens_recebidos, ['quantidade_recebida'])
+        criadas = aplicar_movimentacoes(entradas)
+
+        # Na Cozinha Central o custo das receitas já foi recalculado com o custo médio (custos.py).
+        # Em outra unidade, o preço pago ainda pode ser a referência de quem não tem custo na cozinha.
+        if destino.nome != UNIDADE_REFERENCIA_CUSTO:
+            recalcular_custos_receitas(insumos_ids={mov.produto_id for mov in entradas if mov.custo_unitario is not None})
+
+        completo = all(item.quantidade_recebida >= item.quantidade for item in itens)
+        pedido.status = "RECEBIDO" if completo else "RECEBIDO_PARCIALMENTE"
+        # A data é a da primeira entrega: é ela que mede o prazo do fornecedor (sugestao_compras.py)
+        if pedido.data_recebimento is None:
+            pedido.data_recebimento = timezone.now()
+        pedido.save(update_fields=['status', 'data_recebimento'])
+
+    return criadas
+
+
+def aprovar_contagens(contagens):
+    """
+    Aprova as contagens PENDENTES recebidas, forçando o estoque de cada unidade
+    a ser exatamente a 'quantidade_fisica' contada.
+
+    Cada unidade é processada na sua própria transação curta: um upsert em lote
+    do Estoque e um único bulk_create das movimentações de AJUSTE. Assim, a
+    aprovação de uma unidade não segura o lock das outras.
+
+    Retorna o número de contagens aprovadas.
+    """
+    pendentes = contagens.filter(status='pendente')
+    unidades_ids = list(pendentes.values_list('unidade_id', flat=True).distinct())
+
+    aprovadas = 0
+    for unidade_id in unidades_ids:
+        aprovadas += _aprovar_contagens_da_unidade(pendentes, unidade_id)
+    return aprovadas
+
+
+def _aprovar_contagens_da_unidade(pendentes, unidade_id):
+    with transaction.atomic():
+        # Trava só as contagens desta unidade (ignorado no SQLite, útil no Postgres)
+        contagem_ids = list(
+            pendentes.filter(unidade_id=unidade_id)
+            .select_for_update()
+            .order_by('data_contagem', 'id')
+            .values_list('id', flat=True)
+        )
+        if not contagem_ids:
+            return 0
+
+        itens = (ItemContagemEstoque.objects
+                 .filter(contagem_id__in=contagem_ids)
+                 .order_by('contagem__data_contagem', 'contagem_id', 'id')
+                 .values_list('produto_id', 'quantidade_sistema', 'quantidade_fisica'))
+
+        # Se houver mais de uma contagem da mesma unidade, a mais recente vence
+        quantidade_final = {}
+        ajustes = []
+        for produto_id, qtd_sistema, qtd_fisica in itens:
+            quantidade_final[produto_id] = qtd_fisica
+
+            # A movimentação é apenas registro histórico (o sinal ignora AJUSTE)
+            diferenca = qtd_fisica - qtd_sistema
+            if diferenca != 0:
+                ajustes.append(Movimentacao(
+                    tipo="AJUSTE",
+                    produto_id=produto_id,
+                    quantidade=abs(diferenca),
+                    origem_id=unidade_id if diferenca < 0 else None,
+                    destino_id=unidade_id if diferenca > 0 else None,
+                ))
+
+        Estoque.objects.bulk_create(
+            [Estoque(unidade_id=unidade_id, produto_id=produto_id, quantidade=qtd)
+             for produto_id, qtd in quantidade_final.items()],
+            update_conflicts=True,
+            unique_fields=['unidade', 'produto'],
+            update_fields=['quantidade'],
+        )
+        Movimentacao.objects.bulk_create(ajustes)
+        registrar_alteracoes_estoque((unidade_id, produto_id) for produto_id in quantidade_final)
+        MOVIMENTACOES_APLICADAS.inc(len(ajustes), tipo='AJUSTE')
+        ATUALIZACOES_ESTOQUE.inc(len(quantidade_final))
+        registrar_contagem_realizada(unidade_id, list(quantidade_final))
+
+        return ContagemEstoque.objects.filter(id__in=contagem_ids).update(status='aprovado')
+
+
+def salvar_itens_contagem(contagem, quantidades, lido_em=None):
+    """
+    Grava (upsert) as linhas da contagem informadas em 'quantidades'
+    ({produto_id: quantidade_fisica}), sem tocar nas demais.
+
+    'lido_em' ({produto_id: datetime}) guarda o momento da leitura de cada linha;
+    se não for informado, vale o horário atual.
+
+    A 'quantidade_sistema' é lida do Estoque só para os produtos enviados, então
+    o custo depende do que mudou e não do tamanho do catálogo.
+
+    Retorna a lista de produto_id efetivamente gravados. Levanta ValueError se
+    alguma quantidade não for um número finito (NaN/infinito não cabem no
+    IntegerField da linha).
+    """
+    if not quantidades:
+        return []
+    invalidos = sorted(produto_id for produto_id, quantidade in quantidades.items() if not math.isfinite(quantidade))
+    if invalidos:
+        raise ValueError(f"Quantidade inválida (não é um número finito) para os produtos {invalidos}.")
+
+    agora = timezone.now()
+    lido_em = lido_em or {}
+
+    insumos_validos = set(
+        Produto.objects.filter(id__in=quantidades.keys(), tipo='INSUMO').values_list('id', flat=True)
+    )
+    estoque_sistema = dict(
+        Estoque.objects.filter(unidade_id=contagem.unidade_id, produto_id__in=insumos_validos)
+        .values_list('produto_id', 'quantidade')
+    )
+
+    ItemContagemEstoque.objects.bulk_create(
+        [ItemContagemEstoque(
+            contagem=contagem,
+            produto_id=produto_id,
+            quantidade_sistema=estoque_sistema.get(produto_id, 0),
+            quantidade_fisica=quantidades[produto_id],
+            lido_em=lido_em.get(produto_id, agora),
+        ) for produto_id in insumos_validos],
+        update_conflicts=True,
+        unique_fields=['contagem', 'produto'],
+        update_fields=['quantidade_sistema', 'quantidade_fisica', 'lido_em'],
+    )
+    return sorted(insumos_validos)
+
+
+def registrar_lote_contagem(contagem, lote_id, leituras):
+    """
+    Aplica um lote de leituras de coletor ('leituras' = lista de dicts com
+    'produto_id', 'quantidade' e 'lido_em') na contagem, de forma idempotente.
+
+    - O mesmo 'lote_id' nunca é aplicado duas vezes: o reenvio devolve o lote já gravado.
+    - Para cada produto vence a leitura mais recente (pelo 'lido_em' do coletor),
+      seja dentro do lote ou contra o que já está salvo na contagem.
+
+    Tudo roda numa única transação com um número fixo de consultas,
+    independente do tamanho do lote.
+
+    Retorna (lote, criado).
+    """
+    with transaction.atomic():
+        lote = LoteContagem.objects.filter(lote_id=lote_id).first()
+        if lote:
+            return lote, False
+
+        try:
+            # Savepoint: se outro coletor gravou o mesmo lote ao mesmo tempo, não aplicamos de novo
+            with transaction.atomic():
+                lote = LoteContagem.objects.create(
+                    contagem=contagem, lote_id=lote_id, total_leituras=len(leituras)
+                )
+        except IntegrityError:
+            lote = None
+
+        if lote:
+            # Dentro do lote: fica só a leitura mais recente de cada produto
+            mais_recentes = {}
+            for leitura in leituras:
+                atual = mais_recentes.get(leitura['produto_id'])
+                if atual is None or leitura['lido_em'] >= atual['lido_em']:
+                    mais_recentes[leitura['produto_id']] = leitura
+
+            # Contra o que já está salvo: descarta leituras mais antigas
+            ja_salvos = dict(
+                ItemContagemEstoque.objects
+                .filter(contagem=contagem, produto_id__in=mais_recentes.keys(), lido_em__isnull=False)
+                .values_list('produto_id', 'lido_em')
+            )
+            novas = {
+                produto_id: leitura for produto_id, leitura in mais_recentes.items()
+                if produto_id not in ja_salvos or leitura['lido_em'] >= ja_salvos[produto_id]
+            }
+
+            aplicadas = salvar_itens_contagem(
+                contagem,
+                {produto_id: leitura['quantidade'] for produto_id, leitura in novas.items()},
+                lido_em={produto_id: leitura['lido_em'] for produto_id, leitura in novas.items()},
+            )
+            lote.leituras_aplicadas = len(aplicadas)
+            lote.save(update_fields=['leituras_aplicadas'])
+            return lote, True
+
+    return LoteContagem.objects.get(lote_id=lote_id), False
+
+
+def referencias_invalidas(linhas, campos):
+    """
+    Confere de uma vez se os ids informados nas linhas existem.
+    'campos' é {nome_do_campo: Model}. Faz uma consulta por Model, não por linha.
+    Retorna {indice_da_linha: {campo: mensagem}} só das linhas com problema.
+    """
+    por_model = defaultdict(set)
+    for linha in linhas:
+        for campo, model in campos.items():
+            if linha.get(campo) is not None:
+                por_model[model].add(linha[campo])
+    existentes = {
+        model: set(model.objects.filter(id__in=ids).values_list('id', flat=True))
+        for model, ids in por_model.items()
+    }
+
+    erros = {}
+    for indice, linha in enumerate(linhas):
+        for campo, model in campos.items():
+            valor = linha.get(campo)
+            if valor is not None and valor not in existentes[model]:
+                erros.setdefault(indice, {})[campo] = [f"{model._meta.verbose_name.title()} {valor} não existe."]
+    return erros
+
+
+def _registrar_lote_lancamento(lote_id, tipo, total_linhas, gravar):
+    """
+    Grava um lote da API uma única vez. 'gravar()' faz o trabalho e devolve o
+    resultado (dict) que fica guardado e é devolvido de novo em qualquer reenvio.
+    Retorna (lote, criado).
+    """
+    with transaction.atomic():
+        lote = LoteLancamento.objects.filter(lote_id=lote_id).first()
+        if lote:
+            return lote, False
+
+        try:
+            # Savepoint: se o mesmo lote chegou ao mesmo tempo por outra conexão, não gravamos de novo
+            with transaction.atomic():
+                lote = LoteLancamento.objects.create(lote_id=lote_id, tipo=tipo, total_linhas=total_linhas)
+        except IntegrityError:
+            lote = None
+
+        if lote:
+            origem = f'api_lote_{tipo.lower()}'
+            with DURACAO_IMPORTACAO.cronometrar(origem=origem):
+                lote.resultado = gravar()
+                lote.save(update_fields=['resultado'])
+            LINHAS_IMPORTADAS.inc(total_linhas, origem=origem)
+            return lote, True
+
+    return LoteLancamento.objects.get(lote_id=lote_id), False
+
+
+def registrar_lote_movimentacoes(lote_id, linhas):
+    """
+    Grava um lote de movimentações (dicts com tipo, produto, quantidade, origem,
+    destino e custo_unitario) numa única transação: um bulk_create e as
+    variações de estoque já somadas por (unidade, produto).
+    """
+    def gravar():
+        criadas = aplicar_movimentacoes([
+            Movimentacao(
+                tipo=linha['tipo'],
+                produto_id=linha['produto'],
+                quantidade=linha['quantidade'],
+                origem_id=linha.get('origem'),
+                destino_id=linha.get('destino'),
+                custo_unitario=linha.get('custo_unitario'),
+            ) for linha in linhas
+        ])
+        return {"criadas": len(criadas), "ids": [mov.id for mov in criadas]}
+
+    return _registrar_lote_lancamento(lote_id, 'MOVIMENTACAO', len(linhas), gravar)
+
+
+def saidas_das_vendas(vendas):
+    """
+    Versão em lote do sinal 'criar_movimentacao_on_venda': a SAÍDA de estoque de
+    cada venda, explodindo Produtos Finais pela ficha técnica. Duas consultas
+    para o lote inteiro. Retorna a lista de Movimentacao (ainda não gravadas).
+    """
+    produtos_ids = {venda.produto_id for venda in vendas}
+    tipos = dict(Produto.objects.filter(id__in=produtos_ids).values_list('id', 'tipo'))
+    fichas = defaultdict(list)
+    for produto_final_id, insumo_id, quantidade in Ingrediente.objects.filter(
+            produto_final_id__in=[pid for pid, tipo in tipos.items() if tipo == 'PRODUTO_FINAL']
+    ).values_list('produto_final_id', 'insumo_id', 'quantidade'):
+        fichas[produto_final_id].append((insumo_id, quantidade))
+
+    saidas = []
+    for venda in vendas:
+        if tipos.get(venda.produto_id) == 'PRODUTO_FINAL':
+            baixas = [(insumo_id, quantidade * venda.quantidade) for insumo_id, quantidade in fichas[venda.produto_id]]
+        else:
+            baixas = [(venda.produto_id, venda.quantidade)]
+        for produto_id, quantidade in baixas:
+            saidas.append(Movimentacao(
+                tipo="SAIDA",
+                produto_id=produto_id,
+                quantidade=quantidade,
+                origem_id=venda.unidade_id,
+            ))
+    return saidas
+
+
+def registrar_lote_vendas(lote_id, linhas):
+    """
+    Grava um lote de vendas (dicts com unidade, produto, quantidade e data) numa
+    única transação: um bulk_create das vendas, um das SAÍDAS geradas pela
+    ficha técnica e as variações de estoque somadas por (unidade, insumo).
+    """
+    def gravar():
+        hoje = timezone.now().date()
+        vendas = VendaDiaria.objects.bulk_create([
+            VendaDiaria(
+                unidade_id=linha['unidade'],
+                produto_id=linha['produto'],
+                quantidade=linha['quantidade'],
+                data=linha.get('data') or hoje,
+            ) for linha in linhas
+        ])
+        saidas = aplicar_movimentacoes(saidas_das_vendas(vendas))
+        return {"criadas": len(vendas), "ids": [venda.id for venda in vendas], "movimentacoes_criadas": len(saidas)}
+
+    return _registrar_lote_lancamento(lote_id, 'VENDA', len(linhas), gravar)
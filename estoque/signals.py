@@ -1,19 +1,43 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import (Movimentacao, Estoque, VendaDiaria, Produto, 
-                     PedidoReposicao, ItemReposicao, Ingrediente) # ✅ 'Reposicao' removido
+from .models import (Movimentacao, Estoque, VendaDiaria, Produto, Unidade,
+                     PedidoReposicao, ItemReposicao, Ingrediente, CodigoBarras,
+                     ProdutoRemovido, PerfilUsuario) # ✅ 'Reposicao' removido
 from django.db.models import F
+from django.utils import timezone
+from .custos import atualizar_custos_medios, recalcular_custos_receitas
+from .services import registrar_alteracoes_estoque
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from .permissoes import invalidar_escopo, limpar_escopo
+from django.db.backends.signals import connection_created
+from .instrumentacao import instalar_contador
+from .metricas import MOVIMENTACOES_APLICADAS, ATUALIZACOES_ESTOQUE
+from .models import PerfilamentoRequisicao
+from .perfilamento import apagar_arquivos
+
+User = get_user_model()
 
 @receiver(post_save, sender=Movimentacao)
 def atualizar_estoque_on_movimentacao(sender, instance, created, **kwargs):
     if not created:
         return
+    MOVIMENTACOES_APLICADAS.inc(tipo=instance.tipo)
     
 # ✅ TRAVA DE SEGURANÇA: 
     # Se for AJUSTE (vindo da contagem), o Signal ignora e não altera o estoque.
     if instance.tipo == 'AJUSTE':
         return    
 
+    # ✅ Custo médio: entradas com preço e transferências levam o custo para o destino
+    # (se o destino for a Cozinha Central, o custo das fichas técnicas é recalculado junto)
+    custo_antes = instance.custo_unitario
+    atualizar_custos_medios([instance])
+    if instance.custo_unitario != custo_antes:
+        Movimentacao.objects.filter(pk=instance.pk).update(custo_unitario=instance.custo_unitario)
+
     # Debita da origem (SAIDA ou TRANSFERENCIA)
     if instance.origem:
         # ✅ Garante que o registro de estoque exista antes de atualizar
@@ -24,6 +48,7 @@ def atualizar_estoque_on_movimentacao(sender, instance, created, **kwargs):
         # ✅ Usa F() para uma atualização atômica e segura
         estoque_origem.quantidade = F('quantidade') - instance.quantidade
         estoque_origem.save()
+        ATUALIZACOES_ESTOQUE.inc()
 
     # Credita no destino (ENTRADA ou TRANSFERENCIA)
     if instance.destino:
@@ -34,6 +59,7 @@ def atualizar_estoque_on_movimentacao(sender, instance, created, **kwargs):
         # ✅ Usa F() para uma atualização atômica e segura
         estoque_destino.quantidade = F('quantidade') + instance.quantidade
         estoque_destino.save()
+        ATUALIZACOES_ESTOQUE.inc()
 
 # Esta função com a lógica de Ficha Técnica continua 100% correta
 @receiver(post_save, sender=VendaDiaria)
@@ -69,14 +95,16 @@ def reverter_movimentacao_on_venda_delete(sender, instance, **kwargs):
                 tipo="ENTRADA",
                 produto=ingrediente.insumo,
                 quantidade=quantidade_a_estornar,
-                destino=instance.unidade
+                destino=instance.unidade,
+                estorno_venda=True,
             )
     else:
         Movimentacao.objects.create(
             tipo="ENTRADA",
             produto=produto_vendido,
             quantidade=instance.quantidade,
-            destino=instance.unidade
+            destino=instance.unidade,
+            estorno_venda=True,
         )
 
 @receiver(post_delete, sender=Movimentacao)
@@ -99,6 +127,7 @@ def estornar_estoque_ao_excluir_movimentacao(sender, instance, **kwargs):
         )
         estoque_origem.quantidade += instance.quantidade
         estoque_origem.save()
+        ATUALIZACOES_ESTOQUE.inc()
 
     # 2. Se apagou uma ENTRADA (tinha destino): Retira o que entrou do destino
     if instance.destino:
@@ -108,4 +137,80 @@ def estornar_estoque_ao_excluir_movimentacao(sender, instance, **kwargs):
             defaults={'quantidade': 0}
         )
         estoque_destino.quantidade -= instance.quantidade
-        estoque_destino.save()
\ No newline at end of file
+        estoque_destino.save()
+        ATUALIZACOES_ESTOQUE.inc()
+
+# ✅ HISTÓRICO DO ESTOQUE: toda gravação individual (sinais acima, Admin, API) entra no feed de alterações.
+# As gravações em lote (services.py) registram as alterações elas mesmas.
+@receiver([post_save, post_delete], sender=Estoque)
+def registrar_alteracao_on_estoque(sender, instance, origin=None, **kwargs):
+    # Apagada junto com o produto ou a unidade: o histórico não pode apontar para eles
+    # (o coletor fica sabendo pelos removidos da sincronização de produtos)
+    if isinstance(origin, (Produto, Unidade)) or getattr(origin, 'model', None) in (Produto, Unidade):
+        return
+    registrar_alteracoes_estoque([(instance.unidade_id, instance.produto_id)])
+
+@receiver([post_save, post_delete], sender=CodigoBarras)
+def marcar_produto_alterado_on_codigo(sender, instance, **kwargs):
+    """ Um código novo ou removido conta como alteração do produto na sincronização dos coletores. """
+    Produto.objects.filter(id=instance.produto_id).update(atualizado_em=timezone.now())
+
+@receiver(post_delete, sender=Produto)
+def registrar_produto_removido(sender, instance, **kwargs):
+    """ Sem a marca, o coletor que sincroniza só o que mudou nunca saberia que o produto saiu. """
+    ProdutoRemovido.objects.create(produto_id=instance.id)
+
+# ✅ CUSTO DAS FICHAS TÉCNICAS: recalcula só os Produtos Finais afetados
+@receiver([post_save, post_delete], sender=Ingrediente)
+def recalcular_custo_on_ingrediente(sender, instance, **kwargs):
+    recalcular_custos_receitas(produtos_ids=[instance.produto_final_id])
+
+
+# ✅ Novo login: unidade e grupos são lidos de novo (o escopo fica em cache na sessão)
+@receiver(user_logged_in)
+def limpar_escopo_no_login(sender, request, user, **kwargs):
+    if request is not None:
+        limpar_escopo(request)
+
+# ✅ Perfil, grupos ou superusuário mudaram: o escopo em cache nas sessões deixa de valer.
+# Só depois do commit; antes, outra requisição poderia guardar o escopo antigo com a versão nova.
+def _invalidar_escopo_no_commit(usuarios_ids=None):
+    transaction.on_commit(lambda: invalidar_escopo(usuarios_ids))
+
+@receiver([post_save, post_delete], sender=PerfilUsuario)
+def invalidar_escopo_on_perfil(sender, instance, **kwargs):
+    _invalidar_escopo_no_commit([instance.user_id])
+
+@receiver(post_save, sender=User)
+def invalidar_escopo_on_usuario(sender, instance, update_fields=None, **kwargs):
+    # O login só grava o last_login
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    _invalidar_escopo_no_commit([instance.pk])
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_escopo_on_grupos(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _invalidar_escopo_no_commit([instance.pk])
+    else:
+        # group.user_set.clear() não informa quem saiu: vale para todos
+        _invalidar_escopo_no_commit(list(pk_set) if pk_set else None)
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidar_escopo_on_grupo(sender, instance, **kwargs):
+    # O escopo depende do nome do grupo ('cozinha', 'gerentes')
+    _invalidar_escopo_no_commit()
+
+
+# ✅ Toda conexão nova ganha o contador de consultas (estoque/instrumentacao.py)
+@receiver(connection_created)
+def instalar_contador_de_consultas(sender, connection, **kwargs):
+    instalar_contador(connection)
+
+
+# ✅ Perfilamento apagado (no admin ou pelo limite de PERFILAMENTO_MAXIMO) leva junto o .prof e o .sql
+@receiver(post_delete, sender=PerfilamentoRequisicao)
+def apagar_arquivos_do_perfilamento(sender, instance, **kwargs):
+    apagar_arquivos(instance)
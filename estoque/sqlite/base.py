@@ -0,0 +1,85 @@
+# estoque/sqlite/base.py
+"""
+Backend SQLite do projeto (ENGINE 'estoque.sqlite'): o do Django mais a
+configuração para vários leitores e um escritor ao mesmo tempo.
+
+- journal_mode=WAL: leitores não bloqueiam o escritor nem são bloqueados por ele.
+- busy_timeout: quem encontra o banco travado espera em vez de falhar com
+  'database is locked'.
+- synchronous=NORMAL: seguro em WAL (no máximo perde a última transação numa
+  queda de energia) e bem mais rápido que FULL.
+- cache_size / mmap_size / temp_store: menos leituras de disco nos relatórios.
+- Transações começam com BEGIN IMMEDIATE: o lock de escrita é pego no início,
+  quando ainda dá para esperar pelo busy_timeout. Com o BEGIN padrão, uma
+  transação que lê e depois escreve falha na hora se outra já estiver escrevendo.
+  O tempo de espera por esse lock e as desistências vão para as métricas.
+
+Em DATABASES[...]['OPTIONS']:
+    'pragmas': {'cache_size': -128000}   # sobrescreve/complementa PRAGMAS_PADRAO
+    'somente_leitura': True              # abre o arquivo em modo leitura (alias de relatórios)
+    'transaction_mode': 'IMMEDIATE'      # ou 'DEFERRED' / 'EXCLUSIVE'
+"""
+
+import time
+from pathlib import Path
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+from estoque.metricas import ESPERA_LOCK, FALHAS_LOCK
+
+PRAGMAS_PADRAO = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,          # ms
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,          # negativo = KiB (64 MB por conexão)
+    'mmap_size': 268435456,        # 256 MB
+    'temp_store': 'MEMORY',
+}
+
+OPCOES_DO_PROJETO = ('pragmas', 'somente_leitura', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def _opcoes(self):
+        return self.settings_dict['OPTIONS']
+
+    @property
+    def somente_leitura(self):
+        return bool(self._opcoes.get('somente_leitura'))
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for opcao in OPCOES_DO_PROJETO:
+            params.pop(opcao, None)
+        if self.somente_leitura and not self.is_in_memory_db():
+            # O Django já abre a conexão com uri=True
+            params['database'] = f"{Path(params['database']).resolve().as_uri()}?mode=ro"
+        return params
+
+    def get_new_connection(self, conn_params):
+        conexao = super().get_new_connection(conn_params)
+        pragmas = {**PRAGMAS_PADRAO, **self._opcoes.get('pragmas', {})}
+        if self.somente_leitura:
+            # O modo WAL fica gravado no arquivo; quem define é a conexão de escrita
+            pragmas.pop('journal_mode', None)
+            pragmas['query_only'] = 'ON'
+        for nome, valor in pragmas.items():
+            conexao.execute(f'PRAGMA {nome} = {valor}')
+        return conexao
+
+    def _start_transaction_under_autocommit(self):
+        modo = 'DEFERRED' if self.somente_leitura else self._opcoes.get('transaction_mode', 'IMMEDIATE')
+        inicio = time.perf_counter()
+        try:
+            self.cursor().execute(f'BEGIN {modo}')
+        except OperationalError as erro:
+            if 'locked' in str(erro):
+                FALHAS_LOCK.inc()
+            raise
+        # Sem disputa o BEGIN leva microssegundos; acima de 1 ms foi espera pelo busy_timeout
+        espera = time.perf_counter() - inicio
+        if espera > 0.001:
+            ESPERA_LOCK.observar(espera)
@@ -0,0 +1,168 @@
+# estoque/sugestao_compras.py
+"""
+Sugestão de compras da Cozinha Central a partir da demanda de toda a rede.
+
+Para cada insumo junta, numa única passada vetorizada (pandas) sobre o catálogo:
+- o consumo diário previsto (média e desvio das SAÍDAS de todas as unidades);
+- o estoque da Cozinha Central;
+- o que ela ainda deve entregar aos botecos (pedidos de reposição em aberto);
+- o que já está comprado e ainda não chegou;
+- o prazo de entrega de cada fornecedor, medido de 'data_pedido' até 'data_recebimento' (a primeira entrega).
+
+O resultado vira rascunhos de PedidoCompra, um por fornecedor.
+"""
+
+import math
+from datetime import timedelta
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (Unidade, Produto, Estoque, Movimentacao, ItemReposicao,
+                     PedidoCompra, ItemPedidoCompra)
+
+UNIDADE_CENTRAL = "Cozinha Central"
+
+DIAS_HISTORICO = 28          # Janela usada para prever o consumo diário
+DIAS_COBERTURA = 7           # Intervalo até a próxima compra
+PRAZO_ENTREGA_PADRAO = 3     # Para fornecedores sem histórico de recebimento
+FATOR_SEGURANCA = 1.65       # ~95% de nível de serviço
+
+
+def _consumo_diario(desde, dias):
+    """ Média e desvio do consumo diário de cada insumo na rede (SAÍDAS de todas as unidades). """
+    saidas = pd.DataFrame.from_records(
+        Movimentacao.objects
+        .filter(tipo='SAIDA', data__gte=desde, produto__tipo='INSUMO')
+        .annotate(dia=TruncDate('data'))
+        .values('produto_id', 'dia')
+        .annotate(qtd=Sum('quantidade'))
+        .values_list('produto_id', 'dia', 'qtd'),
+        columns=['produto_id', 'dia', 'qtd'],
+    )
+    if saidas.empty:
+        return pd.DataFrame(columns=['consumo_medio', 'consumo_desvio']).rename_axis('produto_id')
+
+    # Uma coluna por dia (dias sem saída viram zero) para a média e o desvio saírem juntos
+    por_dia = saidas.pivot_table(index='produto_id', columns='dia', values='qtd', aggfunc='sum', fill_value=0)
+    soma = por_dia.sum(axis=1)
+    soma_quadrados = (por_dia ** 2).sum(axis=1)
+    media = soma / dias
+    variancia = (soma_quadrados / dias - media ** 2).clip(lower=0)
+    return pd.DataFrame({'consumo_medio': media, 'consumo_desvio': variancia ** 0.5})
+
+
+def _prazos_fornecedores():
+    """ Prazo médio de entrega (dias) de cada fornecedor, pelos pedidos já recebidos. """
+    pedidos = pd.DataFrame.from_records(
+        PedidoCompra.objects
+        .filter(status__in=['RECEBIDO', 'RECEBIDO_PARCIALMENTE'], data_recebimento__isnull=False)
+        .values_list('fornecedor_id', 'data_pedido', 'data_recebimento'),
+        columns=['fornecedor_id', 'data_pedido', 'data_recebimento'],
+    )
+    if pedidos.empty:
+        return pd.Series(dtype=float, name='prazo_dias')
+    dias = (pd.to_datetime(pedidos['data_recebimento']) - pd.to_datetime(pedidos['data_pedido'])).dt.total_seconds() / 86400
+    return dias.groupby(pedidos['fornecedor_id']).mean().rename('prazo_dias')
+
+
+def calcular_sugestoes(hoje=None):
+    """
+    Calcula a sugestão de compra de todos os insumos. Retorna um DataFrame
+    (um insumo por linha) com as colunas usadas na conta e 'quantidade_sugerida'.
+    Só leituras agregadas: o número de consultas não depende do tamanho do catálogo.
+    """
+    hoje = hoje or timezone.now()
+    central = Unidade.objects.filter(nome=UNIDADE_CENTRAL).first()
+
+    catalogo = pd.DataFrame.from_records(
+        Produto.objects.filter(tipo='INSUMO').values_list('id', 'nome', 'unidade_medida'),
+        columns=['produto_id', 'nome', 'unidade_medida'],
+    ).set_index('produto_id')
+
+    consumo = _consumo_diario(hoje - timedelta(days=DIAS_HISTORICO), DIAS_HISTORICO)
+
+    estoque_central = pd.Series(
+        dict(Estoque.objects.filter(unidade=central).values_list('produto_id', 'quantidade')) if central else {},
+        name='estoque_central', dtype=float,
+    )
+
+    # Reposições em aberto: a cozinha ainda vai tirar isso do próprio estoque
+    reservado = pd.Series(dict(
+        ItemReposicao.objects
+        .filter(pedido_reposicao__status='PENDENTE')
+        .values('produto_id').annotate(qtd=Sum('quantidade_solicitada'))
+        .values_list('produto_id', 'qtd')
+    ), name='reservado', dtype=float).add(pd.Series(dict(
+        ItemReposicao.objects
+        .filter(pedido_reposicao__status='ENVIADO')
+        .values('produto_id').annotate(qtd=Sum('quantidade_enviada'))
+        .values_list('produto_id', 'qtd')
+    ), dtype=float), fill_value=0).rename('reservado')
+
+    # Já comprado e ainda não recebido (rascunhos incluídos, para não sugerir duas vezes)
+    a_receber = pd.Series(dict(
+        ItemPedidoCompra.objects
+        .filter(pedido__status__in=['RASCUNHO', 'PENDENTE', 'RECEBIDO_PARCIALMENTE'])
+        .values('produto_id').annotate(qtd=Sum(F('quantidade') - F('quantidade_recebida')))
+        .values_list('produto_id', 'qtd')
+    ), name='a_receber', dtype=float)
+
+    # Último fornecedor e último preço de cada insumo
+    compras = pd.DataFrame.from_records(
+        ItemPedidoCompra.objects
+        .exclude(pedido__status='RASCUNHO')
+        .order_by('pedido__data_pedido', 'id')
+        .values_list('produto_id', 'pedido__fornecedor_id', 'preco_custo_unitario'),
+        columns=['produto_id', 'fornecedor_id', 'ultimo_preco'],
+    )
+    ultima_compra = compras.drop_duplicates('produto_id', keep='last').set_index('produto_id')
+
+    df = (catalogo
+          .join(consumo)
+          .join(estoque_central)
+          .join(reservado)
+          .join(a_receber)
+          .join(ultima_compra))
+    df[['consumo_medio', 'consumo_desvio', 'estoque_central', 'reservado', 'a_receber']] = (
+        df[['consumo_medio', 'consumo_desvio', 'estoque_central', 'reservado', 'a_receber']].fillna(0).astype(float)
+    )
+
+    df['prazo_dias'] = df['fornecedor_id'].map(_prazos_fornecedores()).fillna(PRAZO_ENTREGA_PADRAO)
+    horizonte = df['prazo_dias'] + DIAS_COBERTURA
+    df['estoque_seguranca'] = FATOR_SEGURANCA * df['consumo_desvio'] * horizonte ** 0.5
+    df['necessidade'] = df['consumo_medio'] * horizonte + df['estoque_seguranca']
+    df['posicao'] = df['estoque_central'] - df['reservado'] + df['a_receber']
+    df['quantidade_sugerida'] = (df['necessidade'] - df['posicao']).clip(lower=0).apply(math.ceil)
+    return df
+
+
+def gerar_rascunhos_pedidos_compra(sugestoes=None):
+    """
+    Cria um PedidoCompra em RASCUNHO por fornecedor com os itens sugeridos.
+    Insumos sem fornecedor conhecido (nunca comprados) ficam de fora.
+    Retorna (lista de pedidos criados, DataFrame dos insumos sem fornecedor).
+    """
+    df = calcular_sugestoes() if sugestoes is None else sugestoes
+    df = df[df['quantidade_sugerida'] > 0]
+    sem_fornecedor = df[df['fornecedor_id'].isna()]
+    df = df[df['fornecedor_id'].notna()]
+
+    pedidos = []
+    with transaction.atomic():
+        itens = []
+        for fornecedor_id, grupo in df.groupby('fornecedor_id'):
+            pedido = PedidoCompra.objects.create(fornecedor_id=int(fornecedor_id), status='RASCUNHO')
+            pedidos.append(pedido)
+            for produto_id, linha in grupo.iterrows():
+                itens.append(ItemPedidoCompra(
+                    pedido=pedido,
+                    produto_id=produto_id,
+                    quantidade=float(linha['quantidade_sugerida']),
+                    preco_custo_unitario=None if pd.isna(linha['ultimo_preco']) else linha['ultimo_preco'],
+                ))
+        ItemPedidoCompra.objects.bulk_create(itens)
+    return pedidos, sem_fornecedor
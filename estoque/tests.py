@@ -1,3 +1,861 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (Unidade, Produto, CodigoBarras, Estoque, ContagemEstoque, ItemContagemEstoque,
+                     LoteContagem, Ingrediente, Fornecedor, PedidoCompra, ItemPedidoCompra, Movimentacao,
+                     VendaDiaria, PedidoReposicao, ItemReposicao, PerfilUsuario, ClassificacaoABC)
+from .pdf_pedidos import TOLERANCIA_ANTIGOS, carregar_pedidos, pdf_unico_dos_pedidos, pdfs_dos_pedidos
+from .permissoes import escopo_usuario
+from .instrumentacao import OrcamentoDeConsultasMixin
+from .services import (salvar_itens_contagem, receber_pedido_compra, aprovar_contagens, registrar_lote_movimentacoes,
+                       registrar_lote_vendas)
+
+
+class DadosBasicosMixin:
+    """ Uma unidade, dois insumos com estoque e um superusuário logado. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.unidade = Unidade.objects.create(nome="Centro")
+        cls.arroz = Produto.objects.create(nome="Arroz", unidade_medida="kg")
+        cls.feijao = Produto.objects.create(nome="Feijão", unidade_medida="kg")
+        Estoque.objects.create(unidade=cls.unidade, produto=cls.arroz, quantidade=10, estoque_minimo=20)
+        Estoque.objects.create(unidade=cls.unidade, produto=cls.feijao, quantidade=5, estoque_minimo=2)
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+
+class SalvarItensContagemTests(DadosBasicosMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contagem = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana")
+
+    def test_grava_so_insumos_informados(self):
+        salvos = salvar_itens_contagem(self.contagem, {self.arroz.id: 8})
+        self.assertEqual(salvos, [self.arroz.id])
+        item = ItemContagemEstoque.objects.get(contagem=self.contagem)
+        self.assertEqual((item.quantidade_sistema, item.quantidade_fisica), (10, 8))
+
+    def test_recusa_nan_e_infinito(self):
+        for valor in (float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                salvar_itens_contagem(self.contagem, {self.arroz.id: valor})
+        self.assertFalse(ItemContagemEstoque.objects.exists())
+
+    def test_salvamento_automatico_grava_as_linhas_validas_e_devolve_as_invalidas(self):
+        resposta = self.client.post(
+            reverse('admin:salvar-itens-contagem', args=[self.contagem.pk]),
+            data={'itens': [{'produto_id': self.arroz.id, 'quantidade_fisica': 'NaN'},
+                            {'produto_id': self.feijao.id, 'quantidade_fisica': '4,0'},
+                            {'produto_id': 'x', 'quantidade_fisica': '1'}]},
+            content_type='application/json',
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json(), {'salvos': [self.feijao.id], 'ignorados': [self.arroz.id, 'x']})
+        self.assertEqual(list(ItemContagemEstoque.objects.values_list('produto_id', 'quantidade_fisica')),
+                         [(self.feijao.id, 4)])
+
+    def test_salvamento_automatico_responde_400_para_corpo_invalido(self):
+        resposta = self.client.post(
+            reverse('admin:salvar-itens-contagem', args=[self.contagem.pk]),
+            data={'itens': 'arroz'}, content_type='application/json',
+        )
+        self.assertEqual(resposta.status_code, 400)
+
+
+class SincronizarProdutosTests(DadosBasicosMixin, TestCase):
+
+    def test_incremental_traz_alterados_e_removidos(self):
+        inicial = self.client.get(reverse('produto-sincronizar')).json()
+        self.assertEqual(len(inicial['produtos']), 2)
+        self.assertEqual(inicial['removidos'], [])
+
+        removido_id = self.feijao.id
+        self.feijao.delete()
+        CodigoBarras.objects.create(produto=self.arroz, codigo='7890000000001')
+
+        resposta = self.client.get(reverse('produto-sincronizar'), {'desde': inicial['servidor_em']}).json()
+        self.assertEqual([p['id'] for p in resposta['produtos']], [self.arroz.id])
+        self.assertEqual(resposta['produtos'][0]['codigos_barras'], ['7890000000001'])
+        self.assertEqual(resposta['removidos'], [removido_id])
+
+
+class LoteContagemColetorTests(DadosBasicosMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contagem = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana")
+        CodigoBarras.objects.create(produto=self.arroz, codigo='7890000000001')
+        self.url = reverse('contagemestoque-lotes', args=[self.contagem.pk])
+        self.envio = {'lote_id': 'coletor-1-0001', 'leituras': [
+            {'codigo': '7890000000001', 'quantidade': 7, 'lido_em': '2026-10-19T10:00:00Z'},
+            {'codigo': '7899999999999', 'quantidade': 3, 'lido_em': '2026-10-19T10:01:00Z'},
+        ]}
+
+    def test_codigo_desconhecido_recusa_o_lote_sem_gravar(self):
+        resposta = self.client.post(self.url, self.envio, content_type='application/json')
+        self.assertEqual(resposta.status_code, 422)
+        self.assertEqual(resposta.json()['codigos_desconhecidos'], ['7899999999999'])
+        self.assertFalse(LoteContagem.objects.exists())
+        self.assertFalse(ItemContagemEstoque.objects.exists())
+
+        # Cadastrado o código, o mesmo lote é aceito
+        CodigoBarras.objects.create(produto=self.feijao, codigo='7899999999999')
+        resposta = self.client.post(self.url, self.envio, content_type='application/json')
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.json()['leituras_aplicadas'], 2)
+
+        reenvio = self.client.post(self.url, self.envio, content_type='application/json')
+        self.assertEqual(reenvio.status_code, 200)
+        self.assertEqual(LoteContagem.objects.count(), 1)
+
+
+class CodigoBarrasAdminTests(DadosBasicosMixin, TestCase):
+
+    def test_busca_por_codigo_interno_alfanumerico(self):
+        CodigoBarras.objects.create(produto=self.feijao, codigo='INT-0042')
+        resposta = self.client.get(reverse('admin:estoque_produto_changelist'), {'q': 'INT-0042'})
+        self.assertEqual(list(resposta.context['cl'].result_list), [self.feijao])
+
+    def test_folha_de_contagem_leva_so_os_codigos_dos_seus_produtos(self):
+        CodigoBarras.objects.create(produto=self.arroz, codigo='7890000000001')
+        CodigoBarras.objects.create(produto=self.feijao, codigo='7890000000002')
+        contagem = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana")
+        contagem.produtos_programados.set([self.arroz])
+
+        resposta = self.client.get(reverse('admin:estoque_contagemestoque_change', args=[contagem.pk]))
+        self.assertEqual(resposta.context['codigos_barras'], {'7890000000001': self.arroz.id})
+
+
+class ContagemCiclicaTests(DadosBasicosMixin, TestCase):
+
+    def test_limites_das_classes(self):
+        from .contagem_ciclica import _classificar
+        # A classe sai da participação acumulada ANTES do item: quem cruza os 80% ainda é A
+        self.assertEqual(_classificar({1: (79, 1), 2: (16, 1), 3: (5, 1), 4: (0, 0)}),
+                         {1: 'A', 2: 'A', 3: 'C', 4: 'C'})
+        self.assertEqual(_classificar({1: (80, 1), 2: (15, 1), 3: (5, 1)}), {1: 'A', 2: 'B', 3: 'C'})
+        self.assertEqual(_classificar({1: (0, 0), 2: (0, 0)}), {1: 'C', 2: 'C'})
+
+    def test_transferencia_conta_como_consumo_e_sem_preco_fica_numa_curva_separada(self):
+        from .contagem_ciclica import recalcular_classificacao_abc
+        cozinha = Unidade.objects.create(nome="Cozinha Central")
+        Estoque.objects.create(unidade=cozinha, produto=self.arroz, quantidade=100, custo_medio=5)
+        Estoque.objects.create(unidade=cozinha, produto=self.feijao, quantidade=100, custo_medio=8)
+        sal = Produto.objects.create(nome="Sal", unidade_medida="g")
+        Movimentacao.objects.create(tipo='TRANSFERENCIA', produto=self.arroz, quantidade=50, origem=cozinha, destino=self.unidade)
+        Movimentacao.objects.create(tipo='TRANSFERENCIA', produto=self.feijao, quantidade=1, origem=cozinha, destino=self.unidade)
+        Movimentacao.objects.create(tipo='SAIDA', produto=sal, quantidade=10000, origem=cozinha)
+
+        recalcular_classificacao_abc(unidades=[cozinha])
+        curva = {produto_id: (classe, consumo, valor) for produto_id, classe, consumo, valor in
+                 ClassificacaoABC.objects.filter(unidade=cozinha)
+                 .values_list('produto_id', 'classe', 'consumo_periodo', 'valor_consumo')}
+        self.assertEqual(curva[self.arroz.id], ('A', 50, 250))
+        self.assertEqual(curva[self.feijao.id], ('C', 1, 8))
+        # Os 10 kg de sal em gramas não tiram o arroz da classe A
+        self.assertEqual(curva[sal.id], ('A', 10000, 0))
+
+    def test_insumos_a_contar_pelo_vencimento(self):
+        from .contagem_ciclica import insumos_a_contar
+        hoje = timezone.now()
+        sal = Produto.objects.create(nome="Sal", unidade_medida="kg")
+        oleo = Produto.objects.create(nome="Óleo", unidade_medida="l")
+        ClassificacaoABC.objects.bulk_create([
+            ClassificacaoABC(unidade=self.unidade, produto=self.arroz, classe='A', ultima_contagem=hoje - timedelta(days=7)),
+            ClassificacaoABC(unidade=self.unidade, produto=self.feijao, classe='B', ultima_contagem=hoje - timedelta(days=14)),
+            ClassificacaoABC(unidade=self.unidade, produto=sal, classe='C', ultima_contagem=None),
+            ClassificacaoABC(unidade=self.unidade, produto=oleo, classe='C', ultima_contagem=hoje - timedelta(days=40)),
+        ])
+        # Nunca contado primeiro, depois o mais atrasado; o A vence exatamente hoje e entra; o B ainda não venceu
+        self.assertEqual(insumos_a_contar(self.unidade, hoje=hoje), [sal.id, oleo.id, self.arroz.id])
+        self.assertEqual(insumos_a_contar(self.unidade, hoje=hoje, max_itens=2), [sal.id, oleo.id])
+        self.assertEqual(insumos_a_contar(self.unidade, hoje=hoje + timedelta(days=1)),
+                         [sal.id, oleo.id, self.arroz.id, self.feijao.id])
+
+
+class CustoMedioTests(DadosBasicosMixin, TestCase):
+
+    def _custo(self, unidade, produto):
+        return Estoque.objects.get(unidade=unidade, produto=produto).custo_medio
+
+    def test_media_ponderada(self):
+        from decimal import Decimal
+        from .custos import _novo_custo_medio
+        self.assertEqual(_novo_custo_medio(10, Decimal('4'), 30, Decimal('8')), Decimal('7.0000'))
+        self.assertEqual(_novo_custo_medio(3, Decimal('1'), 0, Decimal('9')), Decimal('1.0000'))
+        # Estoque negativo não entra na média: vale o custo da entrada
+        self.assertEqual(_novo_custo_medio(-5, Decimal('4'), 10, Decimal('6')), Decimal('6.0000'))
+        self.assertEqual(_novo_custo_medio(0, Decimal('0'), 0, Decimal('6')), Decimal('6'))
+
+    def test_varias_entradas_no_mesmo_lote_se_acumulam(self):
+        from decimal import Decimal
+        from .custos import atualizar_custos_medios
+        Estoque.objects.filter(unidade=self.unidade, produto=self.arroz).update(custo_medio=4)
+        atualizar_custos_medios([
+            Movimentacao(tipo='ENTRADA', produto=self.arroz, quantidade=10, destino=self.unidade, custo_unitario=6),
+            Movimentacao(tipo='SAIDA', produto=self.arroz, quantidade=15, origem=self.unidade),
+            Movimentacao(tipo='ENTRADA', produto=self.arroz, quantidade=5, destino=self.unidade, custo_unitario=10),
+            Movimentacao(tipo='ENTRADA', produto=self.feijao, quantidade=5, destino=self.unidade),  # Sem preço
+        ])
+        # 10 × 4 + 10 × 6 = R$ 5,00; saem 15 (ficam 5 a R$ 5,00); + 5 × 10 = R$ 7,50
+        self.assertEqual(self._custo(self.unidade, self.arroz), Decimal('7.5000'))
+        self.assertEqual(self._custo(self.unidade, self.feijao), 0)
+
+    def test_estoque_negativo_assume_o_custo_da_entrada(self):
+        from decimal import Decimal
+        Estoque.objects.filter(unidade=self.unidade, produto=self.arroz).update(quantidade=-4, custo_medio=2)
+        Movimentacao.objects.create(tipo='ENTRADA', produto=self.arroz, quantidade=10, destino=self.unidade, custo_unitario=5)
+        self.assertEqual(self._custo(self.unidade, self.arroz), Decimal('5.0000'))
+
+    def test_transferencia_leva_o_custo_da_origem(self):
+        from decimal import Decimal
+        loja = Unidade.objects.create(nome="Loja")
+        Estoque.objects.filter(unidade=self.unidade, produto=self.arroz).update(custo_medio=3)
+        Estoque.objects.create(unidade=loja, produto=self.arroz, quantidade=10, custo_medio=5)
+        transferencia = Movimentacao.objects.create(tipo='TRANSFERENCIA', produto=self.arroz, quantidade=10,
+                                                    origem=self.unidade, destino=loja)
+        transferencia.refresh_from_db()
+        self.assertEqual(transferencia.custo_unitario, Decimal('3.00'))
+        self.assertEqual(self._custo(loja, self.arroz), Decimal('4.0000'))
+        self.assertEqual(self._custo(self.unidade, self.arroz), Decimal('3.0000'))
+
+    def test_transferencia_de_origem_sem_custo_nao_zera_o_destino(self):
+        from decimal import Decimal
+        loja = Unidade.objects.create(nome="Loja")
+        Estoque.objects.create(unidade=loja, produto=self.arroz, quantidade=10, custo_medio=5)
+        Estoque.objects.create(unidade=loja, produto=self.feijao, quantidade=10, custo_medio=5)
+        pedido = PedidoCompra.objects.create(fornecedor=Fornecedor.objects.create(nome="Atacadão"))
+        ItemPedidoCompra.objects.create(pedido=pedido, produto=self.feijao, quantidade=1, preco_custo_unitario='7.00')
+
+        # Arroz nunca comprado: o custo da loja fica como está
+        Movimentacao.objects.create(tipo='TRANSFERENCIA', produto=self.arroz, quantidade=10, origem=self.unidade, destino=loja)
+        self.assertEqual(self._custo(loja, self.arroz), Decimal('5.0000'))
+        # Feijão: vale o último preço de compra
+        Movimentacao.objects.create(tipo='TRANSFERENCIA', produto=self.feijao, quantidade=10, origem=self.unidade, destino=loja)
+        self.assertEqual(self._custo(loja, self.feijao), Decimal('6.0000'))
+
+
+class RecalcularCustosTests(DadosBasicosMixin, TestCase):
+
+    def test_recalculo_marca_o_produto_como_alterado(self):
+        prato = Produto.objects.create(nome="Baião", tipo='PRODUTO_FINAL')
+        ontem = timezone.now() - timedelta(days=1)
+        Produto.objects.filter(id=prato.id).update(atualizado_em=ontem)
+
+        # O sinal do Ingrediente recalcula o custo da ficha técnica
+        Ingrediente.objects.create(produto_final=prato, insumo=self.arroz, quantidade=0.2)
+
+        prato.refresh_from_db()
+        self.assertIsNotNone(prato.custo_calculado_em)
+        self.assertEqual(prato.atualizado_em, prato.custo_calculado_em)
+        self.assertGreater(prato.atualizado_em, ontem)
+
+    def _prato_com_arroz(self):
+        from decimal import Decimal
+        cozinha = Unidade.objects.create(nome="Cozinha Central")
+        Estoque.objects.create(unidade=cozinha, produto=self.arroz, quantidade=10, custo_medio=4)
+        prato = Produto.objects.create(nome="Baião", tipo='PRODUTO_FINAL')
+        Ingrediente.objects.create(produto_final=prato, insumo=self.arroz, quantidade=0.5)
+        prato.refresh_from_db()
+        self.assertEqual(prato.custo_teorico, Decimal('2.0000'))
+        return cozinha, prato
+
+    def test_entrada_avulsa_na_cozinha_atualiza_a_ficha_tecnica(self):
+        from decimal import Decimal
+        cozinha, prato = self._prato_com_arroz()
+        Movimentacao.objects.create(tipo='ENTRADA', produto=self.arroz, quantidade=10, destino=cozinha, custo_unitario=8)
+        prato.refresh_from_db()
+        self.assertEqual(prato.custo_teorico, Decimal('3.0000'))
+
+    def test_lote_de_movimentacoes_na_cozinha_atualiza_a_ficha_tecnica(self):
+        from decimal import Decimal
+        cozinha, prato = self._prato_com_arroz()
+        registrar_lote_movimentacoes('pdv-1-mov-1', [
+            {'tipo': 'ENTRADA', 'produto': self.arroz.id, 'quantidade': 30, 'destino': cozinha.id, 'custo_unitario': '8'},
+        ])
+        prato.refresh_from_db()
+        self.assertEqual(prato.custo_teorico, Decimal('3.5000'))
+
+    def test_item_de_pedido_pendente_nao_recalcula(self):
+        cozinha, prato = self._prato_com_arroz()
+        pedido = PedidoCompra.objects.create(fornecedor=Fornecedor.objects.create(nome="Atacadão"))
+        ItemPedidoCompra.objects.create(pedido=pedido, produto=self.arroz, quantidade=10, preco_custo_unitario='9.00')
+        calculado_em = prato.custo_calculado_em
+        prato.refresh_from_db()
+        self.assertEqual(prato.custo_calculado_em, calculado_em)
+
+
+class ReceberPedidoCompraTests(DadosBasicosMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pedido = PedidoCompra.objects.create(fornecedor=Fornecedor.objects.create(nome="Atacadão"))
+        self.item_arroz = ItemPedidoCompra.objects.create(
+            pedido=self.pedido, produto=self.arroz, quantidade=10, preco_custo_unitario='5.00')
+        self.item_feijao = ItemPedidoCompra.objects.create(
+            pedido=self.pedido, produto=self.feijao, quantidade=4, preco_custo_unitario='8.00')
+
+    def test_recebimento_parcial_e_depois_o_saldo(self):
+        criadas = receber_pedido_compra(self.pedido, self.unidade, {self.item_arroz.id: 6})
+        self.assertEqual([(m.tipo, m.produto_id, m.quantidade) for m in criadas], [('ENTRADA', self.arroz.id, 6)])
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.arroz).quantidade, 16)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'RECEBIDO_PARCIALMENTE')
+        primeira_entrega = self.pedido.data_recebimento
+        self.assertIsNotNone(primeira_entrega)
+
+        # Sem quantidades: recebe o que ainda falta de cada item
+        receber_pedido_compra(self.pedido, self.unidade)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.arroz).quantidade, 20)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.feijao).quantidade, 9)
+        self.assertEqual(Movimentacao.objects.filter(tipo='ENTRADA').count(), 3)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'RECEBIDO')
+        # O prazo do fornecedor conta até a primeira entrega
+        self.assertEqual(self.pedido.data_recebimento, primeira_entrega)
+
+    def test_nada_a_receber_nao_altera_o_pedido(self):
+        self.assertEqual(receber_pedido_compra(self.pedido, self.unidade, {self.item_arroz.id: 0}), [])
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.status, self.pedido.data_recebimento), ('PENDENTE', None))
+
+    def test_sugestao_mostra_o_fornecedor_conhecido(self):
+        receber_pedido_compra(self.pedido, Unidade.objects.create(nome="Cozinha Central"))
+        Movimentacao.objects.create(tipo='SAIDA', produto=self.arroz, quantidade=300, origem=self.unidade)
+        sal = Produto.objects.create(nome="Sal", unidade_medida="kg")  # Nunca comprado: sem fornecedor
+        Movimentacao.objects.create(tipo='SAIDA', produto=sal, quantidade=100, origem=self.unidade)
+
+        resposta = self.client.get(reverse('admin:sugerir-pedidos-compra'))
+        self.assertEqual([(item['nome'], item['fornecedor']) for item in resposta.context['itens']],
+                         [("Arroz", "Atacadão"), ("Sal", None)])
+
+
+class VarianciaTests(DadosBasicosMixin, TestCase):
+
+    def _contagem(self, quando, quantidade):
+        contagem = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana",
+                                                  data_contagem=quando, status='aprovado')
+        ItemContagemEstoque.objects.create(contagem=contagem, produto=self.arroz, quantidade_fisica=quantidade)
+
+    def test_venda_apagada_nao_conta_como_entrada(self):
+        from .variancia import calcular_variancia
+
+        agora = timezone.now()
+        ontem = timezone.localdate() - timedelta(days=1)
+        self._contagem(agora - timedelta(days=2), 10)
+        Movimentacao.objects.create(tipo='ENTRADA', produto=self.arroz, quantidade=5, destino=self.unidade,
+                                    custo_unitario='5.00')
+        VendaDiaria.objects.create(unidade=self.unidade, produto=self.arroz, data=ontem, quantidade=3)
+        # Lançada por engano e apagada: o sinal grava uma ENTRADA de estorno
+        VendaDiaria.objects.create(unidade=self.unidade, produto=self.arroz, data=ontem, quantidade=2).delete()
+        self.assertTrue(Movimentacao.objects.filter(tipo='ENTRADA', estorno_venda=True).exists())
+        self._contagem(agora + timedelta(minutes=1), 12)
+
+        periodo = calcular_variancia(ate=agora + timedelta(hours=1)).iloc[0]
+        self.assertEqual((periodo['entradas'], periodo['consumo_real'], periodo['consumo_teorico']), (5, 3, 3))
+        self.assertEqual(periodo['variancia'], 0)
+
+
+class CachePdfPedidosTests(DadosBasicosMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        configuracao = override_settings(PDF_CACHE_DIR=self.pasta)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        pedido = PedidoReposicao.objects.create(unidade_destino=self.unidade)
+        ItemReposicao.objects.create(pedido_reposicao=pedido, produto=self.arroz, quantidade_solicitada=4)
+        self.pedidos = carregar_pedidos(PedidoReposicao.objects.all())
+
+        # O WeasyPrint fica de fora: o que interessa aqui é o cache
+        renderizar = mock.patch('estoque.pdf_pedidos.renderizar_pdf_cronometrado',
+                                side_effect=lambda html: (html.encode(), 0.01))
+        self.renderizar = renderizar.start()
+        self.addCleanup(renderizar.stop)
+
+    def test_cache_por_conteudo_e_data_de_emissao(self):
+        hoje = timezone.localdate()
+        (_, primeiro), = pdfs_dos_pedidos(self.pedidos)
+        (_, segundo), = pdfs_dos_pedidos(self.pedidos)
+        self.assertEqual(primeiro, segundo)
+        self.assertIn(hoje.strftime('%d/%m/%Y'), primeiro.decode())
+        self.assertEqual(self.renderizar.call_count, 1)
+
+        # No dia seguinte a data impressa muda: renderiza de novo
+        amanha = hoje + timedelta(days=1)
+        with mock.patch('django.utils.timezone.localdate', return_value=amanha):
+            (_, do_dia_seguinte), = pdfs_dos_pedidos(self.pedidos)
+        self.assertIn(amanha.strftime('%d/%m/%Y'), do_dia_seguinte.decode())
+        self.assertEqual(self.renderizar.call_count, 2)
+
+    def test_varios_pedidos_usam_o_mesmo_pool_sem_fork(self):
+        from . import pdf_pedidos
+        outro = PedidoReposicao.objects.create(unidade_destino=self.unidade)
+        ItemReposicao.objects.create(pedido_reposicao=outro, produto=self.feijao, quantidade_solicitada=1)
+        pedidos = carregar_pedidos(PedidoReposicao.objects.all())
+
+        self.addCleanup(setattr, pdf_pedidos, '_pool', None)
+        with mock.patch('estoque.pdf_pedidos.ProcessPoolExecutor') as executor:
+            executor.return_value.map.side_effect = lambda funcao, htmls: map(funcao, htmls)
+            pdfs_dos_pedidos(pedidos)
+            ItemReposicao.objects.create(pedido_reposicao=outro, produto=self.arroz, quantidade_solicitada=1)
+            ItemReposicao.objects.create(pedido_reposicao=pedidos[0], produto=self.feijao, quantidade_solicitada=1)
+            pdfs_dos_pedidos(carregar_pedidos(PedidoReposicao.objects.all()))
+
+        executor.assert_called_once()
+        self.assertNotEqual(executor.call_args.kwargs['mp_context'].get_start_method(), 'fork')
+        self.assertEqual(executor.return_value.map.call_count, 2)
+        self.assertEqual(self.renderizar.call_count, 4)
+
+    def test_versao_antiga_so_e_apagada_depois_da_tolerancia(self):
+        pdf_unico_dos_pedidos(self.pedidos)
+        antigo, = self.pasta.glob('pedidos_*.pdf')
+
+        ItemReposicao.objects.create(pedido_reposicao=self.pedidos[0], produto=self.feijao, quantidade_solicitada=1)
+        pdf_unico_dos_pedidos(carregar_pedidos(PedidoReposicao.objects.all()))
+        self.assertEqual(len(list(self.pasta.glob('pedidos_*.pdf'))), 2)
+        self.assertTrue(antigo.exists())
+
+        velho = time.time() - TOLERANCIA_ANTIGOS - 1
+        os.utime(antigo, (velho, velho))
+        ItemReposicao.objects.create(pedido_reposicao=self.pedidos[0], produto=self.feijao, quantidade_solicitada=2)
+        pdf_unico_dos_pedidos(carregar_pedidos(PedidoReposicao.objects.all()))
+        self.assertFalse(antigo.exists())
+        self.assertEqual(len(list(self.pasta.glob('pedidos_*.pdf'))), 2)
+
+
+class FiltroPorDataTests(DadosBasicosMixin, TestCase):
+
+    def test_desde_e_ate_pegam_os_dias_inteiros_sem_converter_a_coluna(self):
+        for dia, hora in ((1, 23), (2, 0), (2, 23), (3, 0)):
+            movimentacao = Movimentacao.objects.create(tipo='AJUSTE', produto=self.arroz, quantidade=dia,
+                                                       destino=self.unidade)
+            quando = timezone.make_aware(datetime(2025, 3, dia, hora, 30))
+            Movimentacao.objects.filter(id=movimentacao.id).update(data=quando)
+
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('movimentacao-list'), {'desde': '2025-03-02', 'ate': '2025-03-02'})
+        self.assertEqual(sorted(m['data'][:13] for m in resposta.json()['results']), ['2025-03-02T00', '2025-03-02T23'])
+        self.assertFalse(any('cast_date' in consulta['sql'] for consulta in consultas.captured_queries))
+
+    def test_data_invalida_devolve_400(self):
+        resposta = self.client.get(reverse('movimentacao-list'), {'desde': '2025-02-30'})
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('desde', resposta.json())
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'permissoes': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes-permissoes'},
+})
+class EscopoUsuarioTests(DadosBasicosMixin, TestCase):
+
+    def setUp(self):
+        self.outra = Unidade.objects.create(nome="Praia")
+        self.gerente = User.objects.create_user('gerente', password='senha', is_staff=True)
+        self.perfil = PerfilUsuario.objects.create(user=self.gerente, unidade=self.unidade)
+        self.sessao = SessionStore()
+
+    def _escopo(self):
+        # Cada chamada é uma requisição nova da mesma sessão
+        request = RequestFactory().get('/')
+        request.user, request.session = self.gerente, self.sessao
+        return escopo_usuario(request)
+
+    def test_escopo_fica_na_sessao_enquanto_nada_muda(self):
+        self.assertEqual(self._escopo().unidade_id, self.unidade.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._escopo().unidade_id, self.unidade.id)
+
+    def test_mudanca_de_perfil_vale_sem_novo_login(self):
+        self._escopo()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.perfil.unidade = self.outra
+            self.perfil.save()
+        self.assertEqual(self._escopo().unidade_id, self.outra.id)
+
+    def test_mudanca_de_grupo_vale_sem_novo_login(self):
+        self.assertFalse(self._escopo().gerente)
+        gerentes = Group.objects.create(name='gerentes')
+        with self.captureOnCommitCallbacks(execute=True):
+            gerentes.user_set.add(self.gerente)
+        self.assertTrue(self._escopo().gerente)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gerente.groups.clear()
+        self.assertFalse(self._escopo().gerente)
+
+
+class AcessoMetricasTests(TestCase):
+
+    def test_sem_configuracao_nem_localhost_le(self):
+        self.assertEqual(self.client.get(reverse('metricas'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+    @override_settings(METRICAS_TOKEN='segredo')
+    def test_coletor_com_token(self):
+        self.assertEqual(self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer errado').status_code, 403)
+        resposta = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer segredo')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn(b'# TYPE estoque_requisicao_segundos histogram', resposta.content)
+
+    @override_settings(METRICAS_IPS_PERMITIDOS=['10.0.0.5'])
+    def test_coletor_por_ip(self):
+        self.assertEqual(self.client.get(reverse('metricas'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+
+class OrcamentoDasViewsTests(OrcamentoDeConsultasMixin, DadosBasicosMixin, TestCase):
+    """ As views com orçamento em settings.ORCAMENTOS_POR_VIEW, com uma rede pequena. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.central = Unidade.objects.create(nome="Cozinha Central")
+        prato = Produto.objects.create(nome="Arroz com feijão", tipo='PRODUTO_FINAL', preco_venda='30.00')
+        Ingrediente.objects.create(produto_final=prato, insumo=cls.arroz, quantidade=0.2)
+        Ingrediente.objects.create(produto_final=prato, insumo=cls.feijao, quantidade=0.1)
+        for insumo in (cls.arroz, cls.feijao):
+            Estoque.objects.create(unidade=cls.central, produto=insumo, quantidade=50)
+            Movimentacao.objects.create(tipo='TRANSFERENCIA', produto=insumo, quantidade=2,
+                                        origem=cls.central, destino=cls.unidade)
+        VendaDiaria.objects.create(unidade=cls.unidade, produto=prato, quantidade=4)
+
+    def test_home(self):
+        self.assertDentroDoOrcamento(self.client.get(reverse('home')))
+
+    def test_relatorios(self):
+        self.assertDentroDoOrcamento(self.client.get(reverse('relatorios')))
+
+    def test_gerar_reposicao(self):
+        resposta = self.client.get(reverse('admin:gerar_reposicao'), {'unidade_id': self.unidade.id})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertDentroDoOrcamento(resposta)
+
+    def test_gerar_reposicao_post_nao_cresce_com_os_itens(self):
+        with self.assertConsultasAte(8):
+            resposta = self.client.post(reverse('admin:gerar_reposicao'), {
+                'unidade_id': self.unidade.id,
+                f'produto_{self.arroz.id}': '12', f'justificativa_{self.arroz.id}': 'Evento',
+                f'produto_{self.feijao.id}': '3,5',
+            })
+        pedido = PedidoReposicao.objects.get()
+        self.assertRedirects(resposta, reverse('admin:estoque_pedidoreposicao_change', args=[pedido.id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(sorted(pedido.itens.values_list('produto_id', 'quantidade_solicitada', 'justificativa')),
+                         [(self.arroz.id, 12, 'Evento'), (self.feijao.id, 3.5, '')])
+
+    def test_receber_pedido_reposicao(self):
+        pedido = PedidoReposicao.objects.create(unidade_destino=self.unidade, status='ENVIADO')
+        ItemReposicao.objects.create(pedido_reposicao=pedido, produto=self.arroz, quantidade_solicitada=10,
+                                     quantidade_enviada=10)
+        ItemReposicao.objects.create(pedido_reposicao=pedido, produto=self.feijao, quantidade_solicitada=5,
+                                     quantidade_enviada=4)
+        resposta = self.client.get(reverse('admin:receber-pedido-reposicao', args=[pedido.id]))
+        self.assertDentroDoOrcamento(resposta)
+
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, 'CONCLUIDO_PARCIALMENTE')
+        # 10 + 2 transferidos - 0,8 das vendas + 10 recebidos
+        self.assertAlmostEqual(Estoque.objects.get(unidade=self.unidade, produto=self.arroz).quantidade, 21.2)
+        self.assertEqual(Estoque.objects.get(unidade=self.central, produto=self.feijao).quantidade, 44)
+
+    def test_contagem(self):
+        contagem = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana")
+        salvar_itens_contagem(contagem, {self.arroz.id: 9})
+        resposta = self.client.get(reverse('admin:estoque_contagemestoque_change', args=[contagem.id]))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertDentroDoOrcamento(resposta)
+
+
+class AprovarContagensTests(OrcamentoDeConsultasMixin, DadosBasicosMixin, TestCase):
+
+    def test_estoque_fica_igual_ao_contado_e_a_contagem_mais_recente_vence(self):
+        outra = Unidade.objects.create(nome="Praia")
+        agora = timezone.now()
+        antiga = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana",
+                                                data_contagem=agora - timedelta(hours=2))
+        salvar_itens_contagem(antiga, {self.arroz.id: 7, self.feijao.id: 5})
+        recente = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Bia", data_contagem=agora)
+        salvar_itens_contagem(recente, {self.arroz.id: 8})
+        da_praia = ContagemEstoque.objects.create(unidade=outra, responsavel="Caio")
+        salvar_itens_contagem(da_praia, {self.feijao.id: 3})  # Sem linha de Estoque ainda
+        cancelada = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana", status='cancelado')
+
+        aprovadas = aprovar_contagens(ContagemEstoque.objects.all())
+
+        self.assertEqual(aprovadas, 3)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.arroz).quantidade, 8)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.feijao).quantidade, 5)
+        self.assertEqual(Estoque.objects.get(unidade=outra, produto=self.feijao).quantidade, 3)
+        # Só as diferenças contra o sistema viram AJUSTE (o feijão do Centro bateu)
+        self.assertEqual(
+            sorted(Movimentacao.objects.filter(tipo='AJUSTE').values_list('produto_id', 'quantidade', 'origem_id', 'destino_id')),
+            sorted([(self.arroz.id, 3, self.unidade.id, None), (self.arroz.id, 2, self.unidade.id, None),
+                    (self.feijao.id, 3, None, outra.id)]),
+        )
+        cancelada.refresh_from_db()
+        self.assertEqual(cancelada.status, 'cancelado')
+        self.assertEqual(aprovar_contagens(ContagemEstoque.objects.all()), 0)
+
+    def test_consultas_nao_crescem_com_os_itens(self):
+        insumos = Produto.objects.bulk_create([Produto(nome=f"Insumo {i}") for i in range(30)])
+        contagem = ContagemEstoque.objects.create(unidade=self.unidade, responsavel="Ana")
+        salvar_itens_contagem(contagem, {produto.id: 1 for produto in insumos})
+        # 11 hoje, com 30 itens ou com 3: um N+1 passaria de 40
+        with self.assertConsultasAte(12):
+            aprovar_contagens(ContagemEstoque.objects.all())
+        self.assertEqual(Estoque.objects.filter(unidade=self.unidade, quantidade=1).count(), 30)
+
+
+class LotesLancamentoTests(DadosBasicosMixin, TestCase):
+
+    def test_lote_de_movimentacoes_e_gravado_uma_vez(self):
+        linhas = [
+            {'tipo': 'ENTRADA', 'produto': self.arroz.id, 'quantidade': 5, 'destino': self.unidade.id,
+             'custo_unitario': '4.0000'},
+            {'tipo': 'SAIDA', 'produto': self.arroz.id, 'quantidade': 2, 'origem': self.unidade.id},
+        ]
+        lote, criado = registrar_lote_movimentacoes('pdv-1-mov-1', linhas)
+        self.assertTrue(criado)
+        self.assertEqual(lote.resultado['criadas'], 2)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.arroz).quantidade, 13)
+
+        reenvio, criado = registrar_lote_movimentacoes('pdv-1-mov-1', linhas)
+        self.assertFalse(criado)
+        self.assertEqual((reenvio.id, reenvio.resultado), (lote.id, lote.resultado))
+        self.assertEqual(Movimentacao.objects.count(), 2)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.arroz).quantidade, 13)
+
+    def test_lote_de_vendas_baixa_a_ficha_tecnica_uma_vez(self):
+        prato = Produto.objects.create(nome="Baião", tipo='PRODUTO_FINAL')
+        Ingrediente.objects.create(produto_final=prato, insumo=self.arroz, quantidade=0.5)
+        Ingrediente.objects.create(produto_final=prato, insumo=self.feijao, quantidade=0.25)
+        linhas = [
+            {'unidade': self.unidade.id, 'produto': prato.id, 'quantidade': 4},
+            {'unidade': self.unidade.id, 'produto': self.feijao.id, 'quantidade': 1},
+        ]
+        for _ in range(2):
+            lote, _ = registrar_lote_vendas('pdv-1-vendas-1', linhas)
+
+        self.assertEqual(lote.resultado['criadas'], 2)
+        self.assertEqual(VendaDiaria.objects.count(), 2)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.arroz).quantidade, 8)
+        self.assertEqual(Estoque.objects.get(unidade=self.unidade, produto=self.feijao).quantidade, 3)
+
+
+class FeedAlteracoesEstoqueTests(DadosBasicosMixin, TestCase):
+
+    def _changes(self, **parametros):
+        resposta = self.client.get(reverse('estoque-changes'), parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def _fotos(self, resposta):
+        return [(a['unidade'], a['produto'], a['quantidade']) for a in resposta['alteracoes']]
+
+    def test_gravacao_avulsa_e_em_lote_chegam_ao_feed(self):
+        cursor = self._changes()['cursor']
+
+        # Sinal: uma movimentação de cada vez
+        Movimentacao.objects.create(tipo='SAIDA', produto=self.arroz, quantidade=2, origem=self.unidade)
+        avulsa = self._changes(since=cursor)
+        self.assertEqual(self._fotos(avulsa), [(self.unidade.id, self.arroz.id, 8)])
+        self.assertGreater(avulsa['cursor'], cursor)
+
+        # services.py: lote com um bulk_create
+        registrar_lote_movimentacoes('pdv-1-mov-1', [
+            {'tipo': 'SAIDA', 'produto': self.arroz.id, 'quantidade': 1, 'origem': self.unidade.id},
+            {'tipo': 'SAIDA', 'produto': self.feijao.id, 'quantidade': 1, 'origem': self.unidade.id},
+        ])
+        em_lote = self._changes(since=avulsa['cursor'])
+        self.assertEqual(sorted(self._fotos(em_lote)), [(self.unidade.id, self.arroz.id, 7), (self.unidade.id, self.feijao.id, 4)])
+        self.assertGreater(em_lote['cursor'], avulsa['cursor'])
+
+        # Nada novo: o cursor fica onde está
+        self.assertEqual(self._changes(since=em_lote['cursor']),
+                         {'cursor': em_lote['cursor'], 'mais': False, 'alteracoes': []})
+
+    def test_retomada_pelo_cursor_em_paginas(self):
+        cursor = inicial = self._changes()['cursor']
+        for quantidade in (1, 2, 3):
+            Movimentacao.objects.create(tipo='SAIDA', produto=self.arroz, quantidade=quantidade, origem=self.unidade)
+        Movimentacao.objects.create(tipo='SAIDA', produto=self.feijao, quantidade=1, origem=self.unidade)
+
+        cursores, fotos = [], []
+        while True:
+            pagina = self._changes(since=cursor, limit=2)
+            cursores.append(pagina['cursor'])
+            fotos += [(a['cursor'], a['produto'], a['quantidade']) for a in pagina['alteracoes']]
+            cursor = pagina['cursor']
+            if not pagina['mais']:
+                break
+
+        self.assertEqual(len(cursores), 2)
+        self.assertEqual(cursores, sorted(set(cursores)))
+        self.assertGreater(cursores[0], inicial)
+        self.assertEqual([c for c, _, _ in fotos], sorted(c for c, _, _ in fotos))
+        # Dentro da página vale a foto mais recente de cada linha; o cliente termina com o estoque atual
+        self.assertEqual([(p, q) for _, p, q in fotos], [(self.arroz.id, 7), (self.arroz.id, 4), (self.feijao.id, 4)])
+
+        # Uma página inteira com a mesma linha: só a última foto, e o cursor avança até ela
+        pagina = self._changes(since=inicial, limit=3)
+        self.assertEqual([(a['produto'], a['quantidade']) for a in pagina['alteracoes']], [(self.arroz.id, 4)])
+        self.assertTrue(pagina['mais'])
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get(reverse('estoque-changes'), {'since': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('estoque-changes'), {'since': '0', 'unidade': 'x'}).status_code, 400)
+
+
+class MatrizEstoqueTests(DadosBasicosMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.loja = Unidade.objects.create(nome="Loja")
+        Estoque.objects.create(unidade=self.loja, produto=self.feijao, quantidade=3.5, estoque_minimo=1)
+        self.url = reverse('estoque-matriz')
+
+    def test_json(self):
+        resposta = self.client.get(self.url, {'minimos': '1'}).json()
+        self.assertEqual(resposta['unidades'], [self.unidade.id, self.loja.id])
+        self.assertEqual(resposta['produtos_nomes'], ["Arroz", "Feijão"])
+        self.assertEqual(resposta['quantidades'], [[10, 5], [0, 3.5]])
+        self.assertEqual(resposta['minimos'], [[20, 2], [0, 1]])
+
+        so_loja = self.client.get(self.url, {'unidade': f' {self.loja.id},'}).json()
+        self.assertEqual((so_loja['unidades'], so_loja['quantidades']), ([self.loja.id], [[0, 3.5]]))
+        self.assertNotIn('minimos', so_loja)
+
+    def test_unidade_invalida_devolve_400(self):
+        for valor in ('abc', '1;2', f'{self.loja.id},x'):
+            with self.subTest(unidade=valor):
+                self.assertEqual(self.client.get(self.url, {'unidade': valor}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'formato': 'xml'}).status_code, 400)
+
+    def test_csv(self):
+        resposta = self.client.get(self.url, {'formato': 'csv'})
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(resposta.content.decode().splitlines(), [
+            'produto_id,produto,Centro,Loja',
+            f'{self.arroz.id},Arroz,10.0,0.0',
+            f'{self.feijao.id},Feijão,5.0,3.5',
+        ])
+
+    def test_npz(self):
+        import io
+        import numpy as np
+        resposta = self.client.get(self.url, {'formato': 'npz', 'minimos': '1'})
+        arquivos = np.load(io.BytesIO(resposta.content))
+        self.assertEqual(sorted(arquivos.files), ['minimos', 'produtos', 'quantidades', 'unidades'])
+        self.assertEqual(arquivos['unidades'].tolist(), [self.unidade.id, self.loja.id])
+        self.assertEqual(arquivos['quantidades'].tolist(), [[10, 5], [0, 3.5]])
+        self.assertEqual(arquivos['minimos'].tolist(), [[20, 2], [0, 1]])
+
+
+class LeiturasAssincronasTests(TransactionTestCase):
+    """ As leituras rodam em threads do pool, com outra conexão: os dados precisam estar gravados de fato. """
+
+    def setUp(self):
+        self.unidade = Unidade.objects.create(nome="Centro")
+        self.arroz = Produto.objects.create(nome="Arroz", unidade_medida="kg")
+        Estoque.objects.create(unidade=self.unidade, produto=self.arroz, quantidade=10, estoque_minimo=20)
+        PedidoReposicao.objects.create(unidade_destino=self.unidade)
+
+    def test_estoque_da_unidade(self):
+        resposta = self.client.get(reverse('async_estoque_unidade', args=[self.unidade.id]))
+        self.assertEqual(resposta.json(), {
+            'unidade': {'id': self.unidade.id, 'nome': "Centro"},
+            'itens': [{'produto_id': self.arroz.id, 'produto__nome': "Arroz", 'produto__unidade_medida': "kg",
+                       'quantidade': 10, 'estoque_minimo': 20}],
+        })
+        self.assertEqual(self.client.get(reverse('async_estoque_unidade', args=[999])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('async_estoque_unidade', args=[self.unidade.id])).status_code, 405)
+
+    def test_matriz_igual_a_do_drf(self):
+        self.assertEqual(self.client.get(reverse('async_matriz_estoque'), {'minimos': '1'}).json(),
+                         self.client.get(reverse('estoque-matriz'), {'minimos': '1'}).json())
+        self.assertEqual(self.client.get(reverse('async_matriz_estoque'), {'unidade': '1;2'}).status_code, 400)
+
+    def test_pedidos_pendentes(self):
+        resposta = self.client.get(reverse('async_pedidos_pendentes'), {'unidade': str(self.unidade.id)}).json()
+        self.assertEqual([(p['unidade_destino__nome'], p['status']) for p in resposta['reposicoes']],
+                         [("Centro", 'PENDENTE')])
+        self.assertEqual(resposta['compras'], [])
+        self.assertEqual(self.client.get(reverse('async_pedidos_pendentes'), {'unidade': 'abc'}).status_code, 400)
+
+
+class ListaGrandeAdminTests(DadosBasicosMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.movimentacoes = [
+            Movimentacao.objects.create(tipo='SAIDA', produto=self.arroz, quantidade=1, origem=self.unidade)
+            for _ in range(7)
+        ]
+        self.url = reverse('admin:estoque_movimentacao_changelist')
+        for alvo, valor in (('estoque.admin_listas.PaginadorContagemEstimada.limite_contagem', 3),
+                            ('estoque.admin.MovimentacaoAdmin.list_per_page', 2)):
+            patch = mock.patch(alvo, valor)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_acima_do_limite_mostra_o_total_como_aproximado_e_segue_por_proxima(self):
+        cl = self.client.get(self.url).context['cl']
+        self.assertEqual(str(cl.result_count), '3+')
+        self.assertIsNone(cl.url_pagina_anterior)
+        self.assertEqual(cl.url_proxima_pagina, '?p=2')
+
+        # Além das páginas que o total aproximado daria (3 linhas / 2 por página)
+        resposta = self.client.get(self.url, {'p': 4})
+        self.assertEqual(resposta.status_code, 200)
+        cl = resposta.context['cl']
+        self.assertEqual([m.id for m in cl.result_list], [self.movimentacoes[0].id])
+        self.assertEqual(cl.url_pagina_anterior, '?p=3')
+        self.assertIsNone(cl.url_proxima_pagina)
+        self.assertContains(resposta, '3+ movimentacaos (página 4)')
+
+        self.assertRedirects(self.client.get(self.url, {'p': 5}), self.url + '?e=1', fetch_redirect_response=False)
+
+    def test_abaixo_do_limite_a_contagem_e_exata_mesmo_depois_de_apagar(self):
+        Movimentacao.objects.filter(id__in=[m.id for m in self.movimentacoes[:5]]).delete()
+        resposta = self.client.get(self.url)
+        cl = resposta.context['cl']
+        self.assertEqual((cl.result_count, type(cl.result_count)), (2, int))
+        self.assertEqual(len(cl.result_list), 2)
+        self.assertFalse(cl.multi_page)
+
+    def test_busca_pelo_nome_do_produto_ou_da_unidade(self):
+        Movimentacao.objects.create(tipo='ENTRADA', produto=self.feijao, quantidade=2, destino=self.unidade)
+        outra = Unidade.objects.create(nome="Filial Norte")
+        Movimentacao.objects.create(tipo='TRANSFERENCIA', produto=self.arroz, quantidade=1,
+                                    origem=self.unidade, destino=outra)
+
+        cl = self.client.get(self.url, {'q': 'feij'}).context['cl']
+        self.assertEqual([m.produto_id for m in cl.result_list], [self.feijao.id])
+        cl = self.client.get(self.url, {'q': 'filial norte'}).context['cl']
+        self.assertEqual([m.destino_id for m in cl.result_list], [outra.id])
+
+        resposta = self.client.get(self.url, {'q': 'inexistente'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['cl'].result_count, 0)
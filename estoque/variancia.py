@@ -0,0 +1,177 @@
+# estoque/variancia.py
+"""
+Relatório de variância: consumo teórico x consumo real entre contagens.
+
+Entre duas contagens aprovadas de um insumo numa unidade:
+
+    consumo real     = contado na abertura + entradas - transferências enviadas - contado no fechamento
+    consumo teórico  = vendas do período × ficha técnica (Ingrediente)
+    variância        = consumo real - consumo teórico   (positivo = perda/desperdício)
+
+Entradas e transferências vêm do razão (Movimentacao); as vendas vêm de
+VendaDiaria explodidas pela ficha técnica, do mesmo jeito que o sinal de venda
+baixa o estoque. Tudo é calculado de forma vetorizada (pandas) para todas as
+unidades e insumos de uma vez, com um número fixo de consultas.
+
+Os outliers saem do z-score da variância por dia de cada insumo, comparando
+todas as unidades e períodos entre si.
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from .custos import custos_de_referencia
+from .models import Movimentacao, VendaDiaria, Ingrediente, ItemContagemEstoque
+
+DIAS_PADRAO = 90
+LIMITE_Z = 2.0   # |z| a partir do qual o período é marcado como outlier
+
+CHAVE = ['unidade_id', 'produto_id']
+
+
+def _contagens_aprovadas(desde, ate, unidades):
+    """ Uma linha por (unidade, insumo, contagem aprovada), em ordem cronológica. """
+    itens = ItemContagemEstoque.objects.filter(
+        contagem__status='aprovado',
+        contagem__data_contagem__gte=desde,
+        contagem__data_contagem__lte=ate,
+    )
+    if unidades is not None:
+        itens = itens.filter(contagem__unidade__in=unidades)
+    contagens = pd.DataFrame.from_records(
+        itens.values_list('contagem__unidade_id', 'produto_id', 'contagem__data_contagem', 'quantidade_fisica'),
+        columns=CHAVE + ['abertura', 'qtd_abertura'],
+    )
+    contagens['abertura'] = pd.to_datetime(contagens['abertura'], utc=True)
+    # Duas contagens aprovadas no mesmo instante: fica a última gravada
+    return (contagens.drop_duplicates(CHAVE + ['abertura'], keep='last')
+            .sort_values('abertura', kind='stable')
+            .reset_index(drop=True))
+
+
+def _periodos(contagens):
+    """ Junta cada contagem com a seguinte do mesmo (unidade, insumo): um período por linha. """
+    seguinte = contagens.groupby(CHAVE, sort=False)[['abertura', 'qtd_abertura']].shift(-1)
+    periodos = contagens.assign(fechamento=seguinte['abertura'], qtd_fechamento=seguinte['qtd_abertura'])
+    return periodos.dropna(subset=['fechamento'])
+
+
+def _no_periodo(eventos, contagens, coluna_evento, coluna_contagem, inclusive):
+    """
+    Associa cada evento à contagem imediatamente anterior do mesmo (unidade, insumo),
+    ou seja, ao período a que ele pertence (identificado pela 'abertura').
+    Eventos antes da primeira contagem ficam sem período e são descartados.
+    """
+    if eventos.empty or contagens.empty:
+        return eventos.assign(abertura=pd.Series(dtype='datetime64[ns, UTC]'))
+    colunas = CHAVE + ['abertura'] + ([coluna_contagem] if coluna_contagem != 'abertura' else [])
+    associados = pd.merge_asof(
+        eventos.sort_values(coluna_evento, kind='stable'),
+        contagens[colunas].sort_values(coluna_contagem, kind='stable'),
+        left_on=coluna_evento, right_on=coluna_contagem, by=CHAVE,
+        direction='backward', allow_exact_matches=inclusive,
+    )
+    return associados.dropna(subset=['abertura'])
+
+
+def _movimentos(desde, ate):
+    """
+    Entradas e transferências do razão em formato longo: (unidade, insumo, data, entrada, saída).
+    Os estornos de venda apagada ficam de fora: a venda também sai do consumo teórico.
+    """
+    movs = pd.DataFrame.from_records(
+        Movimentacao.objects
+        .filter(tipo__in=['ENTRADA', 'TRANSFERENCIA'], data__gt=desde, data__lte=ate, produto__tipo='INSUMO')
+        .exclude(estorno_venda=True)
+        .values_list('produto_id', 'origem_id', 'destino_id', 'data', 'quantidade'),
+        columns=['produto_id', 'origem_id', 'destino_id', 'data', 'quantidade'],
+    )
+    movs['data'] = pd.to_datetime(movs['data'], utc=True)
+    entradas = (movs.dropna(subset=['destino_id'])
+                .rename(columns={'destino_id': 'unidade_id', 'quantidade': 'entradas'})
+                [CHAVE + ['data', 'entradas']])
+    saidas = (movs.dropna(subset=['origem_id'])
+              .rename(columns={'origem_id': 'unidade_id', 'quantidade': 'transferido'})
+              [CHAVE + ['data', 'transferido']])
+    # Frames vazios ficam de fora do concat (o pandas não quer mais usá-los para decidir os tipos)
+    partes = [df for df in (entradas, saidas) if not df.empty] or [entradas]
+    longo = pd.concat(partes, ignore_index=True).reindex(columns=CHAVE + ['data', 'entradas', 'transferido'])
+    longo = longo.fillna({'entradas': 0.0, 'transferido': 0.0})
+    longo['unidade_id'] = longo['unidade_id'].astype('int64')
+    return longo
+
+
+def _consumo_teorico(desde, ate):
+    """ Vendas explodidas pela ficha técnica: (unidade, insumo, dia, consumo teórico). """
+    vendas = pd.DataFrame.from_records(
+        VendaDiaria.objects
+        .filter(data__gte=desde.date(), data__lte=ate.date())
+        .values_list('unidade_id', 'produto_id', 'produto__tipo', 'data', 'quantidade'),
+        columns=['unidade_id', 'vendido_id', 'tipo', 'dia', 'vendido'],
+    )
+    ficha = pd.DataFrame.from_records(
+        Ingrediente.objects.values_list('produto_final_id', 'insumo_id', 'quantidade'),
+        columns=['vendido_id', 'produto_id', 'por_unidade'],
+    )
+
+    # Produto Final baixa os insumos da ficha; insumo vendido direto baixa ele mesmo
+    finais = vendas[vendas['tipo'] == 'PRODUTO_FINAL'].merge(ficha, on='vendido_id')
+    diretos = vendas[vendas['tipo'] != 'PRODUTO_FINAL'].assign(produto_id=lambda df: df['vendido_id'], por_unidade=1.0)
+    consumo = pd.concat([df for df in (finais, diretos) if not df.empty] or [finais], ignore_index=True)
+    consumo['consumo_teorico'] = consumo['vendido'] * consumo['por_unidade']
+    consumo['dia'] = pd.to_datetime(consumo['dia'])
+    return consumo[CHAVE + ['dia', 'consumo_teorico']].astype({'produto_id': 'int64'})
+
+
+def calcular_variancia(desde=None, ate=None, unidades=None, limite_z=LIMITE_Z):
+    """
+    Calcula a variância de cada (unidade, insumo) em cada período entre duas
+    contagens aprovadas consecutivas dentro de [desde, ate].
+
+    As vendas de um dia entram no período cuja contagem de abertura foi feita
+    naquele dia ou antes (a contagem é o estoque antes das vendas do dia).
+
+    Retorna um DataFrame (um período por linha) com as quantidades da conta,
+    'variancia', 'valor_variancia' (R$), 'z' e 'outlier'.
+    """
+    ate = ate or timezone.now()
+    desde = desde or ate - timedelta(days=DIAS_PADRAO)
+
+    contagens = _contagens_aprovadas(desde, ate, unidades)
+    periodos = _periodos(contagens)
+    if periodos.empty:
+        return periodos.assign(entradas=0.0, transferido=0.0, consumo_teorico=0.0, consumo_real=0.0,
+                               variancia=0.0, dias=0.0, valor_variancia=0.0, z=0.0, outlier=False)
+
+    # Movimentos no período (abertura, fechamento]
+    movs = _no_periodo(_movimentos(desde, ate), contagens, 'data', 'abertura', inclusive=False)
+    somas_movs = movs.groupby(CHAVE + ['abertura'])[['entradas', 'transferido']].sum()
+
+    # Vendas no período [dia da abertura, dia do fechamento)
+    contagens['dia'] = contagens['abertura'].dt.tz_convert(settings.TIME_ZONE).dt.tz_localize(None).dt.normalize()
+    vendas = _no_periodo(_consumo_teorico(desde, ate), contagens, 'dia', 'dia', inclusive=True)
+    somas_vendas = vendas.groupby(CHAVE + ['abertura'])[['consumo_teorico']].sum()
+
+    df = (periodos.set_index(CHAVE + ['abertura'])
+          .join(somas_movs)
+          .join(somas_vendas)
+          .fillna({'entradas': 0.0, 'transferido': 0.0, 'consumo_teorico': 0.0})
+          .reset_index())
+
+    df['consumo_real'] = df['qtd_abertura'] + df['entradas'] - df['transferido'] - df['qtd_fechamento']
+    df['variancia'] = df['consumo_real'] - df['consumo_teorico']
+    df['dias'] = ((df['fechamento'] - df['abertura']).dt.total_seconds() / 86400).clip(lower=1 / 24)
+
+    custos = custos_de_referencia(df['produto_id'].unique().tolist())
+    df['valor_variancia'] = df['variancia'] * df['produto_id'].map(lambda pid: float(custos.get(pid, 0)))
+
+    # z-score da variância diária de cada insumo, entre todas as unidades e períodos
+    taxa = df['variancia'] / df['dias']
+    grupos = taxa.groupby(df['produto_id'])
+    desvio = grupos.transform('std', ddof=0)
+    df['z'] = ((taxa - grupos.transform('mean')) / desvio.where(desvio > 0)).fillna(0.0)
+    df['outlier'] = df['z'].abs() >= limite_z
+    return df.sort_values(['outlier', 'valor_variancia'], ascending=[False, False], kind='stable').reset_index(drop=True)
@@ -1,34 +1,265 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.http import HttpResponse
 from django.db import transaction
-import pandas as pd
+from django.db.models import Prefetch
+import io
+import csv
 import re
 import math
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 # ✅ 'Reposicao' e 'ReposicaoSerializer' foram removidos dos imports
-from .models import (Unidade, Produto, Estoque, VendaDiaria, Movimentacao, 
-                     PedidoReposicao, ItemReposicao)
+from .models import (Unidade, Produto, CodigoBarras, Estoque, AlteracaoEstoque, VendaDiaria, Movimentacao, 
+                     PedidoReposicao, ItemReposicao, ContagemEstoque, ItemContagemEstoque,
+                     PedidoCompra, ItemPedidoCompra, ProdutoRemovido)
 from .serializers import (UnidadeSerializer, ProdutoSerializer, EstoqueSerializer, 
                           VendaDiariaSerializer, MovimentacaoSerializer,
-                          PedidoReposicaoSerializer, ItemReposicaoSerializer)
+                          PedidoReposicaoSerializer, ItemReposicaoSerializer,
+                          ContagemEstoqueSerializer, EnvioLoteContagemSerializer,
+                          LoteContagemSerializer, CodigoBarrasSerializer,
+                          PedidoCompraSerializer, RecebimentoCompraSerializer,
+                          LoteMovimentacoesSerializer, LoteVendasSerializer,
+                          AlteracaoEstoqueSerializer)
+from .custos import valor_estoque_por_unidade
+from .matriz import matriz_estoque, matriz_para_json
+from .banco import consulta_de_relatorio
+from .metricas import DURACAO_IMPORTACAO, LINHAS_IMPORTADAS
+from .services import (registrar_lote_contagem, resolver_codigos, receber_pedido_compra,
+                       referencias_invalidas, registrar_lote_movimentacoes, registrar_lote_vendas)
+
+
+def _responder_lote(request, serializer_class, campo_linhas, referencias, registrar, tipo):
+    """
+    Fluxo comum dos envios em lote: valida o lote inteiro, devolve os erros por
+    linha (nada é gravado se alguma linha falhar) e grava tudo de uma vez.
+    Reenviar o mesmo 'lote_id' devolve a resposta do primeiro envio.
+    """
+    envio = serializer_class(data=request.data)
+    if not envio.is_valid():
+        erros_linhas = envio.errors.get(campo_linhas)
+        if isinstance(erros_linhas, list) and erros_linhas and isinstance(erros_linhas[0], dict):
+            erros = {indice: erro for indice, erro in enumerate(erros_linhas) if erro}
+            outros = {campo: erro for campo, erro in envio.errors.items() if campo != campo_linhas}
+            return Response({
+                **outros,
+                "erros": [{"linha": indice, "erros": erro} for indice, erro in sorted(erros.items())],
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(envio.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    linhas = envio.validated_data[campo_linhas]
+    erros = referencias_invalidas(linhas, referencias)
+    if erros:
+        return Response({
+            "erros": [{"linha": indice, "erros": erro} for indice, erro in sorted(erros.items())],
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    lote, criado = registrar(envio.validated_data['lote_id'], linhas)
+    if lote.tipo != tipo:
+        return Response({"error": f"O lote '{lote.lote_id}' já foi usado para {lote.get_tipo_display().lower()}."}, status=status.HTTP_409_CONFLICT)
+    return Response(
+        {"lote_id": lote.lote_id, "recebido_em": lote.recebido_em, **lote.resultado},
+        status=status.HTTP_201_CREATED if criado else status.HTTP_200_OK,
+    )
+
 
 class UnidadeViewSet(viewsets.ModelViewSet):
     queryset = Unidade.objects.all()
     serializer_class = UnidadeSerializer
+    filtros = {'nome': 'nome__icontains'}
 
 class ProdutoViewSet(viewsets.ModelViewSet):
-    queryset = Produto.objects.all()
+    queryset = Produto.objects.prefetch_related('codigos_barras')
     serializer_class = ProdutoSerializer
+    filtros = {'tipo': 'tipo', 'nome': 'nome__icontains'}
+
+    @action(detail=False, methods=['get'], url_path='por-codigo')
+    def por_codigo(self, request):
+        """
+        ✅ Leitura do coletor: GET /api/produtos/por-codigo/?codigo=7891234567890
+        Busca exata no índice de códigos de barras (uma consulta).
+        """
+        codigo = (request.query_params.get('codigo') or '').strip()
+        if not codigo:
+            return Response({"error": "Informe o parâmetro 'codigo'."}, status=status.HTTP_400_BAD_REQUEST)
 
+        codigo_barras = CodigoBarras.objects.select_related('produto').filter(codigo=codigo).first()
+        if codigo_barras is None:
+            return Response({"error": f"Código '{codigo}' não cadastrado."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(CodigoBarrasSerializer(codigo_barras).data)
+
+    @action(detail=False, methods=['get'])
+    def sincronizar(self, request):
+        """
+        ✅ Catálogo incremental para coletores offline.
+        GET /api/produtos/sincronizar/?desde=<servidor_em da última sincronização>
+        Sem 'desde', devolve o catálogo completo. Com 'desde', devolve os produtos
+        alterados e, em 'removidos', os ids dos excluídos no período (o coletor
+        deve apagá-los).
+        """
+        servidor_em = timezone.now()
+        produtos = Produto.objects.prefetch_related('codigos_barras').order_by('id')
+        removidos = []
+
+        desde = request.query_params.get('desde')
+        if desde:
+            desde_dt = parse_datetime(desde)
+            if desde_dt is None:
+                return Response({"error": "Parâmetro 'desde' inválido. Use o formato ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(desde_dt):
+                desde_dt = timezone.make_aware(desde_dt)
+            produtos = produtos.filter(atualizado_em__gt=desde_dt)
+            removidos = sorted(set(
+                ProdutoRemovido.objects.filter(removido_em__gt=desde_dt)
+                # O SQLite pode reaproveitar o id de um produto excluído
+                .exclude(produto_id__in=Produto.objects.values('id'))
+                .values_list('produto_id', flat=True)
+            ))
+
+        return Response({
+            "servidor_em": servidor_em,
+            "produtos": ProdutoSerializer(produtos, many=True).data,
+            "removidos": removidos,
+        })
+
+# ✅ Filtros: ?unidade=1,2 &produto=3 &tipo=INSUMO (ver estoque/api.py). Paginação por cursor é o padrão.
 class EstoqueViewSet(viewsets.ModelViewSet):
     queryset = Estoque.objects.all()
     serializer_class = EstoqueSerializer
+    filtros = {'unidade': 'unidade_id', 'produto': 'produto_id', 'tipo': 'produto__tipo'}
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        ✅ Feed de alterações para quem espelha o estoque (PDV, coletores).
+        GET /api/estoque/changes/?since=<cursor>&unidade=1&limit=1000
+
+        - Sem 'since': devolve só o cursor atual. Pegue-o ANTES de baixar /api/estoque/
+          e depois peça as alterações a partir dele.
+        - Com 'since': as linhas que mudaram depois do cursor (a foto mais recente de
+          cada uma) e o novo cursor. Se 'mais' vier true, peça de novo.
+        """
+        since = request.query_params.get('since')
+        if since is None:
+            ultimo = AlteracaoEstoque.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            return Response({"cursor": ultimo, "mais": False, "alteracoes": []})
+        if not since.isdigit():
+            return Response({"error": "Parâmetro 'since' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        limite = request.query_params.get('limit', '')
+        limite = min(int(limite), 5000) if limite.isdigit() and int(limite) > 0 else 1000
+
+        alteracoes = AlteracaoEstoque.objects.filter(id__gt=int(since)).order_by('id')
+        unidade = request.query_params.get('unidade')
+        if unidade:
+            if not unidade.isdigit():
+                return Response({"error": "Parâmetro 'unidade' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+            alteracoes = alteracoes.filter(unidade_id=int(unidade))
+
+        pagina = list(alteracoes[:limite + 1])
+        mais = len(pagina) > limite
+        pagina = pagina[:limite]
+
+        # A mesma linha pode ter mudado várias vezes: basta a foto mais recente
+        mais_recentes = {}
+        for alteracao in pagina:
+            mais_recentes[(alteracao.unidade_id, alteracao.produto_id)] = alteracao
+        return Response({
+            "cursor": pagina[-1].id if pagina else int(since),
+            "mais": mais,
+            "alteracoes": AlteracaoEstoqueSerializer(
+                sorted(mais_recentes.values(), key=lambda alteracao: alteracao.id), many=True
+            ).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    @consulta_de_relatorio
+    def matriz(self, request):
+        """
+        ✅ Estoque da rede inteira como matriz unidade × produto, numa resposta pequena.
+        GET /api/estoque/matriz/?tipo=INSUMO&unidade=1,2&minimos=1&formato=json|csv|npz
+
+        - json (padrão): listas de ids/nomes e 'quantidades' como lista de linhas (uma por unidade).
+        - csv: uma linha por produto e uma coluna por unidade (para planilhas).
+        - npz: arrays NumPy compactados (unidades, produtos, quantidades[, minimos]).
+        """
+        unidades = [u.strip() for u in (request.query_params.get('unidade') or '').split(',') if u.strip()]
+        if not all(u.isdigit() for u in unidades):
+            return Response({"error": "Parâmetro 'unidade' deve ser uma lista de ids separados por vírgula."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        unidades_ids = [int(u) for u in unidades]
+        incluir_minimos = request.query_params.get('minimos') == '1'
+        formato = request.query_params.get('formato', 'json')
+        if formato not in ('json', 'csv', 'npz'):
+            return Response({"error": "Parâmetro 'formato' deve ser json, csv ou npz."}, status=status.HTTP_400_BAD_REQUEST)
+
+        matriz = matriz_estoque(
+            tipo=request.query_params.get('tipo') or None,
+            unidades_ids=unidades_ids or None,
+            incluir_minimos=incluir_minimos,
+        )
+
+        if formato == 'npz':
+            import numpy as np
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **{
+                chave: valor for chave, valor in matriz.items() if isinstance(valor, np.ndarray)
+            })
+            response = HttpResponse(buffer.getvalue(), content_type='application/octet-stream')
+            response['Content-Disposition'] = 'attachment; filename="matriz_estoque.npz"'
+            return response
+
+        if formato == 'csv':
+            response = HttpResponse(content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="matriz_estoque.csv"'
+            escritor = csv.writer(response)
+            escritor.writerow(['produto_id', 'produto'] + matriz['unidades_nomes'])
+            for coluna, (produto_id, nome) in enumerate(zip(matriz['produtos'], matriz['produtos_nomes'])):
+                escritor.writerow([produto_id, nome] + [round(q, 3) for q in matriz['quantidades'][:, coluna].tolist()])
+            return response
+
+        return Response(matriz_para_json(matriz))
+
+    @action(detail=False, methods=['get'])
+    def valor(self, request):
+        """ ✅ Valor do estoque (quantidade × custo médio) por unidade, em uma consulta. """
+        valores = valor_estoque_por_unidade()
+        nomes = dict(Unidade.objects.filter(id__in=valores.keys()).values_list('id', 'nome'))
+        return Response([
+            {"unidade": unidade_id, "unidade_nome": nomes.get(unidade_id), "valor": valor}
+            for unidade_id, valor in sorted(valores.items())
+        ])
+
+class CodigoBarrasViewSet(viewsets.ModelViewSet):
+    queryset = CodigoBarras.objects.select_related('produto')
+    serializer_class = CodigoBarrasSerializer
+    filtros = {'produto': 'produto_id', 'codigo': 'codigo'}
 
 class VendaDiariaViewSet(viewsets.ModelViewSet):
     queryset = VendaDiaria.objects.all()
     serializer_class = VendaDiariaSerializer
+    filtros = {
+        'unidade': 'unidade_id',
+        'produto': 'produto_id',
+        'tipo': 'produto__tipo',
+        'desde': 'data__gte',
+        'ate': 'data__lte',
+    }
+
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """
+        ✅ Vendas de um turno inteiro num único POST /api/vendas/lote/
+        Corpo: {"lote_id": "...", "vendas": [{"unidade": 1, "produto": 5, "quantidade": 3, "data": "2025-01-31"}]}
+        Grava as vendas e as baixas da ficha técnica numa única transação.
+        """
+        return _responder_lote(
+            request, LoteVendasSerializer, 'vendas',
+            {'unidade': Unidade, 'produto': Produto},
+            registrar_lote_vendas, 'VENDA',
+        )
 
     @action(detail=False, methods=['post'])
     def importar_xls(self, request):
@@ -50,6 +281,8 @@ class VendaDiariaViewSet(viewsets.ModelViewSet):
                 return Response({"error": f"Unidade com nome ou ID '{unidade_limpa}' não encontrada."}, status=status.HTTP_400_BAD_REQUEST)
         
         file = request.FILES['file']
+        # ✅ pandas só quando há planilha para ler (não pesa na subida dos workers)
+        import pandas as pd
         try:
             df = pd.read_excel(file)
         except Exception as e:
@@ -57,7 +290,8 @@ class VendaDiariaViewSet(viewsets.ModelViewSet):
 
         vendas_criadas = []
         erros = []
-        with transaction.atomic():
+        importadas = 0
+        with DURACAO_IMPORTACAO.cronometrar(origem='api_xls'), transaction.atomic():
             for index, row in df.iterrows():
                 try:
                     item_completo = str(row['ITEM'])
@@ -81,10 +315,12 @@ class VendaDiariaViewSet(viewsets.ModelViewSet):
                         quantidade=quantidade,
                         data=timezone.now().date()
                     )
+                    importadas += 1
                 except KeyError:
                     continue
                 except Exception as e:
                     erros.append(f"Erro na linha {index + 2}: {e}")
+        LINHAS_IMPORTADAS.inc(importadas, origem='api_xls')
         if erros:
             return Response({"status": "Processamento com erros.", "erros": erros, "criadas": vendas_criadas}, status=status.HTTP_200_OK)
         return Response({"status": "Processamento concluído.", "criadas": vendas_criadas}, status=status.HTTP_201_CREATED)
@@ -96,12 +332,154 @@ class VendaDiariaViewSet(viewsets.ModelViewSet):
 class MovimentacaoViewSet(viewsets.ModelViewSet):
     queryset = Movimentacao.objects.all()
     serializer_class = MovimentacaoSerializer
+    filtros = {
+        'unidade': ('origem_id', 'destino_id'),  # Qualquer lado da movimentação
+        'origem': 'origem_id',
+        'destino': 'destino_id',
+        'produto': 'produto_id',
+        'tipo': 'tipo',
+        'desde': 'data__date__gte',
+        'ate': 'data__date__lte',
+    }
+
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """
+        ✅ Várias movimentações num único POST /api/movimentacoes/lote/
+        Corpo: {"lote_id": "...", "movimentacoes": [{"tipo": "ENTRADA", "produto": 5, "quantidade": 10, "destino": 1}]}
+        Tudo ou nada: se uma linha tiver erro, nenhuma é gravada.
+        """
+        return _responder_lote(
+            request, LoteMovimentacoesSerializer, 'movimentacoes',
+            {'produto': Produto, 'origem': Unidade, 'destino': Unidade},
+            registrar_lote_movimentacoes, 'MOVIMENTACAO',
+        )
 
 # ✅ Adicionamos as ViewSets para os novos modelos (opcional, mas boa prática)
 class PedidoReposicaoViewSet(viewsets.ModelViewSet):
-    queryset = PedidoReposicao.objects.all()
+    queryset = PedidoReposicao.objects.select_related('unidade_destino').prefetch_related(
+        Prefetch('itens', queryset=ItemReposicao.objects.select_related('produto').order_by('id'))
+    )
     serializer_class = PedidoReposicaoSerializer
+    filtros = {
+        'unidade': 'unidade_destino_id',
+        'produto': 'itens__produto_id',
+        'status': 'status',
+        'desde': 'data_criacao__date__gte',
+        'ate': 'data_criacao__date__lte',
+    }
 
 class ItemReposicaoViewSet(viewsets.ModelViewSet):
-    queryset = ItemReposicao.objects.all()
-    serializer_class = ItemReposicaoSerializer
\ No newline at end of file
+    queryset = ItemReposicao.objects.select_related('produto')
+    serializer_class = ItemReposicaoSerializer
+    filtros = {
+        'pedido': 'pedido_reposicao_id',
+        'unidade': 'pedido_reposicao__unidade_destino_id',
+        'produto': 'produto_id',
+        'status': 'pedido_reposicao__status',
+    }
+
+class ContagemEstoqueViewSet(viewsets.ModelViewSet):
+    queryset = ContagemEstoque.objects.select_related('unidade').prefetch_related(
+        'produtos_programados',
+        Prefetch('itens', queryset=ItemContagemEstoque.objects.select_related('produto').order_by('id')),
+    )
+    serializer_class = ContagemEstoqueSerializer
+    filtros = {
+        'unidade': 'unidade_id',
+        'status': 'status',
+        'desde': 'data_contagem__date__gte',
+        'ate': 'data_contagem__date__lte',
+    }
+
+    @action(detail=True, methods=['post'])
+    def lotes(self, request, pk=None):
+        """
+        ✅ Recebe um lote de leituras de um coletor.
+        Corpo: {"lote_id": "...", "leituras": [{"produto_id": 1, "quantidade": 10, "lido_em": "..."}]}
+        Reenviar o mesmo 'lote_id' é seguro: o lote não é aplicado de novo.
+        Se algum código de barras não estiver cadastrado, nada é gravado (422): cadastre
+        o código e reenvie o mesmo lote.
+        """
+        contagem = self.get_object()
+        if contagem.status != 'pendente':
+            return Response({"error": f"Contagem não está pendente (Status: {contagem.get_status_display()})."}, status=status.HTTP_409_CONFLICT)
+
+        envio = EnvioLoteContagemSerializer(data=request.data)
+        envio.is_valid(raise_exception=True)
+
+        # Leituras por código de barras são traduzidas numa única consulta
+        leituras = envio.validated_data['leituras']
+        produto_por_codigo = resolver_codigos(l['codigo'] for l in leituras if 'produto_id' not in l)
+        erros = {}
+        for indice, leitura in enumerate(leituras):
+            if 'produto_id' not in leitura:
+                if leitura['codigo'] not in produto_por_codigo:
+                    erros[indice] = {"codigo": [f"Código '{leitura['codigo']}' não cadastrado."]}
+                    continue
+                leitura['produto_id'] = produto_por_codigo[leitura['codigo']]
+        if erros:
+            # Sem gravar o lote: o 'lote_id' continua livre para o reenvio com as leituras completas
+            return Response({
+                "error": "Há códigos de barras não cadastrados; nenhuma leitura do lote foi gravada.",
+                "codigos_desconhecidos": sorted({leituras[indice]['codigo'] for indice in erros}),
+                "erros": [{"linha": indice, "erros": erro} for indice, erro in sorted(erros.items())],
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        lote, criado = registrar_lote_contagem(contagem, envio.validated_data['lote_id'], leituras)
+        if lote.contagem_id != contagem.id:
+            return Response({"error": f"O lote '{lote.lote_id}' já foi enviado para outra contagem."}, status=status.HTTP_409_CONFLICT)
+        return Response(LoteContagemSerializer(lote).data, status=status.HTTP_201_CREATED if criado else status.HTTP_200_OK)
+
+class PedidoCompraViewSet(viewsets.ModelViewSet):
+    queryset = PedidoCompra.objects.select_related('fornecedor').prefetch_related(
+        Prefetch('itens', queryset=ItemPedidoCompra.objects.select_related('produto').order_by('id'))
+    )
+    serializer_class = PedidoCompraSerializer
+    filtros = {
+        'fornecedor': 'fornecedor_id',
+        'produto': 'itens__produto_id',
+        'status': 'status',
+        'desde': 'data_pedido__date__gte',
+        'ate': 'data_pedido__date__lte',
+    }
+
+    @action(detail=True, methods=['post'])
+    def receber(self, request, pk=None):
+        """
+        ✅ Registra um recebimento (total ou parcial) na Cozinha Central.
+        Corpo: {"itens": [{"item_id": 3, "quantidade": 10}], "numero_nota_fiscal": "123"}
+        Sem 'itens', recebe tudo o que está pendente.
+        """
+        pedido = self.get_object()
+        if pedido.status not in ("PENDENTE", "RECEBIDO_PARCIALMENTE"):
+            return Response({"error": f"Pedido não está aguardando recebimento (Status: {pedido.get_status_display()})."}, status=status.HTTP_409_CONFLICT)
+
+        recebimento = RecebimentoCompraSerializer(data=request.data)
+        recebimento.is_valid(raise_exception=True)
+
+        try:
+            cozinha_central = Unidade.objects.get(nome="Cozinha Central")
+        except Unidade.DoesNotExist:
+            return Response({"error": "A unidade 'Cozinha Central' não foi encontrada."}, status=status.HTTP_400_BAD_REQUEST)
+
+        quantidades = None
+        if 'itens' in recebimento.validated_data:
+            quantidades = {}
+            for item in recebimento.validated_data['itens']:
+                quantidades[item['item_id']] = quantidades.get(item['item_id'], 0) + item['quantidade']
+            itens_do_pedido = set(pedido.itens.values_list('id', flat=True))
+            invalidos = sorted(set(quantidades) - itens_do_pedido)
+            if invalidos:
+                return Response({"error": f"Itens que não pertencem ao pedido: {invalidos}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if recebimento.validated_data.get('numero_nota_fiscal'):
+            pedido.numero_nota_fiscal = recebimento.validated_data['numero_nota_fiscal']
+            pedido.save(update_fields=['numero_nota_fiscal'])
+
+        entradas = receber_pedido_compra(pedido, cozinha_central, quantidades)
+        pedido = self.get_queryset().get(pk=pedido.pk)  # Recarrega os itens já com o recebido
+        return Response({
+            "pedido": PedidoCompraSerializer(pedido).data,
+            "movimentacoes_criadas": len(entradas),
+        })
@@ -0,0 +1,112 @@
+# estoque/views_async.py
+"""
+Endpoints de leitura assíncronos (Django puro), para os coletores e PDVs que
+ficam consultando o estoque no fechamento.
+
+Rodando sob ASGI (boteco_estoque/asgi.py), cada leitura vai para o pool de
+threads com sync_to_async(thread_sensitive=False): as consultas de requisições
+diferentes andam ao mesmo tempo, cada thread com a sua conexão, em vez de
+esperarem na fila da thread única que o Django usa para o código síncrono.
+Uma matriz grande não segura as consultas curtas que chegam atrás dela.
+
+As views passam por @consulta_de_relatorio: com SQLITE_LEITURA=True as
+consultas usam a conexão só de leitura (estoque/banco.py). As conexões das
+threads do pool ficam abertas e são reaproveitadas pelas próximas leituras.
+
+Só leitura: as escritas continuam nos ViewSets do DRF (views.py).
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+
+from .banco import consulta_de_relatorio
+from .matriz import matriz_estoque, matriz_para_json
+from .models import Unidade, Estoque, PedidoReposicao, PedidoCompra
+
+
+def _somente_leitura(view):
+    """ Como o require_GET, mas mantendo a view assíncrona (o do Django 4.2 a tornaria síncrona). """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+def _em_paralelo(funcao):
+    """ A leitura roda numa thread do pool, fora da thread única do código síncrono. """
+    return sync_to_async(funcao, thread_sensitive=False)
+
+
+def _ids(valor):
+    """ '1,2' -> [1, 2]; None se algum id não for um número. """
+    partes = [parte.strip() for parte in (valor or '').split(',') if parte.strip()]
+    if not all(parte.isdigit() for parte in partes):
+        return None
+    return [int(parte) for parte in partes]
+
+
+def _ler_estoque_da_unidade(unidade_id, tipo):
+    unidade = Unidade.objects.filter(id=unidade_id).values('id', 'nome').first()
+    if unidade is None:
+        return None
+    linhas = Estoque.objects.filter(unidade_id=unidade_id).order_by('produto__nome')
+    if tipo:
+        linhas = linhas.filter(produto__tipo=tipo)
+    itens = list(linhas.values('produto_id', 'produto__nome', 'produto__unidade_medida',
+                               'quantidade', 'estoque_minimo'))
+    return {"unidade": unidade, "itens": itens}
+
+
+def _ler_pedidos_pendentes(unidades_ids):
+    reposicoes = PedidoReposicao.objects.filter(status__in=['PENDENTE', 'ENVIADO']).order_by('data_criacao')
+    if unidades_ids:
+        reposicoes = reposicoes.filter(unidade_destino_id__in=unidades_ids)
+    compras = PedidoCompra.objects.filter(status__in=['PENDENTE', 'RECEBIDO_PARCIALMENTE']).order_by('data_pedido')
+    return {
+        "reposicoes": list(reposicoes.values('id', 'status', 'data_criacao',
+                                             'unidade_destino_id', 'unidade_destino__nome')),
+        "compras": list(compras.values('id', 'status', 'data_pedido', 'fornecedor_id', 'fornecedor__nome')),
+    }
+
+
+def _ler_matriz(**parametros):
+    return matriz_para_json(matriz_estoque(**parametros))
+
+
+@_somente_leitura
+@consulta_de_relatorio
+async def estoque_da_unidade(request, unidade_id):
+    """ GET /api/async/estoque/<unidade_id>/?tipo=INSUMO """
+    dados = await _em_paralelo(_ler_estoque_da_unidade)(unidade_id, request.GET.get('tipo'))
+    if dados is None:
+        return JsonResponse({"error": f"Unidade {unidade_id} não encontrada."}, status=404)
+    return JsonResponse(dados)
+
+
+@_somente_leitura
+@consulta_de_relatorio
+async def matriz(request):
+    """ GET /api/async/estoque/matriz/?tipo=INSUMO&unidade=1,2&minimos=1 (mesmo JSON de /api/estoque/matriz/) """
+    unidades_ids = _ids(request.GET.get('unidade'))
+    if unidades_ids is None:
+        return JsonResponse({"error": "Parâmetro 'unidade' deve ser uma lista de ids separados por vírgula."}, status=400)
+    dados = await _em_paralelo(_ler_matriz)(
+        tipo=request.GET.get('tipo') or None,
+        unidades_ids=unidades_ids or None,
+        incluir_minimos=request.GET.get('minimos') == '1',
+    )
+    return JsonResponse(dados)
+
+
+@_somente_leitura
+@consulta_de_relatorio
+async def pedidos_pendentes(request):
+    """ GET /api/async/pedidos-pendentes/?unidade=1 — reposições e compras aguardando ação. """
+    unidades_ids = _ids(request.GET.get('unidade'))
+    if unidades_ids is None:
+        return JsonResponse({"error": "Parâmetro 'unidade' deve ser uma lista de ids separados por vírgula."}, status=400)
+    return JsonResponse(await _em_paralelo(_ler_pedidos_pendentes)(unidades_ids))